@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+'''
+Benchmark branching a scenario state in variants: deep copying the server
+for each variant against checkpoint / rollback, on servers of N files. Each
+variant changes a few files and processes.
+
+Usage: PYTHONPATH=./lib python bench/bench_checkpoint.py [files ...]
+'''
+import copy
+import sys
+import time
+
+from simulux.environment import Environment
+
+DEFAULT_COUNTS = [1000, 5000, 20000]
+VARIANTS = 20
+
+
+def make_env(count):
+    env = Environment({'web1': {'memory': {'total': 4194304}}})
+    disks = env.servers['web1']['disks']
+    disks.add_file('/var/data', filetype='folder')
+    with disks.batch():
+        for idx in range(count):
+            disks.add_file('/var/data/file%d' % (idx,), size=idx)
+    return env
+
+
+def run_variant(server, variant):
+    disks = server['disks']
+    for idx in range(10):
+        disks.update_file('/var/data/file%d' % (variant * 10 + idx,), size=1)
+    disks.add_file('/var/data/variant', size=variant)
+    server['processes'].add_processes([{'name': 'app', 'pid': 1000 + variant,
+        'ppid': 1, 'state': 'R', 'memory': {'rss': 1024}}])
+    server['processes'].kill_process(2)
+
+
+def deep_copies(env):
+    start = time.time()
+    for variant in range(VARIANTS):
+        server = copy.deepcopy(env.servers['web1'])
+        run_variant(server, variant)
+    return time.time() - start
+
+
+def checkpoints(env):
+    start = time.time()
+    level = env.checkpoint()
+    for variant in range(VARIANTS):
+        run_variant(env.servers['web1'], variant)
+        env.rollback(level)
+    env.release(level)
+    return time.time() - start
+
+
+def main(counts):
+    print '%10s %16s %16s %10s' % ('files', 'deepcopy (s)', 'checkpoint (s)',
+                                   'speedup')
+    for count in counts:
+        env = make_env(count)
+        copied = deep_copies(env)
+        branched = checkpoints(env)
+        print '%10d %16.3f %16.3f %9.1fx' % (count, copied, branched,
+                                             copied / branched)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
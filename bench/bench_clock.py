@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+'''
+Benchmark the simulation clock throughput, in events per second:
+- bare clock: no-op events repeated every second,
+- environment: servers cloned from a template, each with a process
+  changing state every second and a log file growing continuously (the log
+  rates are only applied when the servers are observed, at the end).
+
+Usage: PYTHONPATH=./lib python bench/bench_clock.py [servers ...]
+'''
+import sys
+import time
+
+from simulux.clock import Clock
+from simulux.environment import Environment
+
+DEFAULT_COUNTS = [10, 100, 1000]
+SECONDS = 100
+
+
+def noop():
+    pass
+
+
+def bare(count):
+    clock = Clock()
+    for idx in range(count):
+        clock.schedule(idx / float(count), noop, interval=1)
+    start = time.time()
+    clock.advance(SECONDS)
+    return clock.processed, time.time() - start
+
+
+def flip_state(server, pid):
+    processes = server['processes']
+    state = processes.processes[pid].config.get('state')
+    processes.set_state(pid, 'R' if state == 'S' else 'S')
+
+
+def environment(count):
+    env = Environment(templates={'web': {}})
+    for idx in range(count):
+        name = 'web%d' % (idx,)
+        env.clone_server(name, 'web')
+        env.schedule(name, idx / float(count), flip_state, (1,), interval=1)
+        env.grow_file(name, '/etc/hosts', 5 * 1024 * 1024)
+    start = time.time()
+    env.advance(SECONDS)
+    for name in env.servers:
+        env.get_server(name)
+    return env.clock.processed, time.time() - start
+
+
+def main(counts):
+    print '%10s %10s %16s %16s' % ('servers', 'events', 'bare (ev/s)',
+                                   'environment (ev/s)')
+    for count in counts:
+        events, bare_time = bare(count)
+        env_events, env_time = environment(count)
+        assert events == env_events
+        print '%10d %10d %16d %16d' % (count, events, events / bare_time,
+                                       env_events / env_time)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+'''
+Micro-benchmark of the CPU accounting: list backed CPUS against the numpy
+backed ArrayCPUS, applying process CPU deltas on many-core hosts.
+
+Usage: PYTHONPATH=./lib python bench/bench_cpus.py [cores ...]
+'''
+import random
+import sys
+import time
+
+from simulux.cpus import CPUS, ArrayCPUS, CPU_TYPES
+
+DEFAULT_CORES = [2, 32, 128, 256]
+UPDATES = 2000
+
+
+def make_conf(cores):
+    cpus = dict((cpu_type, [0.0] * cores) for cpu_type in CPU_TYPES)
+    cpus['idle'] = [100.0] * cores
+    return {'cores': cores, 'cpus': cpus}
+
+
+def run(cpus, deltas):
+    start = time.time()
+    for cpu_type, delta in deltas:
+        cpus.update(cpu_type, delta)
+    cpus.set('idle', 50.0)
+    for cpu_type in CPU_TYPES:
+        cpus.get(cpu_type, avg=True)
+    return time.time() - start
+
+
+def main(counts):
+    print '%10s %14s %14s %10s' % ('cores', 'lists (ms)', 'arrays (ms)', 'speedup')
+    rand = random.Random(0)
+    for cores in counts:
+        deltas = [ (rand.choice(['user', 'system', 'iowait']),
+                    rand.choice([0.01, -0.01, [0.01] * cores])) for idx in range(UPDATES) ]
+        lists = run(CPUS(make_conf(cores)), deltas)
+        arrays = run(ArrayCPUS(make_conf(cores)), deltas)
+        print '%10d %14.1f %14.1f %9.1fx' % (cores, lists * 1000, arrays * 1000,
+                                             lists / arrays)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_CORES
+    main(counts)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+'''
+Benchmark directory listing on large trees: full scan of the flat file map
+(previous behavior) against the parent -> childrens index.
+
+Usage: PYTHONPATH=./lib python bench/bench_disks_listing.py [count ...]
+'''
+import os
+import sys
+import time
+
+from simulux.disks import Disks
+
+DEFAULT_COUNTS = [10000, 100000, 1000000]
+FILES_PER_FOLDER = 100
+REPEAT = 5
+
+
+def scan_childrens_path(disks, path):
+    '''
+    Listing as done before the childrens index; walks every file
+    '''
+    return [ child for child, data in disks.files.iteritems() if
+                child.startswith(path) and os.path.dirname(child) == path
+                and child != path ]
+
+
+def populate(count):
+    '''
+    Create a Disks object holding `count` extra files under /var/bench
+    '''
+    disks = Disks()
+    disks.add_file('/var/bench', filetype='folder')
+    for idx in range(count):
+        folder = '/var/bench/%d' % (idx / FILES_PER_FOLDER,)
+        if idx % FILES_PER_FOLDER == 0:
+            disks.add_file(folder, filetype='folder')
+        disks.add_file('%s/%d.log' % (folder, idx), size=1)
+    return disks
+
+
+def timeit(func, *args):
+    start = time.time()
+    for _ in range(REPEAT):
+        func(*args)
+    return (time.time() - start) / REPEAT
+
+
+def main(counts):
+    print '%10s %14s %14s %10s' % ('files', 'scan (ms)', 'index (ms)', 'speedup')
+    for count in counts:
+        disks = populate(count)
+        path = '/var/bench/0'
+        assert sorted(scan_childrens_path(disks, path)) == \
+                sorted(disks.get_childrens_path(path))
+        scan = timeit(scan_childrens_path, disks, path)
+        index = timeit(disks.get_childrens_path, path)
+        print '%10d %14.3f %14.3f %9.0fx' % (count, scan * 1000, index * 1000,
+                                             scan / max(index, 1e-9))
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+'''
+Benchmark the memory used by the Disks file map: dict of dicts (previous
+behavior) against the FileNode representation.
+
+Sizes are measured with sys.getsizeof, walking the containers and counting
+each object once (shared strings / ints are only counted once).
+
+Usage: PYTHONPATH=./lib python bench/bench_disks_memory.py [count ...]
+'''
+import json
+import os
+import sys
+import tempfile
+
+from simulux.disks import Disks
+from simulux.files import FileNode
+
+DEFAULT_COUNTS = [10000, 100000, 1000000]
+FILES_PER_FOLDER = 100
+
+
+def deep_size(obj, seen=None):
+    '''
+    Approximate size of obj and everything it references
+    '''
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.iterkeys())
+            stack.extend(item.itervalues())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif isinstance(item, FileNode):
+            stack.extend(getattr(item, name) for name in FileNode.__slots__)
+    return size
+
+
+def make_layout(count):
+    '''
+    Generate a disks layout JSON with `count` files below /var/bench
+    '''
+    folders = {}
+    for idx in range(count):
+        folder = folders.setdefault(str(idx / FILES_PER_FOLDER), {
+            'filetype': 'folder', 'size': 0, 'owner': 'root',
+            'group': 'root', 'mode': 755, 'content': {}
+        })
+        folder['content']['%d.log' % (idx,)] = {
+            'filetype': 'file', 'size': idx, 'owner': 'www-data',
+            'group': 'www-data', 'mode': 644
+        }
+    return {'files': {'/': {'bench': {
+        'filetype': 'folder', 'size': 0, 'owner': 'root', 'group': 'root',
+        'mode': 755, 'content': folders
+    }}}}
+
+
+def flatten(files, base='/', result=None):
+    '''
+    Flat dict of dicts as built before FileNode
+    '''
+    if result is None:
+        result = {}
+    for name, details in files.iteritems():
+        root = os.path.join(base, name)
+        data = details.copy()
+        if data.get('filetype') == 'folder':
+            flatten(data.get('content', {}), root, result)
+            del data['content']
+        result[root] = data
+    return result
+
+
+def main(counts):
+    print '%10s %14s %14s %8s' % ('files', 'dicts (MB)', 'nodes (MB)', 'ratio')
+    for count in counts:
+        fd, layout_file = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps(make_layout(count)))
+        try:
+            raw = json.loads(open(layout_file).read())
+            dicts = flatten(raw['files']['/'], '/')
+            del raw
+            dicts_size = deep_size(dicts)
+            del dicts
+
+            disks = Disks()
+            disks.add_layout(layout_file)
+            nodes_size = deep_size(disks.files)
+            del disks
+        finally:
+            os.remove(layout_file)
+        print '%10d %14.1f %14.1f %7.1fx' % (count, dicts_size / 1e6,
+                                             nodes_size / 1e6,
+                                             float(dicts_size) / nodes_size)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+'''
+Benchmark the Environment startup time with and without the parsed layout
+cache of simulux.utils.load_layout.
+
+Usage: PYTHONPATH=./lib python bench/bench_environment.py [servers ...]
+'''
+import sys
+import time
+
+import simulux.cpus
+import simulux.disks
+import simulux.memory
+import simulux.processes
+from simulux.environment import Environment
+from simulux.utils import load_json, load_layout, clear_layout_cache
+
+DEFAULT_COUNTS = [10, 100, 1000]
+MODULES = [simulux.cpus, simulux.disks, simulux.memory, simulux.processes]
+
+
+def load_layout_uncached(default_layout, layout_file=None):
+    '''
+    load_layout as done before the cache; parse the JSON on every call
+    '''
+    return load_json(layout_file or default_layout)
+
+
+def use_loader(loader):
+    for module in MODULES:
+        module.load_layout = loader
+
+
+def start(count):
+    servers = dict(('server%d' % (idx,), {'memory': {'total': 4194304}})
+                    for idx in range(count))
+    start = time.time()
+    Environment(servers)
+    return time.time() - start
+
+
+def main(counts):
+    print '%10s %14s %14s %10s' % ('servers', 'parse (s)', 'cached (s)', 'speedup')
+    for count in counts:
+        use_loader(load_layout_uncached)
+        uncached = start(count)
+        use_loader(load_layout)
+        clear_layout_cache()
+        cached = start(count)
+        print '%10d %14.3f %14.3f %9.1fx' % (count, uncached, cached,
+                                             uncached / cached)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+'''
+Benchmark filling a disk with many small log files: add_file in a loop
+against Disks.generate_files (one size rollup per folder).
+
+Usage: PYTHONPATH=./lib python bench/bench_generate.py [files ...]
+'''
+import sys
+import time
+
+from simulux.disks import Disks
+from simulux.generator import iter_files, lognormal
+
+DEFAULT_COUNTS = [10000, 100000, 500000]
+PATTERN = '/var/log/app/{date}/{n}.log'
+DAYS = 30
+SIZES = lognormal(4096, maximum=1024 * 1024)
+
+
+def add_files(count):
+    disks = Disks()
+    start = time.time()
+    for path, size in iter_files(PATTERN, count, SIZES, seed=1, days=DAYS):
+        folder = disks.get_parent_path(path)
+        if not disks.exists(folder):
+            if not disks.exists(disks.get_parent_path(folder)):
+                disks.add_file(disks.get_parent_path(folder), filetype='folder')
+            disks.add_file(folder, filetype='folder')
+        disks.add_file(path, size=size)
+    elapsed = time.time() - start
+    return elapsed, disks.get_details('/').get('size')
+
+
+def generate_files(count):
+    disks = Disks()
+    start = time.time()
+    disks.generate_files(PATTERN, count, SIZES, seed=1, days=DAYS)
+    elapsed = time.time() - start
+    return elapsed, disks.get_details('/').get('size')
+
+
+def main(counts):
+    print '%10s %14s %14s %12s %10s' % ('files', 'add_file (s)', 'generate (s)',
+                                        'files/s', 'speedup')
+    for count in counts:
+        added, added_size = add_files(count)
+        generated, generated_size = generate_files(count)
+        assert added_size == generated_size
+        print '%10d %14.2f %14.2f %12d %9.1fx' % (count, added, generated,
+            count / generated, added / generated)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
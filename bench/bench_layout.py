@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+'''
+Benchmark loading large disks layouts: parsing the whole JSON (load_layout
+then the files processing, as add_layout does for small layouts) against
+streaming it with Disks.stream_layout. Reports the load time, the entries
+per second and the peak memory added by the load (each load runs in its
+own process).
+
+Usage: PYTHONPATH=./lib python bench/bench_layout.py [files ...]
+'''
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from simulux.disks import Disks
+from simulux.utils import load_layout, clear_layout_cache
+
+DEFAULT_COUNTS = [100000, 500000, 1000000]
+FILES_PER_FOLDER = 100
+FILE = ('"%d.log": {"filetype": "file", "size": %d, "owner": "www-data", '
+        '"group": "www-data", "mode": 644}')
+FOLDER = ('"%d": {"filetype": "folder", "size": 0, "owner": "root", '
+          '"group": "root", "mode": 755, "content": {')
+
+
+def write_layout(f, count):
+    '''
+    Write a layout of `count` files below /bench, folder by folder
+    '''
+    f.write('{"partitions": {"/dev/sdb1": {"mount": "/bench", "used": 0}}, ')
+    f.write('"files": {"/bench": {')
+    for start in range(0, count, FILES_PER_FOLDER):
+        if start:
+            f.write(', ')
+        f.write(FOLDER % (start / FILES_PER_FOLDER,))
+        f.write(', '.join(FILE % (idx, idx) for idx in
+                          range(start, min(start + FILES_PER_FOLDER, count))))
+        f.write('}}')
+    f.write('}}}')
+
+
+def load(disks, layout_file):
+    layout = load_layout(layout_file)
+    disks.partitions.update(layout.get('partitions', {}))
+    disks._process_mounts(layout.get('files', {}))
+
+
+def stream(disks, layout_file):
+    disks.stream_layout(layout_file)
+
+
+def measure(loader, layout_file, queue):
+    disks = Disks()
+    clear_layout_cache()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    loader(disks, layout_file)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    queue.put((elapsed, peak, len(disks.files)))
+
+
+def run(loader, layout_file):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure,
+                                      args=(loader, layout_file, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(counts):
+    print '%10s %10s %10s %12s %14s' % ('files', 'loader', 'time (s)',
+                                        'entries/s', 'peak (MB)')
+    for count in counts:
+        fd, layout_file = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            write_layout(f, count)
+        try:
+            entries = None
+            for name, loader in [('load', load), ('stream', stream)]:
+                elapsed, peak, size = run(loader, layout_file)
+                assert entries is None or size == entries
+                entries = size
+                print '%10d %10s %10.2f %12d %14.1f' % (count, name, elapsed,
+                    count / elapsed, peak / 1024.0)
+        finally:
+            os.remove(layout_file)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
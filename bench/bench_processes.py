@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+'''
+Benchmark loading large process tables: one CPU / Memory update round trip
+per process resource (previous behavior) against Processes.add_processes
+which applies all the deltas in one pass.
+
+Usage: PYTHONPATH=./lib python bench/bench_processes.py [processes ...]
+'''
+import sys
+import time
+
+from simulux.cpus import CPUS
+from simulux.disks import Disks
+from simulux.memory import Memory
+from simulux.processes import Processes, Process
+
+DEFAULT_COUNTS = [1000, 10000, 50000]
+
+
+def make_configs(count):
+    return [ {'name': 'apache', 'pid': pid, 'ppid': 1, 'state': 'S',
+              'threads': 1, 'uid': 'www', 'gid': 'www',
+              'memory': {'rss': 1024, 'virt': 2048},
+              'cpus': {'user': 0.001, 'system': 0.001, 'iowait': 0.001}}
+             for pid in range(100, 100 + count) ]
+
+
+def one_by_one(processes, configs):
+    for config in configs:
+        process = Process(config=config, cpus=processes.cpus,
+                          disks=processes.disks, memory=processes.memory)
+        processes.processes[config['pid']] = process
+
+
+def bulk(processes, configs):
+    processes.add_processes(configs)
+
+
+def run(loader, configs, disks):
+    processes = Processes(cpus=CPUS(), memory=Memory(), disks=disks)
+    start = time.time()
+    loader(processes, configs)
+    return time.time() - start
+
+
+def main(counts):
+    disks = Disks()
+    print '%10s %14s %14s %10s' % ('processes', 'single (s)', 'bulk (s)', 'speedup')
+    for count in counts:
+        configs = make_configs(count)
+        single = run(one_by_one, configs, disks)
+        bulked = run(bulk, configs, disks)
+        print '%10d %14.3f %14.3f %9.1fx' % (count, single, bulked, single / bulked)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+'''
+Benchmark whole-table aggregates (total RSS, top 10 by CPU, RSS per user) on
+large process tables: Processes (one config dict per process, aggregated in
+Python) against ArrayProcesses (column oriented table, vectorized).
+
+Usage: PYTHONPATH=./lib python bench/bench_proctable.py [processes ...]
+'''
+import sys
+import time
+
+from simulux.cpus import CPUS
+from simulux.disks import Disks
+from simulux.memory import Memory
+from simulux.processes import Processes, ArrayProcesses
+
+DEFAULT_COUNTS = [1000, 10000, 100000]
+
+
+def make_configs(count):
+    return [ {'name': 'apache', 'pid': pid, 'ppid': 1, 'state': 'S',
+              'threads': 1, 'uid': 'www%d' % (pid % 10), 'gid': 'www',
+              'memory': {'rss': pid % 4096, 'virt': 2048},
+              'cpus': {'user': (pid % 13) / 1000.0, 'system': 0.001}}
+             for pid in range(100, 100 + count) ]
+
+
+def aggregate_dicts(processes):
+    configs = [ process.config for process in processes.processes.itervalues() ]
+    total = sum(config['memory']['rss'] for config in configs)
+    top = sorted(configs, key=lambda config: -sum(config['cpus'].values()))[:10]
+    sums = {}
+    for config in configs:
+        sums[config['uid']] = sums.get(config['uid'], 0) + config['memory']['rss']
+    return total, top, sums
+
+
+def aggregate_arrays(processes):
+    return (processes.get_total('rss'), processes.get_top_pids(10, 'cpu'),
+            processes.get_sums('uid', 'rss'))
+
+
+def run(cls, aggregate, configs, disks):
+    processes = cls(cpus=CPUS(), memory=Memory(), disks=disks)
+    start = time.time()
+    processes.add_processes(configs)
+    loaded = time.time()
+    aggregate(processes)
+    return loaded - start, time.time() - loaded
+
+
+def main(counts):
+    disks = Disks()
+    print '%10s %12s %12s %14s %14s' % ('processes', 'load (s)', 'array (s)',
+                                       'aggregate (s)', 'array (s)')
+    for count in counts:
+        configs = make_configs(count)
+        load, aggregate = run(Processes, aggregate_dicts, configs, disks)
+        array_load, array_aggregate = run(ArrayProcesses, aggregate_arrays,
+                                          configs, disks)
+        print '%10d %12.3f %12.3f %14.4f %14.4f' % (count, load, array_load,
+                                                    aggregate, array_aggregate)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
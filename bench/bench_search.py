@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''
+Benchmark searching a disk filled by many generated files: a full scan of
+the files against Disks.find (size pruning) and Disks.glob (pattern
+pruning), timing the first result and all of them.
+
+Usage: PYTHONPATH=./lib python bench/bench_search.py [files ...]
+'''
+import re
+import sys
+import time
+
+from simulux.disks import Disks
+from simulux.generator import lognormal
+
+DEFAULT_COUNTS = [10000, 100000, 1000000]
+PATTERN = '/var/log/app/{date}/{n}.log'
+DAYS = 30
+SIZES = lognormal(4096, maximum=1024 * 1024)
+# A few large files among the small ones
+LARGE = 1024 ** 3
+GLOB = '/var/log/app/*/1?.log'
+REGEX = re.compile(r'/var/log/app/[^/]*/1.\.log\Z')
+
+
+def scan(disks, test):
+    start = time.time()
+    results = [ path for path in disks.files.keys()
+                if test(path, disks.files.get(path)) ]
+    return time.time() - start, len(results)
+
+
+def search(results):
+    start = time.time()
+    count = 0
+    first = None
+    for path in results:
+        if first is None:
+            first = time.time() - start
+        count += 1
+    return first or 0.0, time.time() - start, count
+
+
+def main(counts):
+    print '%10s %-6s %10s %12s %12s %8s' % ('files', 'search', 'scan (s)',
+                                            'first (ms)', 'all (s)', 'results')
+    for count in counts:
+        disks = Disks()
+        disks.generate_files(PATTERN, count, SIZES, seed=1, days=DAYS)
+        disks.generate_files('/var/log/app/large/{n}.log', 3, LARGE * 2)
+        for name, test, results in [
+                ('find', lambda path, details: details.get('size', 0) > LARGE,
+                 lambda: disks.find(size='+%dc' % (LARGE,))),
+                ('glob', lambda path, details: REGEX.match(path) is not None,
+                 lambda: disks.glob(GLOB))]:
+            scanned, expected = scan(disks, test)
+            first, elapsed, found = search(results())
+            assert found == expected
+            print '%10d %-6s %10.2f %12.2f %12.3f %8d' % (count, name,
+                scanned, first * 1000, elapsed, found)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+'''
+Load test of the Environment server: N concurrent sessions, each sending
+requests one after the other (ls, stat, cd, pwd, ps), report the round trip
+latencies (p50 / p99) and the requests per second.
+
+The server runs in its own process on a unix socket; the sessions share a
+single event loop in the client process.
+
+Usage: PYTHONPATH=./lib python bench/bench_server.py [sessions ...]
+'''
+import asynchat
+import asyncore
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+from simulux.environment import Environment
+from simulux.metrics import percentile
+from simulux.server import SimuluxServer
+
+DEFAULT_COUNTS = [1, 10, 100, 500]
+REQUESTS = 50
+SERVERS = 10
+COMMANDS = [
+    {'cmd': 'ls', 'args': ['/etc']},
+    {'cmd': 'cd', 'args': ['/etc']},
+    {'cmd': 'stat', 'args': ['hosts']},
+    {'cmd': 'pwd', 'args': []},
+    {'cmd': 'ps', 'args': []},
+    {'cmd': 'cd', 'args': ['..']},
+]
+
+
+def serve(address, ready):
+    env = Environment(templates={'web': {}})
+    for idx in range(SERVERS):
+        env.clone_server('web%d' % (idx,), 'web')
+    server = SimuluxServer(env, address, max_sessions=10000)
+    ready.set()
+    server.serve_forever()
+
+
+class LoadSession(asynchat.async_chat):
+    """Define a LoadSession object"""
+    def __init__(self, address, sock_map, latencies):
+        asynchat.async_chat.__init__(self, map=sock_map)
+        self.set_terminator('\n')
+        self.latencies = latencies
+        self.incoming = []
+        self.sent = 0
+        self.start = None
+        self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connect(address)
+
+    def handle_connect(self):
+        self.send_request()
+
+    def send_request(self):
+        if self.sent == REQUESTS:
+            self.close()
+            return
+        request = dict(COMMANDS[self.sent % len(COMMANDS)], id=self.sent)
+        self.sent += 1
+        self.start = time.time()
+        self.push(json.dumps(request) + '\n')
+
+    def collect_incoming_data(self, data):
+        self.incoming.append(data)
+
+    def found_terminator(self):
+        self.latencies.append(time.time() - self.start)
+        reply = json.loads(''.join(self.incoming))
+        self.incoming = []
+        assert reply['ok'], reply
+        self.send_request()
+
+
+def load(address, count):
+    sock_map = {}
+    latencies = []
+    start = time.time()
+    for idx in range(count):
+        LoadSession(address, sock_map, latencies)
+    asyncore.loop(timeout=1, map=sock_map)
+    return latencies, time.time() - start
+
+
+def main(counts):
+    tmpdir = tempfile.mkdtemp()
+    address = os.path.join(tmpdir, 'simulux.sock')
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(address, ready))
+    server.daemon = True
+    server.start()
+    ready.wait()
+    try:
+        print '%10s %10s %12s %12s %12s' % ('sessions', 'requests', 'p50 (ms)',
+                                           'p99 (ms)', 'requests/s')
+        for count in counts:
+            latencies, elapsed = load(address, count)
+            print '%10d %10d %12.2f %12.2f %12d' % (
+                count, len(latencies), percentile(latencies, 50) * 1000,
+                percentile(latencies, 99) * 1000, len(latencies) / elapsed)
+    finally:
+        server.terminate()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+'''
+Benchmark stepping large clusters: a single process Environment against a
+ShardedEnvironment spreading the servers over all the cores. Each server
+has a process changing state every second; the cluster is advanced then
+queried for its total disk used.
+
+Usage: PYTHONPATH=./lib python bench/bench_sharded.py [servers ...]
+'''
+import multiprocessing
+import sys
+import time
+
+from simulux.environment import Environment
+from simulux.sharded import ShardedEnvironment, disk_used
+
+DEFAULT_COUNTS = [20, 100, 500]
+SECONDS = 60
+
+
+def flip_state(server, pid):
+    processes = server['processes']
+    state = processes.processes[pid].config.get('state')
+    processes.set_state(pid, 'R' if state == 'S' else 'S')
+
+
+def single(servers):
+    env = Environment(servers)
+    start = time.time()
+    for name in env.servers:
+        env.schedule(name, 0, flip_state, (1,), interval=1)
+        env.grow_file(name, '/etc/hosts', 1024)
+    env.advance(SECONDS)
+    total = sum(disk_used(name, env.get_server(name)) for name in env.servers)
+    return total, time.time() - start
+
+
+def sharded(servers):
+    env = ShardedEnvironment(servers)
+    start = time.time()
+    env.execute([ (name, None, 'schedule', (0, flip_state, (1,), 1))
+                  for name in servers ] +
+                [ (name, None, 'grow_file', ('/etc/hosts', 1024))
+                  for name in servers ])
+    env.advance(SECONDS)
+    total = env.map_reduce(disk_used)
+    elapsed = time.time() - start
+    env.close()
+    return total, elapsed
+
+
+def main(counts):
+    print '%d cores' % (multiprocessing.cpu_count(),)
+    print '%10s %14s %14s %10s' % ('servers', 'single (s)', 'sharded (s)', 'speedup')
+    for count in counts:
+        servers = dict(('web%d' % (idx,), {}) for idx in range(count))
+        total, single_time = single(servers)
+        sharded_total, sharded_time = sharded(servers)
+        assert total == sharded_total
+        print '%10d %14.3f %14.3f %9.1fx' % (count, single_time, sharded_time,
+                                             single_time / sharded_time)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+'''
+Benchmark restoring an Environment from a snapshot against building it from
+the JSON layouts (parsed on every server, as without the layout cache).
+Reports the snapshot size and the time to save / restore it.
+
+Usage: PYTHONPATH=./lib python bench/bench_snapshot.py [servers ...]
+'''
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import simulux.cpus
+import simulux.disks
+import simulux.memory
+import simulux.processes
+from simulux.environment import Environment
+from simulux.utils import load_json, load_layout
+
+DEFAULT_COUNTS = [10, 100, 1000]
+MODULES = [simulux.cpus, simulux.disks, simulux.memory, simulux.processes]
+
+
+def load_layout_uncached(default_layout, layout_file=None):
+    return load_json(layout_file or default_layout)
+
+
+def use_loader(loader):
+    for module in MODULES:
+        module.load_layout = loader
+
+
+def build(servers):
+    use_loader(load_layout_uncached)
+    start = time.time()
+    env = Environment(servers)
+    elapsed = time.time() - start
+    use_loader(load_layout)
+    return env, elapsed
+
+
+def main(counts):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print '%10s %12s %12s %12s %12s %10s' % ('servers', 'size (KB)',
+            'json (s)', 'save (s)', 'restore (s)', 'speedup')
+        for count in counts:
+            servers = dict(('server%d' % (idx,), {'memory': {'total': 4194304}})
+                           for idx in range(count))
+            env, json_time = build(servers)
+            filename = os.path.join(tmpdir, 'env%d.snapshot' % (count,))
+            start = time.time()
+            env.snapshot(filename)
+            save_time = time.time() - start
+            start = time.time()
+            assert env.restore(filename)
+            restore_time = time.time() - start
+            print '%10d %12d %12.3f %12.3f %12.3f %9.1fx' % (count,
+                os.path.getsize(filename) / 1024, json_time, save_time,
+                restore_time, json_time / restore_time)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
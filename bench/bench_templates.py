@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+'''
+Benchmark the creation of near-identical servers: built from their layout
+(add_server) against cloned from a template (clone_server).
+
+Usage: PYTHONPATH=./lib python bench/bench_templates.py [servers ...]
+'''
+import sys
+import time
+
+from simulux.environment import Environment
+
+DEFAULT_COUNTS = [100, 500, 2000]
+SERVER = {'memory': {'total': 4194304}}
+
+
+def build(count):
+    env = Environment()
+    start = time.time()
+    for idx in range(count):
+        env.servers['web%d' % (idx,)] = env.add_server(SERVER)
+        env.servers['web%d' % (idx,)]['disks'].add_file('/tmp/%d' % (idx,), size=10)
+    return time.time() - start
+
+
+def clone(count):
+    env = Environment()
+    start = time.time()
+    env.add_template('web', SERVER)
+    for idx in range(count):
+        server = env.clone_server('web%d' % (idx,), 'web')
+        server['disks'].add_file('/tmp/%d' % (idx,), size=10)
+    return time.time() - start
+
+
+def main(counts):
+    print '%10s %14s %14s %10s' % ('servers', 'build (s)', 'clone (s)', 'speedup')
+    for count in counts:
+        built = build(count)
+        cloned = clone(count)
+        print '%10d %14.3f %14.3f %9.1fx' % (count, built, cloned, built / cloned)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+'''
+Benchmark `top` refreshes: sorting all the processes on each refresh
+(previous behavior) against the sorted views kept by Processes, while a few
+processes are replaced between refreshes.
+
+Usage: PYTHONPATH=./lib python bench/bench_top.py [processes ...]
+'''
+import sys
+import time
+
+from simulux.cpus import CPUS
+from simulux.disks import Disks
+from simulux.memory import Memory
+from simulux.processes import Processes, get_sort_value
+
+DEFAULT_COUNTS = [1000, 10000, 100000]
+REFRESHES = 100
+TOP = 20
+
+
+def make_config(pid):
+    return {'name': 'apache', 'pid': pid, 'ppid': 1, 'state': 'S',
+            'threads': 1, 'uid': 'www', 'gid': 'www',
+            'memory': {'rss': (pid * 7919) % 65536, 'virt': 2048},
+            'cpus': {'user': ((pid * 104729) % 1000) / 1000.0}}
+
+
+def sort_all(processes):
+    configs = [ process.config for process in processes.processes.itervalues() ]
+    configs.sort(key=lambda config: -get_sort_value(config, 'cpu'))
+    return [ config['pid'] for config in configs[:TOP] ]
+
+
+def top_view(processes):
+    return processes.get_top_pids(TOP, 'cpu')
+
+
+def run(refresh, processes, count):
+    start = time.time()
+    for step in range(REFRESHES):
+        # Some processes come and go between two refreshes
+        pid = 100 + (step * 31) % count
+        processes.kill_process(pid)
+        processes.add_processes([make_config(pid)])
+        refresh(processes)
+    return time.time() - start
+
+
+def main(counts):
+    disks = Disks()
+    print '%10s %14s %14s %10s' % ('processes', 'sort (s)', 'view (s)', 'speedup')
+    for count in counts:
+        processes = Processes(cpus=CPUS(), memory=Memory(), disks=disks)
+        processes.add_processes([ make_config(pid) for pid in range(100, 100 + count) ])
+        assert sort_all(processes)[:1] == top_view(processes)[:1]
+        sort = run(sort_all, processes, count)
+        view = run(top_view, processes, count)
+        print '%10d %14.3f %14.3f %9.1fx' % (count, sort, view, sort / view)
+
+
+if __name__ == '__main__':
+    counts = [ int(arg) for arg in sys.argv[1:] ] or DEFAULT_COUNTS
+    main(counts)
@@ -0,0 +1,176 @@
+import heapq
+
+'''
+Simulation clock
+
+Discrete-event clock driving the simulated servers over time. The clock only
+moves when asked to (advance / run_until) and jumps from one event to the
+next: nothing is computed for the seconds in between.
+
+- Events are callbacks scheduled at a time (optionally repeated every
+  interval), kept in a priority queue ordered on (time, scheduling order).
+- Rates are continuous changes (a log growing by 5 MB/s, a leaking process,
+  a CPU ramp). They are not ticked: a rate is only brought up to date when
+  its key (ex. a server name) is synced, usually when the value is observed,
+  so idle servers cost nothing while the clock advances.
+
+Events scheduled with a key sync the rates of that key before running, so an
+event always sees the values of its time.
+'''
+
+class Event(object):
+    """Define an Event object"""
+    __slots__ = ('time', 'callback', 'args', 'key', 'interval', 'cancelled')
+
+    def __init__(self, time, callback, args=(), key=None, interval=None):
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Rate(object):
+    """Define a Rate object"""
+    __slots__ = ('apply', 'rate', 'last', 'until', 'integer', 'carry')
+
+    def __init__(self, apply, rate, start, until=None, integer=True):
+        # apply(delta) changes the value; returning False drops the rate
+        self.apply = apply
+        # Change per second
+        self.rate = rate
+        self.last = start
+        self.until = until
+        # Integer values (sizes) keep the fractional part for the next sync
+        self.integer = integer
+        self.carry = 0.0
+
+    def advance(self, now):
+        '''
+        Apply the change accumulated since the last sync; return False once
+        the rate is over
+        '''
+        if self.until is not None and now > self.until:
+            now = self.until
+        elapsed = now - self.last
+        if elapsed > 0:
+            delta = self.rate * elapsed + self.carry
+            if self.integer:
+                self.carry = delta - int(delta)
+                delta = int(delta)
+            self.last = now
+            if delta and self.apply(delta) is False:
+                return False
+        return self.until is None or now < self.until
+
+class Clock(object):
+    """Define a Clock object"""
+    def __init__(self, now=0.0):
+        super(Clock, self).__init__()
+        self.now = now
+        # Priority queue of (time, sequence, event)
+        self.queue = []
+        self.sequence = 0
+        # key -> list of Rate
+        self.rates = {}
+        self.processed = 0
+
+    def schedule(self, delay, callback, args=(), key=None, interval=None):
+        '''
+        Run callback(*args) in delay seconds, then every interval seconds if
+        set. Return the Event, which can be cancelled.
+        '''
+        return self.schedule_at(self.now + delay, callback, args, key, interval)
+
+    def schedule_at(self, time, callback, args=(), key=None, interval=None):
+        if interval is not None and interval <= 0:
+            print 'Invalid interval: %s' % (interval,)
+            return None
+        event = Event(max(time, self.now), callback, args, key, interval)
+        self._push(event)
+        return event
+
+    def _push(self, event):
+        self.sequence += 1
+        heapq.heappush(self.queue, (event.time, self.sequence, event))
+
+    def add_rate(self, key, apply, rate, until=None, integer=True):
+        '''
+        Change a value by rate per second from now (until the `until` time),
+        through apply(delta). The change is applied when key is synced.
+        '''
+        rate = Rate(apply, rate, self.now, until, integer)
+        self.rates.setdefault(key, []).append(rate)
+        return rate
+
+    def remove_rate(self, key, rate):
+        rates = self.rates.get(key, [])
+        if rate in rates:
+            rates.remove(rate)
+        if not rates:
+            self.rates.pop(key, None)
+
+    def sync(self, key):
+        '''
+        Bring the rates of key up to the current time
+        '''
+        rates = self.rates.get(key)
+        if not rates:
+            return
+        running = [ rate for rate in rates if rate.advance(self.now) ]
+        if running:
+            self.rates[key] = running
+        else:
+            del self.rates[key]
+
+    def sync_all(self):
+        for key in list(self.rates):
+            self.sync(key)
+
+    def next_time(self):
+        '''
+        Return the time of the next pending event, None if there is none
+        '''
+        while self.queue and self.queue[0][2].cancelled:
+            heapq.heappop(self.queue)
+        if not self.queue:
+            return None
+        return self.queue[0][0]
+
+    def step(self):
+        '''
+        Run the next pending event; return False if there is none
+        '''
+        time = self.next_time()
+        if time is None:
+            return False
+        time, sequence, event = heapq.heappop(self.queue)
+        self.now = time
+        if event.key is not None:
+            self.sync(event.key)
+        event.callback(*event.args)
+        self.processed += 1
+        if event.interval is not None and not event.cancelled:
+            event.time = time + event.interval
+            self._push(event)
+        return True
+
+    def run_until(self, time):
+        '''
+        Run all the events up to time, then move the clock to time
+        '''
+        while True:
+            next_time = self.next_time()
+            if next_time is None or next_time > time:
+                break
+            self.step()
+        self.now = max(self.now, time)
+
+    def advance(self, seconds):
+        '''
+        Move the clock seconds forward, running the events on the way
+        '''
+        self.run_until(self.now + seconds)
@@ -7,3 +7,6 @@ else:
     DIST_DEFAULTS_PATH = '/usr/share/simulux/'
     
 FILES_DEFAULT_PATH = 'scenarios/fixture/'
+
+# Storage backend of the Disks files (see simulux.storage)
+DISKS_STORAGE = os.environ.get('SIMULUX_DISKS_STORAGE', 'flat')
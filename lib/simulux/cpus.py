@@ -2,10 +2,20 @@ import os
 import operator
 from simulux.utils import load_json
 from simulux.utils import load_layout
+from simulux.utils import get_checkpoint
 from simulux.constants import DIST_DEFAULTS_PATH
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 DEFAULT_LAYOUT = os.path.join(DIST_DEFAULTS_PATH, 'cpus_layout.json')
 
+# Order of the rows of ArrayCPUS.matrix
+CPU_TYPES = [ 'user', 'nice', 'system', 'iowait', 'irq', 'soft', 'steal',
+              'guest', 'idle' ]
+
 '''
 CPU object 
 
@@ -34,6 +44,8 @@ class CPUS(object):
             "guest": [],
             "idle": []
         }
+        # CPUS clones of each checkpoint
+        self.checkpoints = []
         # Set default layout
         self.set_layout()
         
@@ -56,7 +68,55 @@ class CPUS(object):
                 self.data['steal'] = conf['cpus'].get('steal', default_layout.get('steal'))
                 self.data['guest'] = conf['cpus'].get('guest', default_layout.get('guest'))
                 self.data['idle'] = conf['cpus'].get('idle', default_layout.get('idle'))
+                # Own the lists of the conf: set / update_many change them in place
+                for cpu_type, value in self.data.items():
+                    if isinstance(value, list):
+                        self.data[cpu_type] = list(value)
             
+    def clone(self):
+        '''
+        Return a new CPUS object with the same values
+        '''
+        cpus = object.__new__(self.__class__)
+        cpus.cores = self.cores
+        cpus.data = dict((cpu_type, list(value)) for cpu_type, value in
+                            self.data.iteritems())
+        cpus.checkpoints = []
+        return cpus
+
+    def _restore(self, cpus):
+        self.cores = cpus.cores
+        self.data = cpus.data
+
+    def checkpoint(self):
+        '''
+        Record the current values, return the checkpoint level
+        '''
+        self.checkpoints.append(self.clone())
+        return len(self.checkpoints) - 1
+
+    def rollback(self, level=None):
+        '''
+        Restore the values of checkpoint level (the last one by default),
+        dropping the newer checkpoints
+        '''
+        level = get_checkpoint(self.checkpoints, level)
+        if level is None:
+            return False
+        del self.checkpoints[level + 1:]
+        self._restore(self.checkpoints[level].clone())
+        return True
+
+    def release(self, level=None):
+        '''
+        Drop checkpoint level (the last one by default) and the newer ones
+        '''
+        level = get_checkpoint(self.checkpoints, level)
+        if level is None:
+            return False
+        del self.checkpoints[level:]
+        return True
+
     def set_layout(self, layout_file=None):
         '''
         Set the CPU configuration based on the default layout (or get it overriden)
@@ -146,8 +206,8 @@ class CPUS(object):
                 new = 100.0 - value[idx]
                 for ctype in [ 'user', 'nice', 'system', 'iowait', 'irq', 'soft',
                              'steal', 'guest' ]:
-                    ratio = self[ctype][idx] / prev
-                    self[ctype][idx] = ratio * new
+                    ratio = self.data[ctype][idx] / prev if prev else 0.0
+                    self.data[ctype][idx] = ratio * new
         # Now set the value of the cpu 
         self.data[cpu_type] = value
         return True
@@ -175,6 +235,50 @@ class CPUS(object):
         success = self.set(cpu_type, value)
         return success
 
+    def update_many(self, deltas):
+        '''
+        Apply many updates in a single pass; deltas is a dict or a list of
+        (cpu_type, diff). The diffs are summed per cpu type first, then
+        applied with a single idle rebalancing.
+        '''
+        if isinstance(deltas, dict):
+            deltas = deltas.iteritems()
+        # Sum the scalar diffs and the per core diffs separately
+        scalars = {}
+        arrays = {}
+        for cpu_type, diff in deltas:
+            if not cpu_type in CPU_TYPES:
+                print 'Invalid CPU type: %s' % (cpu_type,)
+                return False
+            if type(diff) in [int, float]:
+                scalars[cpu_type] = scalars.get(cpu_type, 0.0) + diff
+                continue
+            diff = self._value_to_list(diff)
+            if diff is False:
+                return False
+            total = arrays.get(cpu_type)
+            if total is None:
+                arrays[cpu_type] = diff
+            else:
+                for idx in range(self.cores):
+                    total[idx] += diff[idx]
+
+        totals = {}
+        for cpu_type in set(scalars) | set(arrays):
+            scalar = scalars.get(cpu_type, 0.0)
+            array = arrays.get(cpu_type, [0.0] * self.cores)
+            totals[cpu_type] = [ scalar + value for value in array ]
+        idle_diff = totals.pop('idle', None)
+        for cpu_type, diff in totals.iteritems():
+            data = self.data[cpu_type]
+            idle = self.data['idle']
+            for idx in range(self.cores):
+                data[idx] += diff[idx]
+                idle[idx] -= diff[idx]
+        if idle_diff is not None:
+            return self.update('idle', idle_diff)
+        return True
+
     def _value_to_list(self, value):
         '''
         Ensure a provided value is matching the list requirements ...
@@ -206,3 +310,155 @@ class CPUS(object):
 
         return result
 
+
+
+class ArrayCPUS(CPUS):
+    """
+    CPUS object storing the cpu types as a (cpu types x cores) numpy matrix,
+    for hosts with many cores: set / update / avg are vectorized across the
+    cores. get and dump still return lists. Requires numpy.
+    """
+    def __init__(self, conf=None):
+        if numpy is None:
+            raise ImportError('numpy is required by ArrayCPUS')
+        self.matrix = None
+        super(ArrayCPUS, self).__init__(conf)
+        self._load_matrix()
+
+    def _load_matrix(self):
+        '''
+        Move the per cpu type lists of self.data to the matrix; self.data
+        rows become views on the matrix
+        '''
+        self.matrix = numpy.array([ self.data[cpu_type] for cpu_type in CPU_TYPES ],
+                                  dtype=float)
+        for idx, cpu_type in enumerate(CPU_TYPES):
+            self.data[cpu_type] = self.matrix[idx]
+
+    def clone(self):
+        cpus = object.__new__(self.__class__)
+        cpus.cores = self.cores
+        cpus.data = {}
+        cpus.matrix = self.matrix.copy()
+        for idx, cpu_type in enumerate(CPU_TYPES):
+            cpus.data[cpu_type] = cpus.matrix[idx]
+        cpus.checkpoints = []
+        return cpus
+
+    def _restore(self, cpus):
+        super(ArrayCPUS, self)._restore(cpus)
+        self.matrix = cpus.matrix
+
+    def set_layout(self, layout_file=None):
+        super(ArrayCPUS, self).set_layout(layout_file)
+        if self.matrix is not None:
+            self._load_matrix()
+
+    def dump(self):
+        '''
+        Dump the CPUs information
+        '''
+        return dict((cpu_type, self.matrix[idx].tolist()) for idx, cpu_type in
+                        enumerate(CPU_TYPES))
+
+    def get(self, cpu_type, avg=False):
+        '''
+        Get the cpus details per type (idle, nice, system, iowait, etc.).
+        By default averaged across all CPUs. Else return array of per CPU details
+        '''
+        if not cpu_type in CPU_TYPES:
+            print 'Invalid CPU type: %s' % (cpu_type,)
+            return False
+        if self.cores == 0:
+            print 'No data available for CPU type %s' % (cpu_type,)
+            return False
+        row = self.matrix[CPU_TYPES.index(cpu_type)]
+        if not avg:
+            return row.tolist()
+        return float(row.mean())
+
+    def set(self, cpu_type, value):
+        '''
+        Set the CPU for the specific cpu_type to value. Propagate the change to
+        idle (or keep the ratio across the other cpu types when setting idle).
+        '''
+        if not cpu_type in CPU_TYPES:
+            print 'Invalid CPU type: %s' % (cpu_type,)
+            return False
+        value = self._value_to_array(value)
+        if value is None:
+            return False
+        idx = CPU_TYPES.index(cpu_type)
+        idle = self.matrix[-1]
+        if cpu_type != 'idle':
+            idle -= value - self.matrix[idx]
+        else:
+            prev = 100.0 - idle
+            new = 100.0 - value
+            # Cores with nothing but idle keep their other cpu types at 0
+            ratio = numpy.divide(new, prev, out=numpy.zeros_like(prev),
+                                 where=prev != 0)
+            self.matrix[:-1] *= ratio
+        self.matrix[idx] = value
+        return True
+
+    def update(self, cpu_type, diff):
+        '''
+        Update cpu_type data using diff
+        '''
+        if not cpu_type in CPU_TYPES:
+            print 'Invalid CPU type: %s' % (cpu_type,)
+            return False
+        diff = self._value_to_array(diff)
+        if diff is None:
+            return False
+        if cpu_type == 'idle':
+            return self.set(cpu_type, self.matrix[-1] + diff)
+        self.matrix[CPU_TYPES.index(cpu_type)] += diff
+        self.matrix[-1] -= diff
+        return True
+
+    def update_many(self, deltas):
+        '''
+        Apply many updates in a single pass; deltas is a dict or a list of
+        (cpu_type, diff). The diffs are summed in a (cpu types x cores)
+        matrix, then applied with a single idle rebalancing.
+        '''
+        if isinstance(deltas, dict):
+            deltas = deltas.iteritems()
+        totals = numpy.zeros_like(self.matrix)
+        for cpu_type, diff in deltas:
+            if not cpu_type in CPU_TYPES:
+                print 'Invalid CPU type: %s' % (cpu_type,)
+                return False
+            if type(diff) in [int, float]:
+                totals[CPU_TYPES.index(cpu_type)] += diff
+                continue
+            diff = self._value_to_array(diff)
+            if diff is None:
+                return False
+            totals[CPU_TYPES.index(cpu_type)] += diff
+        self.matrix[:-1] += totals[:-1]
+        self.matrix[-1] -= totals[:-1].sum(axis=0)
+        if totals[-1].any():
+            return self.update('idle', totals[-1])
+        return True
+
+    def _value_to_array(self, value):
+        '''
+        Return value as an array of floats (one per core), None if invalid
+        '''
+        if type(value) in [int, float]:
+            return numpy.full(self.cores, float(value))
+        if type(value) not in [list, tuple, numpy.ndarray]:
+            print 'Invalid value %s (type: %s)' % (value, type(value),)
+            return None
+        if len(value) != self.cores:
+            print 'Wrong number of cores provided in value %s' % (value,)
+            return None
+        try:
+            result = numpy.array(value, dtype=float)
+        except (TypeError, ValueError):
+            print 'Invalid value %s' % (value,)
+            return None
+        return result
@@ -1,11 +1,31 @@
 import os
+import copy
+import mmap
+from contextlib import contextmanager
+from cStringIO import StringIO
+from itertools import chain, islice
 from simulux.utils import load_json
 from simulux.utils import load_layout
-from simulux.constants import DIST_DEFAULTS_PATH, FILES_DEFAULT_PATH
+from simulux.utils import LRUCache
+from simulux.utils import get_checkpoint
+from simulux.constants import DIST_DEFAULTS_PATH, FILES_DEFAULT_PATH, DISKS_STORAGE
 from simulux.exceptions import SimuluxDiskException
+from simulux.files import FileNode
+from simulux.generator import iter_files
+from simulux import search
+from simulux.fixtures import CONTENT_CACHE
+from simulux.storage import STORAGES, OverlayStorage
+from simulux.stream import iter_events, read_value, Progress
 
 DEFAULT_LAYOUT = os.path.join(DIST_DEFAULTS_PATH, 'disks_layout.json')
 
+# Number of normalized paths kept by shorten_path
+PATH_CACHE_SIZE = 4096
+# Layout files from this size are streamed (see Disks.stream_layout)
+LAYOUT_STREAM_SIZE = 16 * 1024 * 1024
+# Generated files stored at once (see Disks.generate_files)
+GENERATE_BATCH = 65536
+
 
 '''
 Disk object 
@@ -18,13 +38,10 @@ Defines the operaton related to the Disk, including:
 
 class Disks(object):
     """Define a Disks object"""
-    def __init__(self, conf=None):
+    def __init__(self, conf=None, storage=None):
         super(Disks, self).__init__()
         
-        self.disks = {}
-        self.partitions = {}
-        self.files = {}
-        self.scenario_name = None
+        self._init_storage(storage)
         
         # Add default layout
         self.add_layout()
@@ -39,11 +56,101 @@ class Disks(object):
             self._process_mounts(files)
         
 
+    def _init_storage(self, storage=None):
+        '''
+        Set up an empty Disks
+        '''
+        self.disks = {}
+        self.partitions = {}
+        # Files storage backend: 'flat' (path keyed dict) or 'tree' (inodes)
+        if not storage:
+            storage = DISKS_STORAGE
+        if storage not in STORAGES:
+            raise SimuluxDiskException("Invalid storage backend: %s" % (storage,))
+        self.files = STORAGES[storage]()
+        self.mounts = set()
+        self.scenario_name = None
+        # Normalized paths: (path, working_dir) -> path
+        self._path_cache = LRUCache(PATH_CACHE_SIZE)
+        # Size deltas waiting to be propagated (batch mode): folder -> delta
+        self._pending_sizes = {}
+        self._batch_depth = 0
+        # (files overlay, disks, partitions, mounts) of each checkpoint
+        self.checkpoints = []
+
+    def clone(self):
+        '''
+        Return a new Disks sharing the files of this one copy-on-write; only
+        the files changed by the clone get copied. This Disks should not be
+        modified anymore afterwards (see Environment.add_template).
+        '''
+        self.flush_sizes()
+        disks = object.__new__(self.__class__)
+        disks.__dict__.update(self.__dict__)
+        disks.disks = copy.deepcopy(self.disks)
+        disks.partitions = copy.deepcopy(self.partitions)
+        disks.files = OverlayStorage(self.files)
+        disks.mounts = set(self.mounts)
+        disks._path_cache = LRUCache(PATH_CACHE_SIZE)
+        disks._pending_sizes = {}
+        disks._batch_depth = 0
+        disks.checkpoints = []
+        return disks
+
+    def checkpoint(self):
+        '''
+        Record the current state, return the checkpoint level. The files
+        are frozen under a copy-on-write overlay: the changes made afterwards
+        are stored apart, so rollback and release cost O(changes).
+        '''
+        self.flush_sizes()
+        self.files = OverlayStorage(self.files)
+        self.checkpoints.append((self.files, copy.deepcopy(self.disks),
+                                 copy.deepcopy(self.partitions), set(self.mounts)))
+        return len(self.checkpoints) - 1
+
+    def rollback(self, level=None):
+        '''
+        Undo the changes made since checkpoint level (the last one by
+        default), dropping the newer checkpoints; level is kept, so the
+        same state can be branched again
+        '''
+        level = get_checkpoint(self.checkpoints, level)
+        if level is None:
+            return False
+        files, disks, partitions, mounts = self.checkpoints[level]
+        del self.checkpoints[level + 1:]
+        self._pending_sizes = {}
+        files.clear()
+        self.files = files
+        self.disks = copy.deepcopy(disks)
+        self.partitions = copy.deepcopy(partitions)
+        self.mounts = set(mounts)
+        return True
+
+    def release(self, level=None):
+        '''
+        Drop checkpoint level (the last one by default) and the newer ones,
+        keeping the changes
+        '''
+        level = get_checkpoint(self.checkpoints, level)
+        if level is None:
+            return False
+        self.flush_sizes()
+        # Innermost first, each overlay is written in the previous one
+        for files, disks, partitions, mounts in reversed(self.checkpoints[level:]):
+            self.files = files.apply()
+        del self.checkpoints[level:]
+        return True
+
     def add_layout(self, layout_file=None):
         '''
         Add an extra disk layout definition; override any existing disk, partition
-        and file
+        and file. Large layout files are streamed (see stream_layout).
         '''
+        if layout_file and os.path.isfile(layout_file) and \
+                os.path.getsize(layout_file) >= LAYOUT_STREAM_SIZE:
+            return self.stream_layout(layout_file) is not None
         layout = load_layout(DEFAULT_LAYOUT, layout_file)
 
         self.disks.update(layout.get('disks', {}))
@@ -63,50 +170,196 @@ class Disks(object):
             root: base dir that is defined as a mount point
             content: object describing the files / folders within that root
             '''
-            # mount = True will prevent further recursion and will propagate size
-            #       to the partition instead of parent folder
-            # TODO: add the partition info here?
-            partitions = [ part for name, part in self.partitions.iteritems() if 
-                        part.get('mount') == root ]
-            if len(partitions) == 1:
-                partition = partitions[0]
-            else:
-                print "Associated partition with mount point %s is missing" % (root,)
-                partition = {}
-            # Cheating ownership (for now)
-            result = {
-                'mount': True,
-                'size': partition.get('used', 0),
-                'owner': 'root',
-                'group': 'root',
-                'mode': 755
-            }
-            self.files.update({root: result})
+            self._add_mount(root)
             self._process_files(root, content)
 
+    def _add_mount(self, root):
+        '''
+        Add the mount point root, sized after its partition
+        '''
+        # mount = True will prevent further recursion and will propagate size
+        #       to the partition instead of parent folder
+        # TODO: add the partition info here?
+        partitions = [ part for name, part in self.partitions.iteritems() if 
+                    part.get('mount') == root ]
+        if len(partitions) == 1:
+            partition = partitions[0]
+        else:
+            print "Associated partition with mount point %s is missing" % (root,)
+            partition = {}
+        # Cheating ownership (for now)
+        result = FileNode(
+            mount=True,
+            size=partition.get('used', 0),
+            owner='root',
+            group='root',
+            mode=755
+        )
+        self.files.update({root: result})
+        self.mounts.add(root)
+
     def _process_files(self, base='/', files={}):
         '''
-        Process the files, inheriting from the base path
+        Process the files, inheriting from the base path. Iterative, so deep
+        trees do not hit the recursion limit.
         '''
-        for name, details in files.iteritems():
-            root = os.path.join(base, name)
-            data = details.copy()
-            if data.get('filetype') == 'folder':
-                # Sub files are in `data.content`
-                self._process_files(root, data.get('content', {}))
+        stack = [(base, files)]
+        while stack:
+            base, files = stack.pop()
+            for name, details in files.iteritems():
+                root = os.path.join(base, name)
+                if details.get('filetype') == 'folder':
+                    # Sub files are in `details.content`
+                    stack.append((root, details.get('content', {})))
                 # For the folder itself we don't need the subfiles in content
-                del data['content']
-            self.files.update({root: data})
+                data = FileNode.from_dict(details)
+                self.files.update({root: data})
+
+    def stream_layout(self, layout_file, progress=None):
+        '''
+        Add a disk layout (see add_layout) read as a stream: the files are
+        stored as they are parsed, in a single pass, without loading the
+        layout in memory. progress(stats) is called every
+        simulux.stream.PROGRESS_INTERVAL entries and at the end.
+        Return the stats (entries, bytes, seconds and their rates), None on
+        error.
+        '''
+        try:
+            f = open(layout_file, 'rb')
+        except IOError as e:
+            print 'Error loading JSON file %s: %s' % (layout_file, e,)
+            return None
+        with f:
+            counter = Progress(f, progress)
+            try:
+                self._stream_layout(iter_events(f), counter)
+            except (ValueError, StopIteration) as e:
+                print 'Error loading JSON file %s: %s' % (layout_file, e,)
+                return None
+            stats = counter.get_stats()
+        if progress is not None:
+            progress(stats)
+        return stats
+
+    def _stream_layout(self, events, counter):
+        event, value = next(events)
+        if event == 'object':
+            # Small layout without files
+            self.disks.update(value.get('disks', {}))
+            self.partitions.update(value.get('partitions', {}))
+            self._process_mounts(value.get('files', {}))
+            return
+        if event != 'start_map':
+            raise ValueError('Invalid disks layout')
+        mounts = []
+        for event, value in events:
+            if event == 'end_map':
+                break
+            key = value
+            event, value = next(events)
+            if key == 'files' and event == 'start_map':
+                mounts.extend(self._stream_mounts(events, counter))
+                continue
+            value = read_value(events, event, value)
+            if key == 'disks':
+                self.disks.update(value)
+            elif key == 'partitions':
+                self.partitions.update(value)
+            elif key == 'files':
+                self._process_mounts(value)
+        # The partitions may come after the files
+        for root in mounts:
+            self._add_mount(root)
+
+    def _stream_mounts(self, events, counter):
+        '''
+        Store the files of each mount point of the 'files' map; return the
+        mount points
+        '''
+        mounts = []
+        for event, value in events:
+            if event == 'end_map':
+                return mounts
+            root = value
+            mounts.append(root)
+            event, value = next(events)
+            if event == 'start_map':
+                self._stream_content(events, root, counter)
+            elif event == 'object':
+                self._process_files(root, value)
+                counter.add(len(value))
+            else:
+                raise ValueError('Invalid files of %s' % (root,))
+        return mounts
+
+    def _stream_content(self, events, base, counter):
+        '''
+        Store the files of the content map of base (its start already read),
+        up to the end of the map. Iterative: the stack holds the folders
+        being read, as ('content', path, node) while reading their files and
+        ('details', path, node) while reading their own details.
+        '''
+        stack = [('content', base, None)]
+        while stack:
+            event, value = next(events)
+            kind, path, node = stack[-1]
+            if event == 'end_map':
+                stack.pop()
+                continue
+            if event != 'key':
+                raise ValueError('Invalid content of %s' % (path,))
+            if kind == 'content':
+                path = os.path.join(path, value)
+                event, value = next(events)
+                if event == 'object':
+                    # Most files: all the details at once
+                    self.files[path] = FileNode.from_dict(value)
+                elif event == 'start_map':
+                    node = FileNode()
+                    self.files[path] = node
+                    stack.append(('details', path, node))
+                else:
+                    raise ValueError('Invalid details of %s' % (path,))
+                counter.add()
+                continue
+            key = value
+            event, value = next(events)
+            if key != 'content':
+                node[key] = read_value(events, event, value)
+            elif event == 'start_map' and node.filetype in (None, 'folder'):
+                stack.append(('content', path, node))
+            elif event == 'object' and node.filetype in (None, 'folder'):
+                self._process_files(path, value)
+                counter.add(len(value))
+            else:
+                # Content of a file
+                read_value(events, event, value)
     
     def shorten_path(self, path, working_dir=''):
+        '''
+        Return the normalized (absolute) path; results are cached as the same
+        few paths are looked up over and over
+        '''
+        key = (path, working_dir)
+        result = self._path_cache.get(key)
+        if result is None:
+            result = self._shorten_path(path, working_dir)
+            self._path_cache.set(key, result)
+        return result
+
+    def path_cache_info(self):
+        '''
+        Return the hits / misses / size of the shorten_path cache
+        '''
+        return self._path_cache.info()
+
+    def _shorten_path(self, path, working_dir=''):
         
         path = self._make_absolute(path, working_dir)
         
         new_path = list()
-        path_exploded = path.split('/')
         # delete all empty string which are caused by wrong path syntax or "/" at end/beginning
-        while '' in path_exploded:
-            path_exploded.remove('')
+        path_exploded = [ elem for elem in path.split('/') if elem ]
         
         is_absolute = False
         if path.startswith('/'):
@@ -155,7 +408,7 @@ class Disks(object):
         '''
         Return if a path exists in the tree
         '''
-        path = self.shorten_path(self._make_absolute(path, working_dir))
+        path = self.shorten_path(path, working_dir)
         if path in self.files:
             return True
         return False
@@ -164,11 +417,9 @@ class Disks(object):
         '''
         Return whether a path is a folder
         '''
-        path = self.shorten_path(self._make_absolute(path, working_dir))
-            
-        if not self.exists(path, working_dir):
+        details = self.files.get(self.shorten_path(path, working_dir))
+        if not details:
             return False
-        details = self.get_details(path)
         if details.get('mount') == True:
             return True
         if details.get('filetype') == 'folder':
@@ -179,11 +430,9 @@ class Disks(object):
         '''
         Return whether a path is a file
         '''
-        path = self.shorten_path(self._make_absolute(path, working_dir))
-             
-        if not self.exists(path, working_dir):
+        details = self.files.get(self.shorten_path(path, working_dir))
+        if not details:
             return False
-        details = self.get_details(path)
         if details.get('filetype') == 'file':
             return True
         return False
@@ -192,10 +441,7 @@ class Disks(object):
         '''
         Return an array of path that are direct childrens of the provided path
         '''
-        childrens = [ child for child, data in self.files.iteritems() if 
-                        child.startswith(path) and os.path.dirname(child) == path 
-                        and child != path ]
-        return childrens
+        return self.files.get_childrens(path)
 
     def get_parent_path(self, path):
         '''
@@ -207,6 +453,9 @@ class Disks(object):
         '''
         Returns the details of a specific path
         '''
+        # Sizes are about to be read, apply any deferred change first
+        if self._pending_sizes:
+            self.flush_sizes()
         details = self.files.get(path)
         if not details:
             print '%s: No such file or directory' % (path,)
@@ -221,30 +470,122 @@ class Disks(object):
         if self.files.get(path):
             print '%s: file or directory already exists' % (path,)
             return False
-        details = {
-            'size': int(size),
-            'owner': owner,
-            'group': group,
-            'filetype': filetype,
-            'mode': mode
-        }
+        details = FileNode(
+            size=int(size),
+            owner=owner,
+            group=group,
+            filetype=filetype,
+            mode=mode
+        )
         self.files.update({path: details})
         if int(size) != 0:
             self._update_parent_size(path, int(size))
         return True
 
+    def generate_files(self, pattern, count, sizes=0, seed=None, values=None,
+                       start=None, days=1, owner='root', group='root', mode=644):
+        '''
+        Add count files generated from pattern (see simulux.generator), ex.
+            disks.generate_files('/var/log/app/{date}/{n}.log', 1000000,
+                                 sizes=lognormal(4096), seed=1, days=30)
+        The missing folders are created. The sizes are summed per folder and
+        rolled up to the mount points once, at the end (of the enclosing
+        batch if any). The existing paths are skipped.
+        Return the number of files added, None if the pattern is invalid.
+        '''
+        if not pattern.startswith('/'):
+            print 'Invalid pattern %s: not an absolute path' % (pattern,)
+            return None
+        files = iter_files(pattern, count, sizes, seed=seed, values=values,
+                           start=start, days=days)
+        try:
+            first = next(files)
+        except StopIteration:
+            return 0
+        except (ValueError, KeyError, IndexError) as e:
+            print 'Invalid pattern %s: %s' % (pattern, e,)
+            return None
+        # Folders known, with whether they are new (empty); None if they can
+        # not be created
+        folders = {}
+        # New files waiting to be stored: folder -> {path: details}
+        batch = {}
+        batched = added = skipped = 0
+        with self.batch():
+            pending = self._pending_sizes
+            for path, size in chain([first], files):
+                folder = path[:path.rfind('/')] or '/'
+                childrens = batch.get(folder)
+                if childrens is None:
+                    if folder not in folders:
+                        folders[folder] = self._make_folders(folder, owner, group)
+                    if folders[folder] is None:
+                        skipped += 1
+                        continue
+                    childrens = batch[folder] = {}
+                if path in childrens or (not folders[folder] and path in self.files):
+                    skipped += 1
+                    continue
+                childrens[path] = FileNode(size, owner, group, 'file', mode)
+                if size:
+                    pending[folder] = pending.get(folder, 0) + size
+                batched += 1
+                if batched == GENERATE_BATCH:
+                    self._add_batch(batch)
+                    # Their files are stored: look them up from now on
+                    for stored in batch:
+                        folders[stored] = False
+                    added += batched
+                    batch = {}
+                    batched = 0
+            self._add_batch(batch)
+            added += batched
+        if skipped:
+            print '%d generated files skipped' % (skipped,)
+        return added
+
+    def _add_batch(self, batch):
+        for folder, childrens in batch.iteritems():
+            self.files.add_childrens(folder, childrens)
+
+    def _make_folders(self, path, owner='root', group='root'):
+        '''
+        Create the folder path and its missing parents (mkdir -p); return
+        whether path was created, None if it can not be
+        '''
+        missing = []
+        details = self.files.get(path)
+        while details is None:
+            missing.append(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+            details = self.files.get(path)
+        if details is None or not (details.get('mount') or
+                                   details.get('filetype') == 'folder'):
+            print "mkdir: cannot create directory `%s': Not a directory" % (path,)
+            return None
+        for path in reversed(missing):
+            self.files[path] = FileNode(0, owner, group, 'folder', 755)
+        return bool(missing)
+
     def update_file(self, path, **kwargs):
         '''
         Update existing file; can change only size, owner, group and mode. 
         Can not update filetype (file/folder)
         '''
-        details = self.get_details(path)
-        if not details:
+        if path not in self.files:
+            print '%s: No such file or directory' % (path,)
             return False
         for k, v in kwargs.iteritems():
             if k not in ['size', 'owner', 'group', 'mode']:
                 print 'Invalid key: %s' % (k)
                 return False
+        # Only copy a shared (copy-on-write) entry for a valid update
+        details = self.files.get_writable(path)
+        if path in self._pending_sizes:
+            self.flush_sizes()
         for k, v in kwargs.iteritems():
             if k == 'size':
                 # Need to update the size
@@ -260,59 +601,191 @@ class Disks(object):
         '''
         Remove file/folder, releasing used space.
         Can not remove if; not existing or mount point
+        On recursive removal, the whole subtree is collected first and its
+        size released from the parents in a single pass.
         '''
-        # Handle recursivity first...
-        if recursive:
-            childrens = self.get_childrens_path(path)
-            for child_path in childrens:
-                success = self.remove_file(child_path, recursive=True)
-                if not success:
-                    return False
-
-        details = self.get_details(path)
+        details = self.files.get(path)
         if not details:
+            print '%s: No such file or directory' % (path,)
             return False
-        size = details.get('size', 0)
         if details.get('mount') == True:
             print "rm: cannot remove `%s': Device or resource busy" % (path,)
             return False
         if details.get('filetype') == 'folder' and not recursive:
             print "rm: cannot remove `%s': Is a directory" % (path,)
             return False
-        if size == 0:
-            del self.files[path]
-            return True
-        self._update_parent_size(path, -size)
-        del self.files[path]
+
+        if recursive:
+            # Nothing get removed if a mount point lives within the subtree
+            mounts = self._get_mounts_below(path)
+            if mounts:
+                print "rm: cannot remove `%s': Device or resource busy" % (mounts[0],)
+                return False
+            # Pending deltas may target the folder or its subfolders
+            self.flush_sizes()
+
+        size = details.get('size', 0)
+        if size != 0:
+            self._update_parent_size(path, -size)
+        self.files.remove_tree(path)
+        return True
+
+    def move_file(self, path, new_path):
+        '''
+        Move file/folder (and its content) to new_path, moving its size from
+        the old parents to the new ones.
+        Can not move if; not existing, mount point or target already existing
+        '''
+        details = self.files.get(path)
+        if not details:
+            print '%s: No such file or directory' % (path,)
+            return False
+        if details.get('mount') == True or self._get_mounts_below(path):
+            print "mv: cannot move `%s': Device or resource busy" % (path,)
+            return False
+        if new_path in self.files:
+            print "mv: cannot move `%s': `%s' already exists" % (path, new_path,)
+            return False
+        if new_path == path or new_path.startswith(path.rstrip('/') + '/'):
+            print "mv: cannot move `%s' to a subdirectory of itself" % (path,)
+            return False
+        if not self.is_folder(self.get_parent_path(new_path)):
+            print "mv: cannot move `%s' to `%s': No such file or directory" % (path, new_path,)
+            return False
+        # Pending deltas may target the folder or its subfolders
+        self.flush_sizes()
+
+        size = details.get('size', 0)
+        if size != 0:
+            self._update_parent_size(path, -size)
+        self.files.move(path, new_path)
+        if size != 0:
+            self._update_parent_size(new_path, size)
         return True
 
+    def find(self, path='/', working_dir='', **criteria):
+        '''
+        Yield the paths below path (included) matching the criteria (name,
+        regex, filetype, size, owner, group, mode, mindepth, maxdepth; see
+        simulux.search), ex. disks.find('/var', name='*.log', size='+100M')
+        '''
+        try:
+            return search.find(self, self.shorten_path(path, working_dir),
+                               **criteria)
+        except search.SearchError as e:
+            print 'find: %s' % (e,)
+            return iter([])
+
+    def glob(self, pattern, working_dir='', **criteria):
+        '''
+        Yield the paths matching the shell pattern and the criteria (see
+        simulux.search), ex. disks.glob('/var/log/**/*.log', owner='www')
+        '''
+        try:
+            return search.glob(self, self.shorten_path(pattern, working_dir),
+                               **criteria)
+        except search.SearchError as e:
+            print 'glob: %s' % (e,)
+            return iter([])
+
+    def _get_mounts_below(self, path):
+        '''
+        Return the mount points found below path
+        '''
+        prefix = path.rstrip('/') + '/'
+        return [ mount for mount in self.mounts if mount.startswith(prefix) ]
+
+    def get_descendants_path(self, path):
+        '''
+        Return an array of all the paths below the provided path (any depth)
+        '''
+        return list(self.files.iter_descendants(path))
+
     def _update_parent_size(self, path, size):
         '''
         Update the size recusively until the 'mount'
         '''
-        # We want to manipulate the parent of the provided path
-        parent_path = self.get_parent_path(path)
-
-        details = self.get_details(parent_path)
-        new_size = details.get('size') + size
-        details.update({'size': new_size})
-        self.files.update({parent_path: details})
-        # If mount level file / folder, exit
-        if details.get('mount') == True:
+        # In batch mode, only record the delta against the direct parent
+        if self._batch_depth:
+            parent_path = self.get_parent_path(path)
+            self._pending_sizes[parent_path] = \
+                self._pending_sizes.get(parent_path, 0) + size
             return
-        # Else recurse to the parent
-        self._update_parent_size(parent_path, size)
+
+        for parent_path, details in self.files.iter_parents(path):
+            if not details:
+                print '%s: No such file or directory' % (parent_path,)
+                return
+            details.update({'size': details.get('size') + size})
+            # If mount level file / folder, exit
+            if details.get('mount') == True:
+                return
     
-    def get_file_content(self, filename, working_dir=''):
+    @contextmanager
+    def batch(self):
         '''
-        Opens a file if it exists
+        Defer the size propagation of add_file / update_file / remove_file
+        until the end of the block (or until a size is read).
+        Usage:
+            with disks.batch():
+                for path in paths:
+                    disks.update_file(path, size=...)
+        '''
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush_sizes()
+
+    def flush_sizes(self):
+        '''
+        Apply the pending size deltas with a single bottom-up pass; each
+        folder is written once whatever the number of changes below it
+        '''
+        if not self._pending_sizes:
+            return
+        levels = {}
+        for path, size in self._pending_sizes.iteritems():
+            levels.setdefault(self._get_path_depth(path), {})[path] = size
+        self._pending_sizes = {}
+
+        for depth in range(max(levels), -1, -1):
+            for path, size in levels.pop(depth, {}).iteritems():
+                if size == 0:
+                    continue
+                details = self.files.get_writable(path)
+                if not details:
+                    print '%s: No such file or directory' % (path,)
+                    continue
+                details.update({'size': details.get('size') + size})
+                # Stop at the mount point
+                if details.get('mount') == True:
+                    continue
+                parent_path = self.get_parent_path(path)
+                if parent_path == path:
+                    continue
+                parent_level = levels.setdefault(self._get_path_depth(parent_path), {})
+                parent_level[parent_path] = parent_level.get(parent_path, 0) + size
+
+    def _get_path_depth(self, path):
+        '''
+        Return the number of components of an absolute path ('/' is 0)
+        '''
+        if path == '/':
+            return 0
+        return path.count('/')
+
+    def get_real_path(self, filename, working_dir=''):
+        '''
+        Return the path of the fixture file backing filename (None if none)
         '''
-        
         # check if the file exists etc.
         filename = self.shorten_path(filename, working_dir)
-        if not self.is_file(filename, working_dir):
+        if not self.is_file(filename):
             return None
-        details = self.get_details(filename)
+        details = self.files.get(filename)
         real_file = details.get('real_filename', None)
         if not real_file:
             return None
@@ -321,10 +794,106 @@ class Disks(object):
         
         if not os.path.isfile( real_path ):
             return None
+        return real_path
+
+    @contextmanager
+    def _open_content(self, real_path):
+        '''
+        Provide the content of a fixture file; the buffer shared through the
+        content cache, or a read-only mmap for files too large to be cached
+        '''
+        content = CONTENT_CACHE.get(real_path)
+        if content is not None:
+            yield content
+            return
+        with open( real_path, 'rb' ) as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield ''
+                return
+            content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield content
+            finally:
+                content.close()
+
+    def get_file_content(self, filename, working_dir=''):
+        '''
+        Opens a file if it exists
+        '''
+        real_path = self.get_real_path(filename, working_dir)
+        if not real_path:
+            return None
             
         #open file and return content
         
-        content = ''
-        with open( real_path ) as f:
-            content = f.readlines()
-        return content
+        with self._open_content(real_path) as content:
+            # As file.readlines, only \n ends the lines
+            return StringIO(content[:]).readlines()
+
+    def get_file_buffer(self, filename, working_dir=''):
+        '''
+        Return a memoryview on the shared content of a file (no copy), None
+        if no content or too large to be cached
+        '''
+        real_path = self.get_real_path(filename, working_dir)
+        if not real_path:
+            return None
+        return CONTENT_CACHE.get_view(real_path)
+
+    def iter_file_lines(self, filename, working_dir=''):
+        '''
+        Yield the lines of a file one at a time (nothing if no content)
+        '''
+        real_path = self.get_real_path(filename, working_dir)
+        if not real_path:
+            return
+        with self._open_content(real_path) as content:
+            if not isinstance(content, mmap.mmap):
+                content = StringIO(content)
+            for line in iter(content.readline, ''):
+                yield line
+
+    def head_file(self, filename, lines=10, working_dir=''):
+        '''
+        Return the first lines of a file, reading only what is needed
+        '''
+        real_path = self.get_real_path(filename, working_dir)
+        if not real_path:
+            return None
+        return list(islice(self.iter_file_lines(filename, working_dir), lines))
+
+    def read_file_range(self, filename, offset=0, length=None, working_dir=''):
+        '''
+        Return `length` bytes of a file starting at `offset` (up to the end of
+        the file if length is None)
+        '''
+        real_path = self.get_real_path(filename, working_dir)
+        if not real_path:
+            return None
+        with self._open_content(real_path) as content:
+            if length is None:
+                return content[offset:]
+            return content[offset:offset + length]
+
+    def tail_file(self, filename, lines=10, working_dir=''):
+        '''
+        Return the last lines of a file, searching the line breaks from the
+        end of the file so only the returned lines are read
+        '''
+        real_path = self.get_real_path(filename, working_dir)
+        if not real_path:
+            return None
+        with self._open_content(real_path) as content:
+            size = len(content)
+            if size == 0 or lines <= 0:
+                return []
+            # The final line break does not start a new line
+            end = size - 1 if content[size - 1] == '\n' else size
+            start = 0
+            for idx in range(lines):
+                found = content.rfind('\n', 0, end)
+                if found == -1:
+                    start = 0
+                    break
+                start, end = found + 1, found
+            return StringIO(content[start:size]).readlines()
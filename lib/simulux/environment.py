@@ -2,15 +2,37 @@ from disks import Disks
 from memory import Memory
 from cpus import CPUS
 from processes import Processes
+from clock import Clock
+from metrics import Metrics, METRICS_SIZE
+from snapshot import save_snapshot, load_snapshot
+from utils import get_checkpoint
+
+# Default seconds between two metrics samples
+METRICS_INTERVAL = 5
+# Server components recorded by the checkpoints
+CHECKPOINT_COMPONENTS = ['memory', 'cpus', 'disks', 'processes']
 
 class Environment(object):
     """
     Simulated Environment, including disks, memory, etc.
     """
-    def __init__(self, servers={}):
+    def __init__(self, servers={}, templates={}):
         self.servers = {}
+        # Simulated time; drives the scheduled events and rates of the servers
+        self.clock = Clock()
+        # Checkpoint level of each server, per Environment checkpoint
+        self.checkpoints = []
+        # Reference servers the other servers can be cloned from
+        self.templates = {}
+        for name, details in templates.iteritems():
+            self.add_template(name, details)
         for name, details in servers.iteritems():
-            self.servers.update({name: self.add_server(details)})
+            # Servers defined as {'template': name} are cloned from the template
+            template = details.get('template')
+            if template:
+                self.clone_server(name, template)
+            else:
+                self.servers.update({name: self.add_server(details)})
 
     def add_server(self, details={}):
         '''
@@ -30,6 +52,38 @@ class Environment(object):
         })
         return server
 
+    def add_template(self, name, details={}):
+        '''
+        Add a server template to the Environment. Templates are shared by the
+        servers cloned from them and must not be modified.
+        '''
+        template = self.add_server(details)
+        self.templates.update({name: template})
+        return template
+
+    def clone_server(self, name, template):
+        '''
+        Add a server cloned from a template; files and processes are shared
+        with the template until the server changes them
+        '''
+        if template not in self.templates:
+            print 'Unknown template: %s' % (template,)
+            return None
+        template = self.templates.get(template)
+        server = {}
+        server.update({'memory': template['memory'].clone()})
+        server.update({'disks': template['disks'].clone()})
+        server.update({'cpus': template['cpus'].clone()})
+        server.update({
+            'processes': template['processes'].clone(
+                cpus=server.get('cpus'),
+                memory=server.get('memory'),
+                disks=server.get('disks')
+            )
+        })
+        self.servers.update({name: server})
+        return server
+
     def add_disks(self, name, layout):
         '''
         Add disks to a server
@@ -38,3 +92,190 @@ class Environment(object):
         if server.Disks:
             server.Disks.add_layout(layout)
         
+
+    def get_server(self, name):
+        '''
+        Return a server, with its rates brought up to the current time
+        '''
+        server = self.servers.get(name)
+        if server is None:
+            print 'Unknown server: %s' % (name,)
+            return None
+        self.clock.sync(name)
+        return server
+
+    def advance(self, seconds):
+        '''
+        Move the simulated time forward, running the scheduled events
+        '''
+        self.clock.advance(seconds)
+
+    def schedule(self, name, delay, callback, args=(), interval=None):
+        '''
+        Run callback(server, *args) on server name in delay seconds (then
+        every interval seconds if set)
+        '''
+        server = self.servers.get(name)
+        if server is None:
+            print 'Unknown server: %s' % (name,)
+            return None
+        return self.clock.schedule(delay, callback, (server,) + tuple(args),
+                                   key=name, interval=interval)
+
+    def grow_file(self, name, path, rate, until=None):
+        '''
+        Grow a file of server name by rate bytes per second (ex. a log file)
+        '''
+        server = self.servers.get(name)
+        if server is None:
+            print 'Unknown server: %s' % (name,)
+            return None
+        disks = server['disks']
+        def apply(size):
+            details = disks.get_details(path)
+            if not details:
+                return False
+            return disks.update_file(path, size=details['size'] + size) is not False
+        return self.clock.add_rate(name, apply, rate, until=until)
+
+    def leak_memory(self, name, pid, rate, until=None):
+        '''
+        Grow the RSS of a process of server name by rate bytes per second
+        '''
+        server = self.servers.get(name)
+        if server is None:
+            print 'Unknown server: %s' % (name,)
+            return None
+        processes = server['processes']
+        def apply(size):
+            return processes.update_rss(pid, size)
+        return self.clock.add_rate(name, apply, rate, until=until)
+
+    def ramp_cpu(self, name, cpu_type, rate, until=None):
+        '''
+        Change the cpu_type usage of server name by rate per second
+        '''
+        server = self.servers.get(name)
+        if server is None:
+            print 'Unknown server: %s' % (name,)
+            return None
+        cpus = server['cpus']
+        def apply(diff):
+            return cpus.update(cpu_type, diff)
+        return self.clock.add_rate(name, apply, rate, until=until, integer=False)
+
+    def enable_metrics(self, names=None, interval=METRICS_INTERVAL,
+                       size=METRICS_SIZE):
+        '''
+        Sample the metrics of the servers (all by default) every interval
+        seconds, keeping the last size samples in server['metrics']
+        '''
+        if names is None:
+            names = self.servers.keys()
+        for name in names:
+            server = self.servers.get(name)
+            if server is None:
+                print 'Unknown server: %s' % (name,)
+                continue
+            if 'metrics' in server:
+                continue
+            metrics = Metrics(server, size=size)
+            server.update({'metrics': metrics})
+            metrics.sample(self.clock.now)
+            self.clock.schedule(interval, self._sample, (name,), key=name,
+                                interval=interval)
+
+    def _sample(self, name):
+        server = self.servers.get(name)
+        if server is not None:
+            server['metrics'].sample(self.clock.now)
+
+    def snapshot(self, filename):
+        '''
+        Save the state of all the servers and templates in filename (see
+        simulux.snapshot); the scheduled events, rates and metrics are not
+        saved
+        '''
+        self.clock.sync_all()
+        save_snapshot(filename, self.servers, self.clock.now, self.templates)
+
+    def restore(self, filename):
+        '''
+        Replace the servers and templates by the ones saved in filename; the
+        scheduled events and rates are dropped
+        '''
+        snapshot = load_snapshot(filename)
+        if snapshot is None:
+            return False
+        servers, now, templates = snapshot
+        self.servers = servers
+        self.templates = templates
+        self.clock = Clock(now)
+        self.checkpoints = []
+        return True
+
+    def checkpoint(self):
+        '''
+        Record the state of the servers, return the checkpoint level. Only
+        the changes made afterwards are recorded, so the same state can be
+        branched in many variants cheaply:
+            level = env.checkpoint()
+            for variant in variants:
+                run(env, variant)
+                env.rollback(level)
+        The clock (time, events and rates) is not part of the checkpoints.
+        '''
+        self.clock.sync_all()
+        levels = {}
+        for name, server in self.servers.iteritems():
+            levels[name] = dict((component, server[component].checkpoint())
+                                for component in CHECKPOINT_COMPONENTS)
+        self.checkpoints.append(levels)
+        return len(self.checkpoints) - 1
+
+    def _get_levels(self, checkpoint):
+        # Oldest levels of each server over checkpoint and the newer ones
+        levels = {}
+        for checkpoint_levels in self.checkpoints[checkpoint:]:
+            for name, level in checkpoint_levels.iteritems():
+                levels.setdefault(name, level)
+        return levels
+
+    def rollback(self, checkpoint=None):
+        '''
+        Undo the changes made to the servers since checkpoint (the last one
+        by default), dropping the newer checkpoints and the servers added
+        since; checkpoint is kept
+        '''
+        checkpoint = get_checkpoint(self.checkpoints, checkpoint)
+        if checkpoint is None:
+            return False
+        # Apply the rates up to now, they restart from the restored state
+        self.clock.sync_all()
+        levels = self._get_levels(checkpoint)
+        names = self.checkpoints[checkpoint]
+        del self.checkpoints[checkpoint + 1:]
+        self.servers = dict((name, self.servers[name]) for name in names)
+        for name in names:
+            server = self.servers[name]
+            for component in CHECKPOINT_COMPONENTS:
+                server[component].rollback(levels[name][component])
+        return True
+
+    def release(self, checkpoint=None):
+        '''
+        Drop checkpoint (the last one by default) and the newer ones,
+        keeping the changes
+        '''
+        checkpoint = get_checkpoint(self.checkpoints, checkpoint)
+        if checkpoint is None:
+            return False
+        levels = self._get_levels(checkpoint)
+        del self.checkpoints[checkpoint:]
+        for name, server_levels in levels.iteritems():
+            server = self.servers.get(name)
+            if server is None:
+                continue
+            for component in CHECKPOINT_COMPONENTS:
+                server[component].release(server_levels[component])
+        return True
@@ -1,4 +1,6 @@
 class SimuluxDiskException(BaseException):
     def __init__(self, args):
         self.args = args
-        
+
+class SimuluxShardException(Exception):
+    pass
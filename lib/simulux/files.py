@@ -0,0 +1,196 @@
+'''
+File node
+
+Compact representation of a file / folder of the Disks tree. It behaves like
+the dict it replaces (get, update, copy, items, ...) so callers of
+Disks.get_details keep working, while using far less memory:
+- attributes are stored in __slots__ (no per-node dict),
+- owner / group strings are interned and shared across all the nodes,
+- filetype is stored as a small integer.
+
+A key is considered missing when its value is None (or mount is False).
+Any other key (ex. real_filename) is kept in the `extra` dict.
+'''
+
+FILETYPE_NONE = 0
+FILETYPE_FILE = 1
+FILETYPE_FOLDER = 2
+
+# Filetype names indexed by their code; unknown filetypes get registered
+FILETYPES = [None, 'file', 'folder']
+FILETYPE_CODES = {None: FILETYPE_NONE, 'file': FILETYPE_FILE, 'folder': FILETYPE_FOLDER}
+
+# Shared owner / group strings
+_STRINGS = {}
+
+def intern_string(value):
+    '''
+    Return the shared instance of value (works for str and unicode)
+    '''
+    if value is None:
+        return None
+    return _STRINGS.setdefault(value, value)
+
+def filetype_code(filetype):
+    '''
+    Return the integer code of a filetype name
+    '''
+    code = FILETYPE_CODES.get(filetype)
+    if code is None:
+        code = len(FILETYPES)
+        FILETYPES.append(filetype)
+        FILETYPE_CODES[filetype] = code
+    return code
+
+class FileNode(object):
+    """Define a FileNode object"""
+    __slots__ = ('size', 'owner', 'group', 'ftype', 'mode', 'mount', 'extra')
+
+    KEYS = ('filetype', 'size', 'owner', 'group', 'mode', 'mount')
+
+    def __init__(self, size=None, owner=None, group=None, filetype=None,
+                 mode=None, mount=False):
+        self.size = size
+        self.owner = intern_string(owner)
+        self.group = intern_string(group)
+        self.ftype = filetype_code(filetype)
+        self.mode = mode
+        self.mount = mount
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, details, skip=('content',)):
+        '''
+        Build a node from a layout dict, ignoring the keys in skip
+        '''
+        node = cls()
+        for key, value in details.iteritems():
+            if key in skip:
+                continue
+            node[key] = value
+        return node
+
+    @property
+    def filetype(self):
+        return FILETYPES[self.ftype]
+
+    def __getitem__(self, key):
+        if key == 'filetype':
+            value = FILETYPES[self.ftype]
+        elif key == 'mount':
+            value = self.mount or None
+        elif key in self.KEYS:
+            value = getattr(self, key)
+        elif self.extra is not None:
+            value = self.extra.get(key)
+        else:
+            value = None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key == 'filetype':
+            self.ftype = filetype_code(value)
+        elif key == 'mount':
+            self.mount = bool(value)
+        elif key in ('owner', 'group'):
+            setattr(self, key, intern_string(value))
+        elif key in self.KEYS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key == 'filetype':
+            self.ftype = FILETYPE_NONE
+        elif key == 'mount':
+            self.mount = False
+        elif key in self.KEYS:
+            setattr(self, key, None)
+        else:
+            del self.extra[key]
+            if not self.extra:
+                self.extra = None
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def iteritems(self):
+        for key in self.KEYS:
+            value = self.get(key)
+            if value is not None:
+                yield key, value
+        if self.extra is not None:
+            for item in self.extra.iteritems():
+                yield item
+
+    def iterkeys(self):
+        for key, value in self.iteritems():
+            yield key
+
+    __iter__ = iterkeys
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return [ value for key, value in self.iteritems() ]
+
+    def update(self, other=None, **kwargs):
+        if other is not None:
+            for key, value in other.iteritems():
+                self[key] = value
+        for key, value in kwargs.iteritems():
+            self[key] = value
+
+    def copy(self):
+        '''
+        Return the details as a plain dict
+        '''
+        return dict(self.iteritems())
+
+    def clone(self):
+        '''
+        Return a new node with the same details
+        '''
+        node = FileNode.__new__(FileNode)
+        for name in self.__slots__:
+            setattr(node, name, getattr(self, name))
+        if self.extra is not None:
+            node.extra = self.extra.copy()
+        return node
+
+    def __len__(self):
+        return len(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (FileNode, dict)):
+            return self.copy() == dict(other.iteritems())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return 'FileNode(%r)' % (self.copy(),)
@@ -0,0 +1,102 @@
+import os
+from collections import OrderedDict
+
+'''
+Fixture content cache
+
+The content of the fixture files backing the simulated files (real_filename)
+is shared by all the Disks of the process: hundreds of simulated servers
+reading the same /etc/passwd or log fixture use a single buffer.
+
+Entries are keyed on (real path, mtime, size) so a modified fixture is read
+again, and the least recently used entries are dropped once the byte budget
+is exceeded. Files larger than the budget are never cached.
+'''
+
+# Default byte budget of the shared cache
+CONTENT_CACHE_SIZE = 64 * 1024 * 1024
+
+class ContentCache(object):
+    """Define a ContentCache object"""
+    def __init__(self, max_bytes=CONTENT_CACHE_SIZE):
+        super(ContentCache, self).__init__()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # (real path, mtime, size) -> content
+        self.data = OrderedDict()
+        # real path -> key of its cached version
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, real_path):
+        '''
+        Return the content of real_path (str), None if it can not be cached
+        '''
+        real_path = os.path.abspath(real_path)
+        try:
+            stat = os.stat(real_path)
+        except OSError:
+            return None
+        key = (real_path, stat.st_mtime, stat.st_size)
+        content = self.data.pop(key, None)
+        if content is not None:
+            self.data[key] = content
+            self.hits += 1
+            return content
+        self.misses += 1
+        # Drop the outdated version of the file
+        self._remove(self.keys.get(real_path))
+        if stat.st_size > self.max_bytes:
+            return None
+        with open(real_path, 'rb') as f:
+            content = f.read()
+        # The file may have changed while being read
+        key = (real_path, stat.st_mtime, len(content))
+        self.data[key] = content
+        self.keys[real_path] = key
+        self.bytes += len(content)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.data)))
+        return content
+
+    def get_view(self, real_path, offset=0, length=None):
+        '''
+        Return a memoryview on (a range of) the cached content of real_path,
+        without copying it. None if the file can not be cached.
+        '''
+        content = self.get(real_path)
+        if content is None:
+            return None
+        view = memoryview(content)
+        if length is None:
+            return view[offset:]
+        return view[offset:offset + length]
+
+    def _remove(self, key):
+        content = self.data.pop(key, None)
+        if content is None:
+            return
+        self.bytes -= len(content)
+        if self.keys.get(key[0]) == key:
+            del self.keys[key[0]]
+
+    def clear(self):
+        self.data.clear()
+        self.keys.clear()
+        self.bytes = 0
+
+    def info(self):
+        '''
+        Return the cache statistics
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'files': len(self.data),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes
+        }
+
+# Process wide cache shared by all the Disks objects
+CONTENT_CACHE = ContentCache()
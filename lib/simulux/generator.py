@@ -0,0 +1,119 @@
+import bisect
+import datetime
+import math
+import random
+import string
+
+'''
+Synthetic file trees
+
+Generates the (path, size) of many files from a path pattern, to reproduce
+large filesystems (ex. a disk filled by millions of small logs); see
+Disks.generate_files which stores them.
+
+Patterns use the str.format syntax, ex. '/var/log/app/{date}/{n}.log':
+- {n}: index of the file (0 to count - 1),
+- {date}: day of the file (YYYY-MM-DD), the files being spread evenly over
+  `days` days from `start`,
+- any other field is taken from `values`: name -> list of values (file n
+  gets values[n % len(values)]) or function(n, rng) returning the value.
+
+Sizes are either a fixed number, a (low, high) tuple (uniform) or a size
+distribution: a function(rng) returning the size, see uniform, lognormal
+and choice. rng is a random.Random seeded with `seed`, so the same seed
+generates the same tree.
+'''
+
+def uniform(low, high):
+    '''
+    Sizes evenly spread between low and high (included)
+    '''
+    def sample(rng):
+        return rng.randint(low, high)
+    return sample
+
+def lognormal(median, sigma=1.0, maximum=None):
+    '''
+    Sizes around median with a long tail of large ones (as most real
+    files), optionally capped to maximum
+    '''
+    mu = math.log(median)
+    def sample(rng):
+        size = int(rng.lognormvariate(mu, sigma))
+        if maximum is not None and size > maximum:
+            return maximum
+        return size
+    return sample
+
+def choice(sizes, weights=None):
+    '''
+    Sizes picked among sizes, with the relative weights if set
+    '''
+    sizes = list(sizes)
+    if weights is None:
+        def sample(rng):
+            return sizes[int(rng.random() * len(sizes))]
+        return sample
+    cumulated = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulated.append(total)
+    def sample(rng):
+        idx = bisect.bisect_right(cumulated, rng.random() * total)
+        return sizes[min(idx, len(sizes) - 1)]
+    return sample
+
+def get_sampler(sizes):
+    '''
+    Return the function(rng) generating the sizes described by sizes
+    '''
+    if callable(sizes):
+        return sizes
+    if isinstance(sizes, (tuple, list)):
+        return uniform(*sizes)
+    size = int(sizes)
+    return lambda rng: size
+
+def get_fields(pattern):
+    '''
+    Return the names of the fields of pattern
+    '''
+    return set(field.split('.')[0].split('[')[0] for text, field, spec, conversion
+               in string.Formatter().parse(pattern) if field)
+
+def iter_files(pattern, count, sizes=0, seed=None, values=None, start=None,
+               days=1):
+    '''
+    Yield the (path, size) of the count files generated from pattern
+    '''
+    rng = random.Random(seed)
+    sample = get_sampler(sizes)
+    values = values or {}
+    fields = get_fields(pattern)
+    missing = fields - set(values) - set(['n', 'date'])
+    if missing:
+        raise ValueError('No values for %s' % (', '.join(sorted(missing)),))
+    # Only compute the fields used by the pattern
+    getters = []
+    for name in fields:
+        if name == 'n':
+            continue
+        if name == 'date' and name not in values:
+            if start is None:
+                start = datetime.date.today()
+            dates = [ (start + datetime.timedelta(days=day)).isoformat()
+                      for day in range(days) ]
+            getters.append((name, lambda n, rng, dates=dates:
+                            dates[n * len(dates) // count]))
+        elif callable(values[name]):
+            getters.append((name, values[name]))
+        else:
+            items = list(values[name])
+            getters.append((name, lambda n, rng, items=items:
+                            items[n % len(items)]))
+    for n in xrange(count):
+        kwargs = {'n': n}
+        for name, getter in getters:
+            kwargs[name] = getter(n, rng)
+        yield pattern.format(**kwargs), sample(rng)
@@ -1,6 +1,7 @@
 import os
 from simulux.utils import load_json
 from simulux.utils import load_layout
+from simulux.utils import get_checkpoint
 from simulux.constants import DIST_DEFAULTS_PATH
 
 DEFAULT_LAYOUT = os.path.join(DIST_DEFAULTS_PATH, 'memory_layout.json')
@@ -31,6 +32,8 @@ class Memory(object):
                 "cached": 0,
                 "total": 0
             }
+        # Memory data of each checkpoint
+        self.checkpoints = []
 
         # Set default layout
         self.set_layout()
@@ -50,6 +53,44 @@ class Memory(object):
             assert int(self.data['used']) + int(self.data['free']) == int(self.data['total'])
             
 
+    def clone(self):
+        '''
+        Return a new Memory object with the same values
+        '''
+        memory = object.__new__(self.__class__)
+        memory.data = self.data.copy()
+        memory.checkpoints = []
+        return memory
+
+    def checkpoint(self):
+        '''
+        Record the current values, return the checkpoint level
+        '''
+        self.checkpoints.append(self.data.copy())
+        return len(self.checkpoints) - 1
+
+    def rollback(self, level=None):
+        '''
+        Restore the values of checkpoint level (the last one by default),
+        dropping the newer checkpoints
+        '''
+        level = get_checkpoint(self.checkpoints, level)
+        if level is None:
+            return False
+        del self.checkpoints[level + 1:]
+        self.data = self.checkpoints[level].copy()
+        return True
+
+    def release(self, level=None):
+        '''
+        Drop checkpoint level (the last one by default) and the newer ones
+        '''
+        level = get_checkpoint(self.checkpoints, level)
+        if level is None:
+            return False
+        del self.checkpoints[level:]
+        return True
+
     def set_layout(self, layout_file=None):
         '''
         Set the Memory configuration based on the default layout (or get it overriden)
@@ -118,6 +159,23 @@ class Memory(object):
             return True
         return False
         
+    def update_many(self, deltas):
+        '''
+        Apply many updates at once; deltas is a dict or a list of
+        (mem_type, size). Sizes are summed per mem_type and applied once.
+        '''
+        if isinstance(deltas, dict):
+            deltas = deltas.iteritems()
+        totals = {}
+        for mem_type, size in deltas:
+            if mem_type not in ['shared', 'cached', 'buffers', 'used', 'free']:
+                print 'Invalid memory type: %s' % (mem_type,)
+                return False
+            totals[mem_type] = totals.get(mem_type, 0) + int(size)
+        for mem_type, size in totals.iteritems():
+            self.update(mem_type, size)
+        return True
+        
     def dump(self):
         '''
         Return the full memory details
@@ -0,0 +1,178 @@
+import math
+from array import array
+
+'''
+Server metrics
+
+History of the values of a server, sampled at a fixed interval by the
+Environment clock:
+- RingBuffer: fixed size, array backed buffer of the last samples of a
+  series; memory use does not depend on the run length, the last value is
+  read in O(1) and a window of the last N samples in O(N),
+- LoadAverage: exponentially decayed 1 / 5 / 15 minutes load averages of the
+  number of runnable (R) and uninterruptible (D) processes, as the kernel,
+- Metrics: the series of a server; cpu.<type> (average over the cores),
+  memory.<field>, processes.total, processes.<state>, partition.<mount>
+  (used bytes) and load.1 / load.5 / load.15.
+'''
+
+# Default number of samples kept per series
+METRICS_SIZE = 720
+# Process states counted by processes.<state> and by the load averages
+PROCESS_STATES = ['R', 'S', 'D', 'Z', 'T']
+LOAD_STATES = ['R', 'D']
+LOAD_MINUTES = [1, 5, 15]
+
+def percentile(values, pct):
+    '''
+    Return the pct (0-100) percentile of values (nearest rank), None if empty
+    '''
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+class RingBuffer(object):
+    """Define a RingBuffer object"""
+    def __init__(self, size=METRICS_SIZE, typecode='d'):
+        super(RingBuffer, self).__init__()
+        self.size = size
+        self.data = array(typecode, [0] * size)
+        # Number of values ever appended
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.count % self.size] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def last(self):
+        '''
+        Return the last value appended, None if empty
+        '''
+        if not self.count:
+            return None
+        return self.data[(self.count - 1) % self.size]
+
+    def window(self, count=None):
+        '''
+        Return the last `count` values (all the kept ones by default),
+        oldest first
+        '''
+        length = len(self)
+        if count is None or count > length:
+            count = length
+        if count <= 0:
+            return []
+        end = self.count % self.size
+        start = (end - count) % self.size
+        if start < end:
+            return self.data[start:end].tolist()
+        return self.data[start:].tolist() + self.data[:end].tolist()
+
+class LoadAverage(object):
+    """Define a LoadAverage object"""
+    def __init__(self):
+        super(LoadAverage, self).__init__()
+        self.loads = [0.0] * len(LOAD_MINUTES)
+
+    def update(self, running, elapsed):
+        '''
+        Decay the averages towards the number of running processes over
+        elapsed seconds
+        '''
+        for idx, minutes in enumerate(LOAD_MINUTES):
+            decay = math.exp(-float(elapsed) / (60 * minutes))
+            self.loads[idx] = self.loads[idx] * decay + running * (1 - decay)
+
+    def get(self):
+        return tuple(self.loads)
+
+class Metrics(object):
+    """Define a Metrics object"""
+    def __init__(self, server, size=METRICS_SIZE):
+        super(Metrics, self).__init__()
+        self.server = server
+        self.size = size
+        self.times = RingBuffer(size)
+        # name -> RingBuffer
+        self.series = {}
+        self.loadavg = LoadAverage()
+        self.last_time = None
+
+    def _record(self, name, value):
+        series = self.series.get(name)
+        if series is None:
+            series = RingBuffer(self.size)
+            # Series appearing late (new partition) are padded with zeros
+            series.count = self.times.count - 1
+            self.series[name] = series
+        series.append(value)
+
+    def sample(self, now):
+        '''
+        Record the current values of the server at time now
+        '''
+        self.times.append(now)
+        server = self.server
+        cpus = server.get('cpus')
+        if cpus is not None:
+            for cpu_type in cpus.data:
+                value = cpus.get(cpu_type, avg=True)
+                if value is not False:
+                    self._record('cpu.' + cpu_type, value)
+        memory = server.get('memory')
+        if memory is not None:
+            for field, value in memory.dump().iteritems():
+                self._record('memory.' + field, value)
+        processes = server.get('processes')
+        running = 0
+        if processes is not None:
+            self._record('processes.total', len(processes.processes))
+            states = processes.indexes['state']
+            for state in PROCESS_STATES:
+                self._record('processes.' + state, len(states.get(state, ())))
+            running = sum(len(states.get(state, ())) for state in LOAD_STATES)
+        disks = server.get('disks')
+        if disks is not None:
+            disks.flush_sizes()
+            for partition in disks.partitions.itervalues():
+                mount = partition.get('mount')
+                details = disks.files.get(mount) if mount else None
+                if details is not None:
+                    self._record('partition.' + mount, details.get('size', 0))
+        if self.last_time is not None:
+            self.loadavg.update(running, now - self.last_time)
+        self.last_time = now
+        for idx, minutes in enumerate(LOAD_MINUTES):
+            self._record('load.%d' % (minutes,), self.loadavg.loads[idx])
+
+    def get_loadavg(self):
+        '''
+        Return the 1, 5 and 15 minutes load averages, as uptime
+        '''
+        return self.loadavg.get()
+
+    def get_last(self, name):
+        '''
+        Return the last sampled value of a series, None if unknown
+        '''
+        series = self.series.get(name)
+        if series is None:
+            return None
+        return series.last()
+
+    def get_window(self, name, count=None):
+        '''
+        Return the (time, value) of the last `count` samples of a series,
+        oldest first, as sar
+        '''
+        series = self.series.get(name)
+        if series is None:
+            print 'Unknown metric: %s' % (name,)
+            return []
+        values = series.window(count)
+        return zip(self.times.window(len(values)), values)
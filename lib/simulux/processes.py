@@ -1,10 +1,23 @@
 import os
 from simulux.utils import load_json
 from simulux.utils import load_layout
+from simulux.utils import TopIndex
+from simulux.utils import get_checkpoint
 from simulux.constants import DIST_DEFAULTS_PATH
+from simulux.proctable import ProcessTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 DEFAULT_LAYOUT = os.path.join(DIST_DEFAULTS_PATH, 'processes_layout.json')
 
+# Process config keys with an index: value -> set(pids)
+INDEXED_KEYS = ['name', 'uid', 'state', 'ppid']
+# Keys the processes can be ranked on (see get_sort_value)
+SORT_KEYS = ['rss', 'cpu']
+
 '''
 Processes object 
 
@@ -27,8 +40,7 @@ class Processes(object):
         self.disks = disks
         self.memory = memory
         
-        # Store all the processes in a array
-        self.processes = {}
+        self._init_storage()
 
         # Add default layout
         self.set_layout()
@@ -36,58 +48,370 @@ class Processes(object):
         # Add scenario specific processes
         if conf:
             processes_conf = conf.get('processes', [])
-            for process_conf in processes_conf:
-                # Create a process and add it to the list
-                process = Process(
-                    config=process_conf,
-                    cpus=self.cpus,
-                    disks=self.disks,
-                    memory=self.memory
-                )
-                self.processes.update({process_conf.get('pid'): process})
+            self.add_processes(processes_conf)
+
 
+    def _init_storage(self):
+        # Store all the processes in a array
+        self.processes = {}
+        # Secondary indexes, kept up to date by add / kill / set_state; the
+        # processes should not be changed through self.processes directly
+        self.indexes = dict((key, {}) for key in INDEXED_KEYS)
+        # Processes ranked on each sort key
+        self.sorted = dict((key, TopIndex()) for key in SORT_KEYS)
+        # Undo journal of each checkpoint: pid -> (config, allocated) before
+        # its first change, None if the process did not exist
+        self.journals = []
+
+    def _copy_indexes(self):
+        return dict((key, dict((value, set(pids)) for value, pids
+                               in index.iteritems()))
+                    for key, index in self.indexes.iteritems())
+
+    def _copy_sorted(self):
+        return dict((key, index.copy()) for key, index in self.sorted.iteritems())
+
+    def clone(self, cpus={}, disks={}, memory={}):
+        '''
+        Return a new Processes object with the same processes, bound to the
+        provided resources. The configs of the processes are shared and the
+        resources are not allocated again; cpus and memory are expected to be
+        clones of the ones of this object.
+        '''
+        processes = object.__new__(self.__class__)
+        processes.cpus = cpus
+        processes.disks = disks
+        processes.memory = memory
+        processes.processes = {}
+        processes.indexes = self._copy_indexes()
+        processes.sorted = self._copy_sorted()
+        processes.journals = []
+        for pid, process in self.processes.iteritems():
+            processes.processes[pid] = Process(
+                config=process.config,
+                cpus=cpus,
+                disks=disks,
+                memory=memory,
+                allocate=False
+            )
+            # Resources are accounted in the cloned cpus / memory
+            processes.processes[pid].allocated = True
+        return processes
 
     def set_layout(self):
         '''
         Set the default processes layout
         '''
         layout = load_layout(DEFAULT_LAYOUT)
-    
-        for item in layout:
+        self.add_processes(layout)
+
+    def add_processes(self, configs):
+        '''
+        Create the processes defined by configs, allocating their resources
+        with a single CPU / Memory update
+        '''
+        processes = []
+        for config in configs:
+            # Create a process and add it to the list
+            process = Process(
+                config=config,
+                cpus=self.cpus,
+                disks=self.disks,
+                memory=self.memory,
+                allocate=False
+            )
+            pid = config.get('pid')
+            self._record(pid)
+            if pid in self.processes:
+                # Replaced process
+                self.kill_process(pid)
+            self.processes.update({pid: process})
+            self._index_add(config)
+            processes.append(process)
+        self.allocate_resources(processes)
+
+    def load_processes(self, configs, allocated=None):
+        '''
+        Add processes whose resources are already accounted in cpus / memory
+        (ex. restored from a snapshot); allocated optionally lists the
+        allocated flag of each process (all allocated by default)
+        '''
+        for idx, config in enumerate(configs):
             process = Process(
-                config=item, 
-                cpus=self.cpus, 
+                config=config,
+                cpus=self.cpus,
                 disks=self.disks,
-                memory=self.memory
+                memory=self.memory,
+                allocate=False
             )
-            self.processes.update({process.config.get('pid'): process})
+            process.allocated = allocated is None or bool(allocated[idx])
+            self._record(config.get('pid'))
+            self.processes.update({config.get('pid'): process})
+            self._index_add(config)
+
+    def allocate_resources(self, processes):
+        '''
+        Allocate the resources of many processes at once
+        '''
+        processes = [ process for process in processes if not process.allocated ]
+        cpus, memory = get_resources(processes)
+        self.cpus.update_many(cpus)
+        self.memory.update_many(memory)
+        for process in processes:
+            process.allocated = True
+
+    def release_resources(self, processes):
+        '''
+        Release the resources of many processes at once
+        '''
+        processes = [ process for process in processes if process.allocated ]
+        cpus, memory = get_resources(processes, sign=-1)
+        self.cpus.update_many(cpus)
+        self.memory.update_many(memory)
+        for process in processes:
+            process.allocated = False
 
     def kill_process(self, pid):
         '''
         Kill the process defined by pid
         '''
-        if not pid in self.processes:
-            print 'kill: (%s) - No such process' % (pid,)
-            return False
-        # Destroy process instance (and release resources ?)
-        del self.processes[pid]
+        return self.kill_many([pid])
+
+    def kill_many(self, pids):
+        '''
+        Kill the processes defined by pids, releasing their resources with a
+        single CPU / Memory update
+        '''
+        success = True
+        processes = []
+        for pid in pids:
+            if not pid in self.processes:
+                print 'kill: (%s) - No such process' % (pid,)
+                success = False
+                continue
+            self._record(pid)
+            process = self.processes.pop(pid)
+            self._index_remove(process.config)
+            processes.append(process)
+        self.release_resources(processes)
+        return success
 
     def killall_process(self, name):
         '''
         Kill all the processes that use `name` as .. name
         '''
-        pids = []
-        # Prepare list of process to kill
-        for pid, process in self.processes.iteritems():
-            if process.config.get('name') == name:
-                pids.append(pid)
-        # Go on a rampage
+        # Prepare list of process to kill & go on a rampage
+        return self.kill_many(self.find_pids(name=name))
+
+    def set_state(self, pid, state):
+        '''
+        Change the state of the process defined by pid (R, S, D, Z, T...)
+        '''
+        if not pid in self.processes:
+            print '(%s) - No such process' % (pid,)
+            return False
+        self._record(pid)
+        process = self.processes[pid]
+        self._index_remove(process.config)
+        # Configs may be shared (layouts, cloned servers); copy on write
+        process.config = dict(process.config, state=state)
+        self._index_add(process.config)
+        return True
+
+    def update_rss(self, pid, size):
+        '''
+        Update the RSS of the process defined by pid by size (+/-)
+        '''
+        if not pid in self.processes:
+            print '(%s) - No such process' % (pid,)
+            return False
+        self._record(pid)
+        process = self.processes[pid]
+        config = process.config
+        memory = dict(config.get('memory', {}))
+        memory['rss'] = memory.get('rss', 0) + int(size)
+        self._index_remove(config)
+        process.config = dict(config, memory=memory)
+        self._index_add(process.config)
+        if process.allocated:
+            self.memory.update('used', size)
+        return True
+
+    def find_pids(self, **criteria):
+        '''
+        Return the pids of the processes matching all the criteria, among
+        name, uid, state and ppid. Ex. find_pids(name='apache', state='Z')
+        '''
+        matches = []
+        for key, value in criteria.iteritems():
+            if key not in self.indexes:
+                print 'Invalid process criteria: %s' % (key,)
+                return []
+            matches.append(self.indexes[key].get(value, ()))
+        if not matches:
+            return self.processes.keys()
+        # Filter the smallest set of pids against the other ones
+        matches.sort(key=len)
+        return [ pid for pid in matches[0] if
+                    all(pid in pids for pids in matches[1:]) ]
+
+    def get_childrens_pids(self, ppid):
+        '''
+        Return the pids of the direct childrens of the process ppid
+        '''
+        return self.find_pids(ppid=ppid)
+
+    def get_top_pids(self, count, key='cpu'):
+        '''
+        Return the pids of the `count` processes using the most of key (rss
+        or cpu), highest first; O(count log count)
+        '''
+        if key not in self.sorted:
+            print 'Invalid sort key: %s' % (key,)
+            return []
+        return self.sorted[key].top(count)
+
+    def iter_sorted_pids(self, key='cpu'):
+        '''
+        Yield all the pids by decreasing key (rss or cpu), as ps --sort;
+        the processes must not change during the iteration
+        '''
+        if key not in self.sorted:
+            print 'Invalid sort key: %s' % (key,)
+            return iter([])
+        return self.sorted[key].iter_keys()
+
+    def _record(self, pid):
+        '''
+        Journal the state of process pid before its change (if needed)
+        '''
+        if not self.journals:
+            return
+        journal = self.journals[-1]
+        if pid in journal:
+            return
+        process = self.processes.get(pid)
+        if process is None:
+            journal[pid] = None
+        else:
+            journal[pid] = (process.config, process.allocated)
+
+    def checkpoint(self):
+        '''
+        Start journaling the changes of the processes, return the checkpoint
+        level. Only the first change of each process is journaled, so a
+        checkpoint costs O(1) and its rollback O(changed processes). The
+        resources are restored by the CPUS / Memory rollback (see
+        Environment.rollback).
+        '''
+        self.journals.append({})
+        return len(self.journals) - 1
+
+    def rollback(self, level=None):
+        '''
+        Undo the changes made since checkpoint level (the last one by
+        default), dropping the newer checkpoints; level is kept
+        '''
+        level = get_checkpoint(self.journals, level)
+        if level is None:
+            return False
+        journals = self.journals
+        # The undo itself is not journaled
+        self.journals = []
+        # Newest first, the journal of level holds the oldest states
+        for journal in reversed(journals[level:]):
+            self._undo(journal)
+        self.journals = journals[:level] + [{}]
+        return True
+
+    def _undo(self, journal):
+        pids = [ pid for pid in journal if pid in self.processes ]
         for pid in pids:
-            self.kill_process(pid)
+            # Resources are not released: cpus / memory are rolled back too
+            self.processes[pid].allocated = False
+        self.kill_many(pids)
+        previous = [ state for state in journal.itervalues() if state is not None ]
+        self.load_processes([ config for config, allocated in previous ],
+                            [ allocated for config, allocated in previous ])
+
+    def release(self, level=None):
+        '''
+        Drop checkpoint level (the last one by default) and the newer ones,
+        keeping the changes
+        '''
+        level = get_checkpoint(self.journals, level)
+        if level is None:
+            return False
+        journals = self.journals[level:]
+        del self.journals[level:]
+        if self.journals:
+            # The oldest state of each process is kept
+            journal = self.journals[-1]
+            for newer in journals:
+                for pid, state in newer.iteritems():
+                    journal.setdefault(pid, state)
+        return True
+
+    def _index_add(self, config):
+        pid = config.get('pid')
+        for key in INDEXED_KEYS:
+            self.indexes[key].setdefault(config.get(key), set()).add(pid)
+        for key, index in self.sorted.iteritems():
+            index.set(pid, get_sort_value(config, key))
+
+    def _index_remove(self, config):
+        pid = config.get('pid')
+        for index in self.sorted.itervalues():
+            index.remove(pid)
+        for key in INDEXED_KEYS:
+            index = self.indexes[key]
+            value = config.get(key)
+            pids = index.get(value)
+            if pids is None:
+                continue
+            pids.discard(pid)
+            if not pids:
+                del index[value]
+
+def get_resources(processes, sign=1):
+    '''
+    Return the (cpu_type, diff) and (mem_type, size) deltas used by processes;
+    sign=-1 returns the deltas releasing them
+    '''
+    cpus = []
+    memory = []
+    for process in processes:
+        for cpu_type, value in process.config.get('cpus', {}).iteritems():
+            if type(value) == list:
+                value = [ sign * item for item in value ]
+            else:
+                value = sign * value
+            cpus.append((cpu_type, value))
+        # Only care about RSS for the moment
+        rss = process.config.get('memory', {}).get('rss')
+        if rss is not None:
+            memory.append(('used', sign * rss))
+    return cpus, memory
+
+def get_sort_value(config, key):
+    '''
+    Return the value of a process config ranked on key: rss, virt or cpu (the
+    share of all the cpu types but idle, per core values averaged)
+    '''
+    if key in ['rss', 'virt']:
+        return config.get('memory', {}).get(key, 0)
+    share = 0.0
+    for cpu_type, value in config.get('cpus', {}).iteritems():
+        if cpu_type == 'idle':
+            continue
+        if type(value) == list:
+            value = float(sum(value)) / len(value) if value else 0.0
+        share += value
+    return share
 
 class Process(object):
     """Define a Process object"""
-    def __init__(self, config={}, cpus={}, disks={}, memory={}):
+    def __init__(self, config={}, cpus={}, disks={}, memory={}, allocate=True):
         super(Process, self).__init__()
 
         # Capture the args
@@ -95,20 +419,20 @@ class Process(object):
         self.cpus = cpus
         self.disks = disks
         self.memory = memory
+        # Whether the resources are accounted in cpus / memory
+        self.allocated = False
 
-        # Propagate changes in CPU / RAM
-        self.allocate_resources()
-
-    def __del__(self):
-        '''
-        If instantiated object get destroyed - release resources
-        '''
-        self.release_resources()
+        # Propagate changes in CPU / RAM (unless done by the caller)
+        if allocate:
+            self.allocate_resources()
 
     def allocate_resources(self):
         '''
         Allocate the resources used by the process
         '''
+        if self.allocated:
+            return
+        self.allocated = True
         # TODO - split per type of resource ?
         cpus = self.config.get('cpus', {})
         for cpu_type, value in cpus.iteritems():
@@ -125,6 +449,9 @@ class Process(object):
         '''
         Release the resources allocated to the process
         '''
+        if not self.allocated:
+            return
+        self.allocated = False
         cpus = self.config.get('cpus', {})
         for cpu_type, value in cpus.iteritems():
             self.cpus.update(cpu_type, -value)
@@ -135,3 +462,231 @@ class Process(object):
             if mem_type != 'rss':
                 continue
             self.memory.update('used', -value)
+
+class ArrayProcesses(Processes):
+    '''
+    Processes stored in a column oriented ProcessTable (requires numpy), for
+    very large process tables. self.processes maps the pids to ProcessView
+    objects, which read and write the table.
+    '''
+    def _init_storage(self):
+        self.table = ProcessTable()
+        self.processes = ProcessViews(self)
+        self.indexes = dict((key, {}) for key in INDEXED_KEYS)
+        self.sorted = dict((key, TopIndex()) for key in SORT_KEYS)
+        self.journals = []
+
+    def clone(self, cpus={}, disks={}, memory={}):
+        '''
+        Return a new ArrayProcesses object with a copy of the process table,
+        bound to the provided resources (see Processes.clone)
+        '''
+        processes = object.__new__(self.__class__)
+        processes.cpus = cpus
+        processes.disks = disks
+        processes.memory = memory
+        processes.table = self.table.copy()
+        processes.processes = ProcessViews(processes)
+        processes.indexes = self._copy_indexes()
+        processes.sorted = self._copy_sorted()
+        processes.journals = []
+        return processes
+
+    def add_processes(self, configs):
+        '''
+        Store the processes defined by configs in the table, allocating their
+        resources with a single CPU / Memory update
+        '''
+        rows = []
+        for config in configs:
+            pid = config.get('pid')
+            self._record(pid)
+            if pid in self.table:
+                # Replaced process
+                self.kill_process(pid)
+            rows.append(self.table.add(config))
+            self._index_add(config)
+        self._allocate_rows(rows)
+
+    def load_processes(self, configs, allocated=None):
+        for idx, config in enumerate(configs):
+            self._record(config.get('pid'))
+            row = self.table.add(config)
+            self.table.allocated[row] = allocated is None or bool(allocated[idx])
+            self._index_add(config)
+
+    def allocate_resources(self, processes):
+        self._allocate_rows([ process.row for process in processes ])
+
+    def release_resources(self, processes):
+        self._allocate_rows([ process.row for process in processes ], sign=-1)
+
+    def _allocate_rows(self, rows, sign=1):
+        '''
+        Allocate (sign=1) or release (sign=-1) the resources of the processes
+        of rows, skipping the ones already in that state
+        '''
+        table = self.table
+        rows = numpy.asarray(rows, dtype=int)
+        rows = rows[table.allocated[rows] != (sign > 0)]
+        cpus, memory = table.get_resources(rows, sign=sign)
+        self.cpus.update_many(cpus)
+        self.memory.update_many(memory)
+        table.allocated[rows] = sign > 0
+
+    def kill_many(self, pids):
+        '''
+        Kill the processes defined by pids, releasing their resources with a
+        single CPU / Memory update
+        '''
+        success = True
+        killed = set()
+        rows = []
+        for pid in pids:
+            row = self.table.get_row(pid)
+            if row is None or pid in killed:
+                print 'kill: (%s) - No such process' % (pid,)
+                success = False
+                continue
+            self._record(pid)
+            self._index_remove(self._get_index_config(row))
+            killed.add(pid)
+            rows.append(row)
+        # Release before freeing the rows, which may hold per core values
+        self._allocate_rows(rows, sign=-1)
+        for pid in killed:
+            self.table.remove(pid)
+        return success
+
+    def _get_index_config(self, row):
+        return dict((key, self.table.get_value(row, key))
+                    for key in INDEXED_KEYS + ['pid'])
+
+    def get_total(self, key='rss'):
+        '''
+        Return the sum of key (rss, virt, threads, a cpu type or cpu) over all
+        the processes
+        '''
+        return self.table.total(key)
+
+    def get_top_pids(self, count, key='cpu'):
+        '''
+        Return the pids of the `count` processes using the most of key (rss,
+        virt, threads, a cpu type or cpu), highest first. rss and cpu are read
+        from the sorted views, the other keys computed from the table.
+        '''
+        if key in self.sorted:
+            return self.sorted[key].top(count)
+        return self.table.top(count, key)
+
+    def get_sums(self, group='uid', key='rss'):
+        '''
+        Return the sums of key per group value (name, state, uid or gid).
+        Ex. get_sums('uid', 'rss') -> {'root': 10240, 'www': 204800}
+        '''
+        return self.table.sum_by(group, key)
+
+class ProcessViews(object):
+    '''
+    Mapping pid -> ProcessView over the table of an ArrayProcesses object
+    '''
+    def __init__(self, processes):
+        super(ProcessViews, self).__init__()
+        self.owner = processes
+
+    def _view(self, row):
+        owner = self.owner
+        return ProcessView(owner.table, row, cpus=owner.cpus,
+                           disks=owner.disks, memory=owner.memory)
+
+    def __len__(self):
+        return len(self.owner.table)
+
+    def __contains__(self, pid):
+        return pid in self.owner.table
+
+    def __getitem__(self, pid):
+        row = self.owner.table.get_row(pid)
+        if row is None:
+            raise KeyError(pid)
+        return self._view(row)
+
+    def get(self, pid, default=None):
+        row = self.owner.table.get_row(pid)
+        if row is None:
+            return default
+        return self._view(row)
+
+    def iterkeys(self):
+        return iter(self.owner.table.rows.keys())
+
+    __iter__ = iterkeys
+
+    def iteritems(self):
+        for pid, row in self.owner.table.rows.items():
+            yield pid, self._view(row)
+
+    def itervalues(self):
+        for pid, process in self.iteritems():
+            yield process
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+class ProcessView(object):
+    '''
+    Thin Process-like view on a row of a ProcessTable; only valid while the
+    process is alive (rows are reused)
+    '''
+    __slots__ = ('table', 'row', 'cpus', 'disks', 'memory')
+
+    def __init__(self, table, row, cpus={}, disks={}, memory={}):
+        self.table = table
+        self.row = row
+        self.cpus = cpus
+        self.disks = disks
+        self.memory = memory
+
+    @property
+    def config(self):
+        return self.table.get_config(self.row)
+
+    @config.setter
+    def config(self, config):
+        self.table.set_config(self.row, config)
+
+    @property
+    def allocated(self):
+        return bool(self.table.allocated[self.row])
+
+    @allocated.setter
+    def allocated(self, allocated):
+        self.table.allocated[self.row] = allocated
+
+    def allocate_resources(self):
+        '''
+        Allocate the resources used by the process
+        '''
+        if self.allocated:
+            return
+        self.allocated = True
+        cpus, memory = self.table.get_resources([self.row])
+        self.cpus.update_many(cpus)
+        self.memory.update_many(memory)
+
+    def release_resources(self):
+        '''
+        Release the resources allocated to the process
+        '''
+        if not self.allocated:
+            return
+        self.allocated = False
+        cpus, memory = self.table.get_resources([self.row], sign=-1)
+        self.cpus.update_many(cpus)
+        self.memory.update_many(memory)
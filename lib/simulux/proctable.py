@@ -0,0 +1,312 @@
+from simulux.cpus import CPU_TYPES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+'''
+Process table
+
+Column oriented storage of the process configs, for very large process
+tables: one numpy array per field (pid, ppid, threads, rss, virt), a
+(cpu types x processes) matrix for the cpus, and the name / state / uid / gid
+strings stored as codes of a shared string table.
+
+Whole-table aggregates (total RSS, top N, per user sums) are vectorized.
+Keys the columns can not hold (unknown keys, per core cpu lists) are kept
+per row in `extra`. Rows of killed processes are reused.
+'''
+
+INT_COLUMNS = ['pid', 'ppid', 'threads']
+MEMORY_COLUMNS = ['rss', 'virt']
+STRING_COLUMNS = ['name', 'state', 'uid', 'gid']
+
+# Row of each column in its matrix
+INT_ROWS = dict((key, idx) for idx, key in enumerate(INT_COLUMNS))
+MEMORY_ROWS = dict((key, idx) for idx, key in enumerate(MEMORY_COLUMNS))
+STRING_ROWS = dict((key, idx) for idx, key in enumerate(STRING_COLUMNS))
+CPU_ROWS = dict((key, idx) for idx, key in enumerate(CPU_TYPES))
+
+# Bit of each key in the `keys` column, set when the config has the key
+KEY_BITS = {}
+for _key in INT_COLUMNS + STRING_COLUMNS + ['memory', 'cpus'] + \
+        [ 'memory.' + _key for _key in MEMORY_COLUMNS ] + \
+        [ 'cpus.' + _key for _key in CPU_TYPES ]:
+    KEY_BITS[_key] = 1 << len(KEY_BITS)
+
+class StringTable(object):
+    """Define a StringTable object"""
+    def __init__(self):
+        super(StringTable, self).__init__()
+        self.strings = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(value)
+            self.codes[value] = code
+        return code
+
+    def string(self, code):
+        return self.strings[code]
+
+class ProcessTable(object):
+    """Define a ProcessTable object"""
+    def __init__(self, capacity=1024):
+        super(ProcessTable, self).__init__()
+        if numpy is None:
+            raise ImportError('numpy is required by ProcessTable')
+        self.capacity = capacity
+        # Number of rows in use (including free ones) and of live processes
+        self.size = 0
+        self.count = 0
+        # pid -> row
+        self.rows = {}
+        self.free = []
+        self.strings = StringTable()
+        self.extra = {}
+        self.keys = numpy.zeros(capacity, dtype=numpy.int64)
+        self.alive = numpy.zeros(capacity, dtype=bool)
+        self.allocated = numpy.zeros(capacity, dtype=bool)
+        self.ints = numpy.zeros((len(INT_COLUMNS), capacity), dtype=numpy.int64)
+        self.mem = numpy.zeros((len(MEMORY_COLUMNS), capacity), dtype=numpy.int64)
+        self.cpus = numpy.zeros((len(CPU_TYPES), capacity), dtype=float)
+        self.strs = numpy.zeros((len(STRING_COLUMNS), capacity), dtype=numpy.int32)
+
+    def copy(self):
+        '''
+        Return an independent copy of the table
+        '''
+        table = object.__new__(self.__class__)
+        table.__dict__.update(self.__dict__)
+        table.rows = self.rows.copy()
+        table.free = list(self.free)
+        table.extra = dict((row, dict(extra)) for row, extra in self.extra.iteritems())
+        for name in ['keys', 'alive', 'allocated', 'ints', 'mem', 'cpus', 'strs']:
+            setattr(table, name, getattr(self, name).copy())
+        # Strings are only ever appended; sharing them is safe
+        return table
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        for name in ['keys', 'alive', 'allocated', 'ints', 'mem', 'cpus', 'strs']:
+            column = getattr(self, name)
+            shape = column.shape[:-1] + (capacity,)
+            grown = numpy.zeros(shape, dtype=column.dtype)
+            grown[..., :self.capacity] = column
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, pid):
+        return pid in self.rows
+
+    def get_row(self, pid):
+        return self.rows.get(pid)
+
+    def add(self, config):
+        '''
+        Store a process config, return its row
+        '''
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.size += 1
+        self.set_config(row, config)
+        self.rows[config.get('pid')] = row
+        self.alive[row] = True
+        self.allocated[row] = False
+        self.count += 1
+        return row
+
+    def remove(self, pid):
+        row = self.rows.pop(pid)
+        self.alive[row] = False
+        self.allocated[row] = False
+        self.extra.pop(row, None)
+        self.free.append(row)
+        self.count -= 1
+        return row
+
+    def set_config(self, row, config):
+        '''
+        Write a process config in a row
+        '''
+        keys = 0
+        extra = {}
+        for key, value in config.iteritems():
+            if key in INT_ROWS and type(value) in [int, long]:
+                self.ints[INT_ROWS[key], row] = value
+            elif key in STRING_ROWS:
+                self.strs[STRING_ROWS[key], row] = self.strings.code(value)
+            elif key == 'memory' and type(value) == dict:
+                keys |= self._set_memory(row, value, extra)
+            elif key == 'cpus' and type(value) == dict:
+                keys |= self._set_cpus(row, value, extra)
+            else:
+                extra[key] = value
+                continue
+            keys |= KEY_BITS[key]
+        self.keys[row] = keys
+        if extra:
+            self.extra[row] = extra
+        else:
+            self.extra.pop(row, None)
+
+    def _set_memory(self, row, memory, extra):
+        keys = 0
+        self.mem[:, row] = 0
+        for key, value in memory.iteritems():
+            if key in MEMORY_ROWS and type(value) in [int, long]:
+                self.mem[MEMORY_ROWS[key], row] = value
+                keys |= KEY_BITS['memory.' + key]
+            else:
+                extra.setdefault('memory', {})[key] = value
+        return keys
+
+    def _set_cpus(self, row, cpus, extra):
+        keys = 0
+        self.cpus[:, row] = 0.0
+        for key, value in cpus.iteritems():
+            if key not in CPU_ROWS:
+                extra.setdefault('cpus', {})[key] = value
+                continue
+            if type(value) in [list, tuple]:
+                # Per core values: the column holds their average
+                extra.setdefault('cpus', {})[key] = value
+                value = float(sum(value)) / len(value) if value else 0.0
+            self.cpus[CPU_ROWS[key], row] = value
+            keys |= KEY_BITS['cpus.' + key]
+        return keys
+
+    def get_config(self, row):
+        '''
+        Rebuild the config dict of a row
+        '''
+        keys = self.keys[row]
+        config = {}
+        for idx, key in enumerate(INT_COLUMNS):
+            if keys & KEY_BITS[key]:
+                config[key] = int(self.ints[idx, row])
+        for idx, key in enumerate(STRING_COLUMNS):
+            if keys & KEY_BITS[key]:
+                config[key] = self.strings.string(self.strs[idx, row])
+        extra = self.extra.get(row, {})
+        if keys & KEY_BITS['memory']:
+            memory = dict(extra.get('memory', {}))
+            for idx, key in enumerate(MEMORY_COLUMNS):
+                if keys & KEY_BITS['memory.' + key]:
+                    memory[key] = int(self.mem[idx, row])
+            config['memory'] = memory
+        if keys & KEY_BITS['cpus']:
+            cpus = {}
+            for idx, key in enumerate(CPU_TYPES):
+                if keys & KEY_BITS['cpus.' + key]:
+                    cpus[key] = float(self.cpus[idx, row])
+            cpus.update(extra.get('cpus', {}))
+            config['cpus'] = cpus
+        for key, value in extra.iteritems():
+            if key not in ['memory', 'cpus']:
+                config[key] = value
+        return config
+
+    def get_value(self, row, key):
+        '''
+        Return a single top level value of a row (None if missing)
+        '''
+        if not self.keys[row] & KEY_BITS.get(key, 0):
+            return self.extra.get(row, {}).get(key)
+        if key in INT_ROWS:
+            return int(self.ints[INT_ROWS[key], row])
+        if key in STRING_ROWS:
+            return self.strings.string(self.strs[STRING_ROWS[key], row])
+        return self.get_config(row).get(key)
+
+    def get_resources(self, rows, sign=1):
+        '''
+        Return the (cpu_type, diff) and (mem_type, size) deltas used by the
+        processes of rows (see simulux.processes.get_resources)
+        '''
+        if not len(rows):
+            return [], []
+        rows = numpy.asarray(rows)
+        # Rows with per core values are accounted separately
+        lists = [ row for row in rows if 'cpus' in self.extra.get(row, {}) ]
+        scalars = rows if not lists else numpy.setdiff1d(rows, lists)
+        totals = self.cpus[:, scalars].sum(axis=1)
+        cpus = [ (cpu_type, sign * float(totals[idx])) for idx, cpu_type in
+                    enumerate(CPU_TYPES) if totals[idx] ]
+        for row in lists:
+            for cpu_type, value in self.get_config(row)['cpus'].iteritems():
+                if type(value) in [list, tuple]:
+                    value = [ sign * item for item in value ]
+                else:
+                    value = sign * value
+                cpus.append((cpu_type, value))
+        memory = []
+        has_rss = (self.keys[rows] & KEY_BITS['memory.rss']) != 0
+        if has_rss.any():
+            memory.append(('used', sign * int(self.mem[0, rows][has_rss].sum())))
+        return cpus, memory
+
+    def _live_rows(self):
+        return numpy.nonzero(self.alive[:self.size])[0]
+
+    def get_column(self, key, rows):
+        '''
+        Return the values of a numeric column for rows; key is rss, virt,
+        threads, a cpu type or 'cpu' (all the cpu types but idle)
+        '''
+        if key in MEMORY_ROWS:
+            return self.mem[MEMORY_ROWS[key], rows]
+        if key in INT_ROWS:
+            return self.ints[INT_ROWS[key], rows]
+        if key in CPU_ROWS:
+            return self.cpus[CPU_ROWS[key], rows]
+        if key == 'cpu':
+            return self.cpus[:-1, rows].sum(axis=0)
+        raise KeyError(key)
+
+    def total(self, key='rss'):
+        '''
+        Return the sum of a numeric column over all the processes
+        '''
+        return self.get_column(key, self._live_rows()).sum().item()
+
+    def top(self, count, key='rss'):
+        '''
+        Return the pids of the `count` processes with the highest key values,
+        highest first
+        '''
+        rows = self._live_rows()
+        values = self.get_column(key, rows)
+        if count < len(rows):
+            best = numpy.argpartition(-values, count)[:count]
+        else:
+            best = numpy.arange(len(rows))
+        best = best[numpy.argsort(-values[best], kind='mergesort')]
+        return [ int(pid) for pid in self.ints[0, rows[best]] ]
+
+    def sum_by(self, group='uid', key='rss'):
+        '''
+        Return {group value: sum of key} over all the processes
+        '''
+        rows = self._live_rows()
+        has_group = (self.keys[rows] & KEY_BITS[group]) != 0
+        rows = rows[has_group]
+        codes = self.strs[STRING_ROWS[group], rows]
+        values = self.get_column(key, rows)
+        sums = numpy.bincount(codes, weights=values,
+                              minlength=len(self.strings.strings))
+        # bincount sums as floats
+        sums = sums.astype(values.dtype)
+        return dict((self.strings.string(code), sums[code].item())
+                    for code in numpy.unique(codes))
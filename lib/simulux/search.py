@@ -0,0 +1,213 @@
+import fnmatch
+import os
+import re
+
+'''
+Search of the Disks files (find / glob)
+
+Both walk the path structure from the top and yield the matching paths
+lazily (the first ones come out before the rest of the tree is visited),
+parents first, the childrens of a folder in name order.
+
+Criteria (all must match):
+- name: shell pattern on the name (ex. '*.log'),
+- regex: regular expression matching the whole path,
+- filetype: 'file' or 'folder',
+- size: bytes as find -size: '+100M' (more than), '-1k' (less than), '10'
+  or 10 (exactly); suffixes c, k, M, G (1024 based),
+- owner, group: exact names,
+- mode: exact mode (644, '0644'),
+- mindepth / maxdepth: depth below the starting path (find only).
+
+Pruning: glob only lists the folders matching each component of the
+pattern (components without wildcards are looked up directly); find does
+not go below maxdepth. With a size of more than (or exactly) N, both skip
+the folders of at most (less than) N bytes with all their content, as the
+size of a folder includes its content; the folders holding other mount
+points are never skipped this way.
+'''
+
+SIZE_UNITS = {'c': 1, 'k': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+_SIZE = re.compile(r'^([+-]?)(\d+)([ckMG]?)$')
+
+class SearchError(ValueError):
+    pass
+
+def parse_size(size):
+    '''
+    Return the (sign, bytes) of a size criteria; sign is '+', '-' or ''
+    '''
+    if isinstance(size, (int, long)):
+        return '', size
+    match = _SIZE.match(str(size))
+    if match is None:
+        raise SearchError('invalid size: %s' % (size,))
+    sign, value, unit = match.groups()
+    return sign, int(value) * SIZE_UNITS.get(unit or 'c')
+
+def parse_mode(mode):
+    '''
+    Return the comparable form of a mode (644, '644' and '0644' are equal)
+    '''
+    try:
+        return int(str(mode), 10)
+    except ValueError:
+        raise SearchError('invalid mode: %s' % (mode,))
+
+def get_filter(name=None, regex=None, filetype=None, size=None, owner=None,
+               group=None, mode=None):
+    '''
+    Return (match(path, details), prune(details)) for the criteria; prune
+    tells whether nothing below a folder can match (None if it can not be
+    told)
+    '''
+    tests = []
+    prune = None
+    if filetype is not None:
+        tests.append(lambda path, details: details.get('filetype') == filetype
+                     or (filetype == 'folder' and details.get('mount') == True))
+    if owner is not None:
+        tests.append(lambda path, details: details.get('owner') == owner)
+    if group is not None:
+        tests.append(lambda path, details: details.get('group') == group)
+    if mode is not None:
+        mode = parse_mode(mode)
+        def test_mode(path, details):
+            value = details.get('mode')
+            return value is not None and parse_mode(value) == mode
+        tests.append(test_mode)
+    if size is not None:
+        sign, limit = parse_size(size)
+        if sign == '+':
+            tests.append(lambda path, details: details.get('size', 0) > limit)
+            prune = lambda details: details.get('size', 0) <= limit
+        elif sign == '-':
+            tests.append(lambda path, details: details.get('size', 0) < limit)
+        else:
+            tests.append(lambda path, details: details.get('size', 0) == limit)
+            prune = lambda details: details.get('size', 0) < limit
+    if name is not None:
+        match_name = re.compile(fnmatch.translate(name)).match
+        tests.append(lambda path, details:
+                     match_name(path[path.rfind('/') + 1:]) is not None)
+    if regex is not None:
+        try:
+            match_path = re.compile('(?:%s)\\Z' % (regex,)).match
+        except re.error as e:
+            raise SearchError('invalid regex %s: %s' % (regex, e,))
+        tests.append(lambda path, details: match_path(path) is not None)
+
+    def match(path, details):
+        for test in tests:
+            if not test(path, details):
+                return False
+        return True
+    return match, prune
+
+def _get_protected(mounts):
+    # Folders holding mount points: their size does not include the mounts
+    protected = set()
+    for mount in mounts:
+        parent = os.path.dirname(mount)
+        while parent not in protected and parent != mount:
+            protected.add(parent)
+            mount, parent = parent, os.path.dirname(parent)
+    return protected
+
+def find(disks, path='/', mindepth=0, maxdepth=None, **criteria):
+    '''
+    Return a generator of the paths below path (included) matching the
+    criteria, as find path -name ... -size ...
+    Raise SearchError on invalid criteria.
+    '''
+    match, prune = get_filter(**criteria)
+    disks.flush_sizes()
+    return _walk(disks.files, path, match, prune, mindepth, maxdepth,
+                 _get_protected(disks.mounts))
+
+def _walk(files, path, match, prune, mindepth, maxdepth, protected):
+    details = files.get(path)
+    if details is None:
+        return
+    # Depth first, with the childrens of each folder in name order
+    stack = [(path, details, 0)]
+    while stack:
+        path, details, depth = stack.pop()
+        if prune is not None and prune(details) and path not in protected:
+            continue
+        if depth >= mindepth and match(path, details):
+            yield path
+        if maxdepth is not None and depth >= maxdepth:
+            continue
+        childrens = files.get_childrens(path)
+        if not childrens:
+            continue
+        childrens.sort(reverse=True)
+        for child in childrens:
+            child_details = files.get(child)
+            if child_details is not None:
+                stack.append((child, child_details, depth + 1))
+
+def glob(disks, pattern, **criteria):
+    '''
+    Return a generator of the paths matching the absolute shell pattern
+    (ex. /var/log/*/*.log, /home/**/*.conf: ** matches any number of
+    folders) and the criteria. As the shell, wildcards do not match the
+    names starting with a dot unless the pattern does.
+    Raise SearchError on invalid criteria.
+    '''
+    if not pattern.startswith('/'):
+        raise SearchError('not an absolute pattern: %s' % (pattern,))
+    match, prune = get_filter(**criteria)
+    disks.flush_sizes()
+    components = [ component for component in pattern.split('/') if component ]
+    return _glob(disks.files, components, match, prune,
+                 _get_protected(disks.mounts))
+
+def _has_magic(component):
+    return '*' in component or '?' in component or '[' in component
+
+def _glob(files, components, match, prune, protected):
+    # (path, index of its next component)
+    stack = [('/', 0)]
+    # With many **, the same path may be reached through each of them
+    seen = set() if components.count('**') > 1 else None
+    while stack:
+        path, idx = stack.pop()
+        if seen is not None:
+            if (path, idx) in seen:
+                continue
+            seen.add((path, idx))
+        if idx == len(components):
+            details = files.get(path)
+            if details is not None and match(path, details):
+                yield path
+            continue
+        component = components[idx]
+        if not _has_magic(component):
+            child = os.path.join(path, component)
+            if child in files:
+                stack.append((child, idx + 1))
+            continue
+        childrens = sorted(files.get_childrens(path), reverse=True)
+        if component == '**':
+            # One more folder, after zero folder (pushed last, popped first)
+            for child in childrens:
+                if child[child.rfind('/') + 1:].startswith('.'):
+                    continue
+                if prune is not None and child not in protected:
+                    details = files.get(child)
+                    if details is None or prune(details):
+                        continue
+                stack.append((child, idx))
+            stack.append((path, idx + 1))
+            continue
+        match_name = re.compile(fnmatch.translate(component)).match
+        hidden = component.startswith('.')
+        for child in childrens:
+            name = child[child.rfind('/') + 1:]
+            if name.startswith('.') and not hidden:
+                continue
+            if match_name(name) is not None:
+                stack.append((child, idx + 1))
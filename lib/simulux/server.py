@@ -0,0 +1,378 @@
+import asynchat
+import asyncore
+import json
+import os
+import socket
+import time
+
+from simulux.exceptions import SimuluxDiskException
+from simulux.metrics import RingBuffer, percentile
+
+'''
+Environment server
+
+Serves an Environment to many concurrent sessions (ex. trainees) over a
+local socket, from a single threaded event loop (asyncore).
+
+Protocol: one request per line, one JSON reply per line. A request is
+either a JSON object {"id": 1, "cmd": "ls", "args": ["/etc"]} or a plain
+text line "ls /etc". Replies are {"id": 1, "ok": true, "result": ...} or
+{"id": 1, "ok": false, "error": "..."}.
+
+Each session has its own server (use) and working directory (cd); relative
+paths are resolved with Disks.shorten_path.
+
+Backpressure: a session whose client does not read its replies stops being
+read once MAX_PENDING_OUTPUT bytes are waiting, and new connections are
+refused above max_sessions. The time spent on each request is kept per
+session (see get_stats).
+'''
+
+MAX_SESSIONS = 1024
+# Longest request line accepted
+MAX_LINE = 64 * 1024
+# Pending reply bytes above which the requests of a session are not read
+MAX_PENDING_OUTPUT = 256 * 1024
+# Connections accepted per event loop iteration
+ACCEPT_BATCH = 64
+# Request latencies kept per session
+LATENCY_SAMPLES = 1024
+
+class CommandError(Exception):
+    pass
+
+class Session(asynchat.async_chat):
+    """Define a Session object"""
+    def __init__(self, server, sock):
+        asynchat.async_chat.__init__(self, sock, map=server.map)
+        self.set_terminator('\n')
+        self.server = server
+        self.incoming = []
+        self.incoming_size = 0
+        self.server_name = server.get_default_server()
+        self.working_dir = '/'
+        self.latencies = RingBuffer(LATENCY_SAMPLES)
+        self.requests = 0
+        self.errors = 0
+
+    def collect_incoming_data(self, data):
+        self.incoming.append(data)
+        self.incoming_size += len(data)
+        if self.incoming_size > MAX_LINE:
+            self.push(json.dumps({'ok': False, 'error': 'Request too long'}) + '\n')
+            self.close_when_done()
+            self.incoming = []
+            self.incoming_size = 0
+
+    def found_terminator(self):
+        line = ''.join(self.incoming).strip()
+        self.incoming = []
+        self.incoming_size = 0
+        if not line:
+            return
+        start = time.time()
+        reply = self.server.handle_line(self, line)
+        try:
+            data = json.dumps(reply)
+        except UnicodeDecodeError:
+            # Content which is not UTF-8 (binary files) can not be sent
+            reply = {'id': reply.get('id'), 'ok': False,
+                     'error': 'Invalid reply: content is not UTF-8'}
+            data = json.dumps(reply)
+        self.push(data + '\n')
+        self.latencies.append(time.time() - start)
+        self.requests += 1
+        if not reply.get('ok'):
+            self.errors += 1
+
+    def get_pending_output(self):
+        return sum(len(data) for data in self.producer_fifo
+                   if isinstance(data, str))
+
+    def readable(self):
+        # Backpressure: leave the requests in the socket until the client
+        # reads its replies
+        if self.get_pending_output() > MAX_PENDING_OUTPUT:
+            return False
+        return asynchat.async_chat.readable(self)
+
+    def handle_close(self):
+        self.server.sessions.discard(self)
+        self.close()
+
+class SimuluxServer(asyncore.dispatcher):
+    """
+    Serve an Environment on a local socket: an (host, port) tuple or the
+    path of a unix socket
+    """
+    def __init__(self, environment, address=('127.0.0.1', 0),
+                 max_sessions=MAX_SESSIONS):
+        # Own socket map, so several servers can run in the same process
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+        self.environment = environment
+        self.max_sessions = max_sessions
+        self.sessions = set()
+        self.refused = 0
+        self.running = False
+        if isinstance(address, basestring):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.set_reuse_addr()
+        self.bind(address)
+        # Hundreds of sessions may connect at once
+        self.listen(min(max_sessions, 1024))
+        self.address = self.socket.getsockname()
+
+    def handle_accept(self):
+        # Accept all the waiting connections, not one per loop
+        for idx in range(ACCEPT_BATCH):
+            pair = self.accept()
+            if pair is None:
+                return
+            sock, address = pair
+            if len(self.sessions) >= self.max_sessions:
+                self.refused += 1
+                try:
+                    sock.send(json.dumps({'ok': False, 'error': 'Too many sessions'}) + '\n')
+                except socket.error:
+                    pass
+                sock.close()
+                continue
+            self.sessions.add(Session(self, sock))
+
+    def serve_forever(self, timeout=0.1):
+        '''
+        Run the event loop until close() is called
+        '''
+        self.running = True
+        while self.running and self.map:
+            asyncore.loop(timeout=timeout, map=self.map, count=1)
+
+    def close(self):
+        self.running = False
+        for session in list(self.sessions):
+            session.close()
+        self.sessions.clear()
+        asyncore.dispatcher.close(self)
+        if isinstance(self.address, basestring) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def get_default_server(self):
+        servers = sorted(self.environment.servers)
+        if not servers:
+            return None
+        return servers[0]
+
+    def handle_line(self, session, line):
+        '''
+        Run a request line of a session, return the reply
+        '''
+        request_id = None
+        command = None
+        try:
+            if line.startswith('{'):
+                request = json.loads(line)
+                request_id = request.get('id')
+                command = request.get('cmd')
+                args = request.get('args', [])
+            else:
+                args = line.split()
+                command = args.pop(0)
+            handler = COMMANDS.get(command)
+            if handler is None:
+                raise CommandError('%s: command not found' % (command,))
+            result = handler(self, session, *args)
+        except CommandError as e:
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+        except SimuluxDiskException as e:
+            return {'id': request_id, 'ok': False, 'error': ''.join(e.args)}
+        except (TypeError, ValueError) as e:
+            return {'id': request_id, 'ok': False, 'error': 'Invalid request: %s' % (e,)}
+        except Exception as e:
+            # Any other failure is the request's, not the session's
+            return {'id': request_id, 'ok': False,
+                    'error': '%s failed: %s: %s' % (command, e.__class__.__name__, e)}
+        return {'id': request_id, 'ok': True, 'result': result}
+
+    def get_stats(self):
+        '''
+        Return the request counts and latencies (seconds) of the sessions
+        '''
+        latencies = []
+        requests = errors = 0
+        for session in self.sessions:
+            latencies.extend(session.latencies.window())
+            requests += session.requests
+            errors += session.errors
+        return {
+            'sessions': len(self.sessions),
+            'refused': self.refused,
+            'requests': requests,
+            'errors': errors,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99)
+        }
+
+def _get_server(server, session):
+    details = server.environment.get_server(session.server_name)
+    if details is None:
+        raise CommandError('No server selected')
+    return details
+
+def _get_path(server, session, path):
+    disks = _get_server(server, session)['disks']
+    return disks, disks.shorten_path(path, session.working_dir)
+
+def do_servers(server, session):
+    return sorted(server.environment.servers)
+
+def do_use(server, session, name):
+    if name not in server.environment.servers:
+        raise CommandError('Unknown server: %s' % (name,))
+    session.server_name = name
+    session.working_dir = '/'
+    return name
+
+def do_pwd(server, session):
+    return session.working_dir
+
+def do_cd(server, session, path='/'):
+    disks, path = _get_path(server, session, path)
+    if not disks.is_folder(path):
+        raise CommandError('cd: %s: No such file or directory' % (path,))
+    session.working_dir = path
+    return path
+
+def do_ls(server, session, path='.'):
+    disks, path = _get_path(server, session, path)
+    if not disks.exists(path):
+        raise CommandError("ls: cannot access %s: No such file or directory" % (path,))
+    if not disks.is_folder(path):
+        return [os.path.basename(path)]
+    return sorted(os.path.basename(child) for child in disks.get_childrens_path(path))
+
+def do_stat(server, session, path):
+    disks, path = _get_path(server, session, path)
+    if not disks.exists(path):
+        raise CommandError("stat: cannot stat `%s': No such file or directory" % (path,))
+    return disks.get_details(path).copy()
+
+def do_cat(server, session, path):
+    disks, path = _get_path(server, session, path)
+    content = disks.get_file_content(path)
+    if content is None:
+        raise CommandError('cat: %s: No such file or directory' % (path,))
+    return ''.join(content)
+
+def do_head(server, session, path, lines=10):
+    disks, path = _get_path(server, session, path)
+    content = disks.head_file(path, int(lines))
+    if content is None:
+        raise CommandError('head: %s: No such file or directory' % (path,))
+    return ''.join(content)
+
+def do_tail(server, session, path, lines=10):
+    disks, path = _get_path(server, session, path)
+    content = disks.tail_file(path, int(lines))
+    if content is None:
+        raise CommandError('tail: %s: No such file or directory' % (path,))
+    return ''.join(content)
+
+def do_ps(server, session):
+    processes = _get_server(server, session)['processes']
+    return [ processes.processes[pid].config for pid in sorted(processes.processes) ]
+
+def do_top(server, session, count=10, key='cpu'):
+    processes = _get_server(server, session)['processes']
+    # The processes are ranked on these keys only
+    if key not in processes.sorted:
+        raise CommandError('top: invalid sort key: %s' % (key,))
+    return [ processes.processes[pid].config for pid in
+                processes.get_top_pids(int(count), key) ]
+
+def do_kill(server, session, pid):
+    processes = _get_server(server, session)['processes']
+    if not processes.kill_process(int(pid)):
+        raise CommandError('kill: (%s) - No such process' % (pid,))
+    return True
+
+def do_free(server, session):
+    return _get_server(server, session)['memory'].dump()
+
+def do_uptime(server, session):
+    metrics = _get_server(server, session).get('metrics')
+    if metrics is None:
+        return [0.0, 0.0, 0.0]
+    return list(metrics.get_loadavg())
+
+def do_stats(server, session):
+    latencies = session.latencies.window()
+    return {
+        'requests': session.requests,
+        'errors': session.errors,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99)
+    }
+
+COMMANDS = {
+    'servers': do_servers,
+    'use': do_use,
+    'pwd': do_pwd,
+    'cd': do_cd,
+    'ls': do_ls,
+    'stat': do_stat,
+    'cat': do_cat,
+    'head': do_head,
+    'tail': do_tail,
+    'ps': do_ps,
+    'top': do_top,
+    'kill': do_kill,
+    'free': do_free,
+    'uptime': do_uptime,
+    'stats': do_stats
+}
+
+class Client(object):
+    """
+    Blocking client of a SimuluxServer
+    """
+    def __init__(self, address, timeout=10):
+        super(Client, self).__init__()
+        if isinstance(address, basestring):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.reader = self.socket.makefile('rb')
+        self.requests = 0
+
+    def request(self, command, *args):
+        '''
+        Send a request, return the reply dict
+        '''
+        self.requests += 1
+        request = {'id': self.requests, 'cmd': command, 'args': list(args)}
+        self.socket.sendall(json.dumps(request) + '\n')
+        line = self.reader.readline()
+        if not line:
+            return {'id': self.requests, 'ok': False, 'error': 'Connection closed'}
+        return json.loads(line)
+
+    def call(self, command, *args):
+        '''
+        Send a request, return its result (None on error)
+        '''
+        reply = self.request(command, *args)
+        if not reply.get('ok'):
+            print reply.get('error')
+            return None
+        return reply.get('result')
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
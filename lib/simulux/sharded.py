@@ -0,0 +1,288 @@
+import multiprocessing
+import operator
+
+from simulux.environment import Environment
+from simulux.exceptions import SimuluxShardException
+
+'''
+Sharded Environment
+
+Runs the servers of an Environment in a pool of worker processes, to use
+all the cores on large clusters. Each worker owns an Environment with its
+share of the servers (its shard); the coordinator only sends commands.
+
+- Commands are batched: execute() sends a single message per worker with
+  all its commands, and the workers run them in parallel.
+- Cross-server queries are map-reduce: map_reduce(mapper, reducer) runs
+  mapper(name, server) on every server inside the workers, each worker
+  reduces its own values and the coordinator reduces the partial results.
+  Mappers and reducers are sent to the workers, so they must be module level
+  functions (see disk_used, memory_used and process_count).
+
+All the servers of a worker share its clock; advance() moves the clocks of
+all the workers.
+'''
+
+def disk_used(name, server):
+    '''
+    Mapper: used bytes of all the partitions of a server
+    '''
+    disks = server['disks']
+    disks.flush_sizes()
+    used = 0
+    for partition in disks.partitions.itervalues():
+        details = disks.files.get(partition.get('mount'))
+        if details is not None:
+            used += details.get('size', 0)
+    return used
+
+def memory_used(name, server):
+    '''
+    Mapper: used memory of a server
+    '''
+    return server['memory'].dump()['used']
+
+def process_count(name, server):
+    '''
+    Mapper: number of processes of a server
+    '''
+    return len(server['processes'].processes)
+
+def _execute(env, commands):
+    results = []
+    for name, component, method, args in commands:
+        if env.servers.get(name) is None:
+            print 'Unknown server: %s' % (name,)
+            results.append(None)
+            continue
+        # A failed command does not stop the others, already run or not
+        try:
+            if component is None:
+                # Environment method working on the server, ex. grow_file;
+                # the rates / events returned stay in the worker
+                results.append(getattr(env, method)(name, *args) is not None)
+            else:
+                server = env.get_server(name)
+                results.append(getattr(server[component], method)(*args))
+        except Exception as e:
+            print '%s %s.%s failed: %s: %s' % (name, component, method,
+                                               e.__class__.__name__, e)
+            results.append(None)
+    return results
+
+def _map(env, payload):
+    mapper, reducer, args = payload
+    names = sorted(env.servers)
+    values = [ mapper(name, env.get_server(name), *args) for name in names ]
+    if reducer is None:
+        return zip(names, values)
+    if not values:
+        return values
+    return [reduce(reducer, values)]
+
+def _add_server(env, payload):
+    name, details = payload
+    template = details.get('template')
+    if template:
+        return env.clone_server(name, template) is not None
+    env.servers.update({name: env.add_server(details)})
+    return True
+
+HANDLERS = {
+    'execute': _execute,
+    'advance': lambda env, seconds: env.advance(seconds),
+    'map': _map,
+    'add_server': _add_server,
+    'now': lambda env, payload: env.clock.now
+}
+
+def _worker(conn, servers, templates):
+    try:
+        env = Environment(servers=servers, templates=templates)
+    except Exception as e:
+        conn.send(('error', '%s: %s' % (e.__class__.__name__, e)))
+        conn.close()
+        return
+    # The servers actually created (ex. not the ones of unknown templates)
+    conn.send(('ok', sorted(env.servers)))
+    while True:
+        try:
+            command, payload = conn.recv()
+        except EOFError:
+            break
+        if command == 'close':
+            conn.send(('ok', None))
+            break
+        try:
+            result = HANDLERS[command](env, payload)
+            conn.send(('ok', result))
+        except Exception as e:
+            # Includes the results which can not be sent back
+            conn.send(('error', '%s: %s' % (e.__class__.__name__, e)))
+    conn.close()
+
+class ShardedEnvironment(object):
+    """
+    Environment whose servers are spread over a pool of worker processes
+    """
+    def __init__(self, servers={}, templates={}, workers=None):
+        '''
+        Start the workers; raise SimuluxShardException if one of them can
+        not set up its servers
+        '''
+        if not workers:
+            workers = multiprocessing.cpu_count()
+        # server name -> worker index
+        self.shards = {}
+        shards = [ {} for idx in range(workers) ]
+        for idx, name in enumerate(sorted(servers)):
+            self.shards[name] = idx % workers
+            shards[idx % workers][name] = servers[name]
+        self.templates = templates
+        self.workers = []
+        for shard in shards:
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker,
+                                              args=(child_conn, shard, templates))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+            self.workers.append((process, conn))
+        self._check_started()
+
+    def _check_started(self):
+        errors = []
+        for idx, (process, conn) in enumerate(self.workers):
+            try:
+                status, result = conn.recv()
+            except (EOFError, IOError) as e:
+                status, result = 'error', 'exited (%s)' % (e.__class__.__name__,)
+            if status == 'error':
+                errors.append('Worker %d failed to start: %s' % (idx, result))
+                continue
+            created = set(result)
+            for name, shard in self.shards.items():
+                if shard == idx and name not in created:
+                    del self.shards[name]
+        if errors:
+            self.close()
+            raise SimuluxShardException('; '.join(errors))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self, payloads, command):
+        '''
+        Send command to the workers of payloads (worker index -> payload) and
+        return their results; the workers run in parallel
+        '''
+        for idx, payload in payloads.iteritems():
+            self.workers[idx][1].send((command, payload))
+        results = {}
+        for idx in payloads:
+            status, result = self.workers[idx][1].recv()
+            if status == 'error':
+                print 'Worker %d failed on %s: %s' % (idx, command, result)
+                result = None
+            results[idx] = result
+        return results
+
+    def _broadcast(self, command, payload=None):
+        return self._run(dict((idx, payload) for idx in range(len(self.workers))),
+                         command)
+
+    def add_server(self, name, details={}):
+        '''
+        Add a server to the least loaded worker; details may be
+        {'template': name} to clone a template
+        '''
+        if name in self.shards:
+            print 'Server already exists: %s' % (name,)
+            return False
+        loads = [0] * len(self.workers)
+        for idx in self.shards.itervalues():
+            loads[idx] += 1
+        idx = loads.index(min(loads))
+        if not self._run({idx: (name, details)}, 'add_server')[idx]:
+            return False
+        self.shards[name] = idx
+        return True
+
+    def execute(self, commands):
+        '''
+        Run a batch of commands, one message per worker; a command is
+        (server name, component, method, args), ex.
+        ('web1', 'processes', 'kill_process', (1,)). With component None,
+        the Environment method is called with the server name first, ex.
+        ('web1', None, 'grow_file', ('/var/log/messages', 1024)).
+        Return the results in the order of the commands.
+        '''
+        batches = {}
+        positions = {}
+        results = [None] * len(commands)
+        for position, command in enumerate(commands):
+            idx = self.shards.get(command[0])
+            if idx is None:
+                print 'Unknown server: %s' % (command[0],)
+                continue
+            name, component, method = command[:3]
+            args = tuple(command[3]) if len(command) > 3 else ()
+            batches.setdefault(idx, []).append((name, component, method, args))
+            positions.setdefault(idx, []).append(position)
+        for idx, batch_results in self._run(batches, 'execute').iteritems():
+            if batch_results is None:
+                continue
+            for position, result in zip(positions[idx], batch_results):
+                results[position] = result
+        return results
+
+    def call(self, name, component, method, *args):
+        '''
+        Run a single command (see execute)
+        '''
+        return self.execute([(name, component, method, args)])[0]
+
+    def advance(self, seconds):
+        '''
+        Move the simulated time of all the workers forward
+        '''
+        self._broadcast('advance', seconds)
+
+    def get_time(self):
+        return min(self._broadcast('now').itervalues())
+
+    def map_reduce(self, mapper, reducer=operator.add, args=()):
+        '''
+        Return the reduction of mapper(name, server, *args) over all the
+        servers (None if there is no server). With reducer None, return the
+        {name: value} of all the servers.
+        '''
+        results = self._broadcast('map', (mapper, reducer, tuple(args)))
+        if reducer is None:
+            values = {}
+            # (name, value) of each server of the worker
+            for pairs in results.itervalues():
+                values.update(pairs or [])
+            return values
+        partials = [ shard_values[0] for shard_values in results.itervalues()
+                     if shard_values ]
+        if not partials:
+            return None
+        return reduce(reducer, partials)
+
+    def close(self):
+        '''
+        Stop the workers
+        '''
+        for process, conn in self.workers:
+            try:
+                conn.send(('close', None))
+                conn.recv()
+            except (EOFError, IOError):
+                pass
+            conn.close()
+            process.join()
+        self.workers = []
@@ -0,0 +1,438 @@
+import marshal
+import mmap
+import os
+import struct
+from array import array
+
+from simulux.cpus import CPUS, ArrayCPUS, CPU_TYPES
+from simulux.disks import Disks
+from simulux.files import FileNode, FILETYPES, filetype_code, intern_string
+from simulux.memory import Memory
+from simulux.processes import Processes, ArrayProcesses
+from simulux.proctable import INT_COLUMNS, MEMORY_COLUMNS, STRING_COLUMNS, KEY_BITS
+from simulux.storage import TreeStorage, OverlayStorage
+
+'''
+Environment snapshots
+
+Saves the state of the servers and templates of an Environment (Memory,
+CPUS, Disks, Processes) in a compact binary file, and restores it without
+going through the JSON layouts.
+
+File format: a header (magic, offset of the index), then 8 bytes aligned
+sections, then the index (marshal). The index holds the small objects of
+each server (memory, cpus, disks / partitions, string tables) and the
+(offset, length) of its sections:
+- files: the paths ('\\0' separated) and one array per file field (size,
+  mode, owner / group string codes, filetype, mount, present fields mask),
+  plus the sparse extra keys (ex. real_filename),
+- processes: one array per process field (pid, ppid, threads, rss, virt,
+  name / state / uid / gid string codes, one per cpu type, present keys
+  mask, allocated flag), plus the keys the columns can not hold.
+
+The disks cloned from a template (copy-on-write overlay) only save their
+changes: the changed files and the deleted paths. They are restored as an
+overlay of the restored template, so they keep sharing its files; the
+other disks are saved whole, with the storage backend under their overlays.
+
+The file is read through mmap; each array is built straight from its bytes.
+The scheduled events and rates of the clock are not saved.
+'''
+
+MAGIC = 'SIMULUX\x02'
+HEADER = struct.Struct('<8sQ')
+# Bits of the file fields set (the others are None)
+PRESENT_BITS = {'size': 1, 'mode': 2, 'owner': 4, 'group': 8}
+
+STORAGE_NAMES = {TreeStorage: 'tree'}
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+class SnapshotWriter(object):
+    """Define a SnapshotWriter object"""
+    def __init__(self, f):
+        super(SnapshotWriter, self).__init__()
+        self.f = f
+        self.offset = HEADER.size
+        f.write(HEADER.pack(MAGIC, 0))
+
+    def add(self, data):
+        '''
+        Write a section, return its (offset, length)
+        '''
+        padding = _align(self.offset) - self.offset
+        if padding:
+            self.f.write('\0' * padding)
+            self.offset += padding
+        if isinstance(data, array):
+            data = data.tostring()
+        self.f.write(data)
+        section = (self.offset, len(data))
+        self.offset += len(data)
+        return section
+
+    def add_array(self, typecode, values):
+        return (typecode,) + self.add(array(typecode, values))
+
+    def close(self, index):
+        offset = self.add(marshal.dumps(index))[0]
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, offset))
+
+class StringTable(object):
+    """Define a StringTable object"""
+    def __init__(self):
+        super(StringTable, self).__init__()
+        self.strings = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(value)
+            self.codes[value] = code
+        return code
+
+def _add_paths(writer, paths):
+    return writer.add('\0'.join(path.encode('utf-8') for path in paths))
+
+def _get_base(files):
+    # Storage under the copy-on-write overlays (clone, checkpoints)
+    while isinstance(files, OverlayStorage):
+        files = files.base
+    return files
+
+def _get_changes(files, base):
+    '''
+    Return the paths changed and the paths deleted by the overlays of files
+    over base
+    '''
+    changed = set()
+    deleted = set()
+    while files is not base:
+        changed.update(files.local.iterkeys())
+        deleted.update(files.deleted)
+        files = files.base
+    return changed, deleted
+
+def _dump_files(writer, items):
+    strings = StringTable()
+    paths = []
+    columns = dict((name, []) for name in ['size', 'mode', 'owner', 'group',
+                                           'ftype', 'mount', 'present'])
+    extras = {}
+    # Sizes / modes which are not integers
+    values = {}
+    for idx, (path, node) in enumerate(items):
+        paths.append(path)
+        present = 0
+        for key in ['size', 'mode']:
+            value = getattr(node, key)
+            if value is None:
+                value = 0
+            else:
+                present |= PRESENT_BITS[key]
+                if type(value) not in [int, long]:
+                    values.setdefault(idx, {})[key] = value
+                    value = 0
+            columns[key].append(value)
+        for key in ['owner', 'group']:
+            value = getattr(node, key)
+            if value is None:
+                columns[key].append(0)
+            else:
+                present |= PRESENT_BITS[key]
+                columns[key].append(strings.code(value))
+        columns['ftype'].append(node.ftype)
+        columns['mount'].append(1 if node.mount else 0)
+        columns['present'].append(present)
+        if node.extra:
+            extras[idx] = node.extra
+    return {
+        'count': len(paths),
+        'paths': _add_paths(writer, paths),
+        'size': writer.add_array('l', columns['size']),
+        'mode': writer.add_array('l', columns['mode']),
+        'owner': writer.add_array('i', columns['owner']),
+        'group': writer.add_array('i', columns['group']),
+        'ftype': writer.add_array('b', columns['ftype']),
+        'mount': writer.add_array('b', columns['mount']),
+        'present': writer.add_array('b', columns['present']),
+        'extras': writer.add(marshal.dumps(extras)),
+        'values': writer.add(marshal.dumps(values)),
+        'strings': strings.strings,
+        'filetypes': list(FILETYPES)
+    }
+
+def _dump_processes(writer, processes):
+    strings = StringTable()
+    columns = dict((name, []) for name in INT_COLUMNS + MEMORY_COLUMNS +
+                   STRING_COLUMNS + CPU_TYPES + ['keys', 'allocated'])
+    rests = {}
+    for idx, pid in enumerate(sorted(processes.processes)):
+        process = processes.processes[pid]
+        config = process.config
+        keys = 0
+        rest = {}
+        for key, value in config.iteritems():
+            if key in INT_COLUMNS and type(value) in [int, long]:
+                keys |= KEY_BITS[key]
+            elif key in STRING_COLUMNS:
+                keys |= KEY_BITS[key]
+            elif key in ['memory', 'cpus'] and type(value) == dict:
+                keys |= KEY_BITS[key]
+                if key == 'memory':
+                    names, types = MEMORY_COLUMNS, [int, long]
+                else:
+                    names, types = CPU_TYPES, [int, long, float]
+                for name, item in value.iteritems():
+                    if name in names and type(item) in types:
+                        keys |= KEY_BITS[key + '.' + name]
+                    else:
+                        rest.setdefault(key, {})[name] = item
+            else:
+                rest[key] = value
+        for key in INT_COLUMNS:
+            columns[key].append(config[key] if keys & KEY_BITS[key] else 0)
+        for key in STRING_COLUMNS:
+            columns[key].append(strings.code(config[key]) if keys & KEY_BITS[key]
+                                else 0)
+        memory = config.get('memory', {})
+        for key in MEMORY_COLUMNS:
+            columns[key].append(memory[key] if keys & KEY_BITS['memory.' + key] else 0)
+        cpus = config.get('cpus', {})
+        for key in CPU_TYPES:
+            columns[key].append(cpus[key] if keys & KEY_BITS['cpus.' + key] else 0.0)
+        columns['keys'].append(keys)
+        columns['allocated'].append(1 if process.allocated else 0)
+        if rest:
+            rests[idx] = rest
+    section = {
+        'count': len(columns['keys']),
+        'keys': writer.add_array('l', columns['keys']),
+        'allocated': writer.add_array('b', columns['allocated']),
+        'rests': writer.add(marshal.dumps(rests)),
+        'strings': strings.strings,
+        'class': processes.__class__.__name__
+    }
+    for key in INT_COLUMNS + MEMORY_COLUMNS:
+        section[key] = writer.add_array('l', columns[key])
+    for key in STRING_COLUMNS:
+        section[key] = writer.add_array('i', columns[key])
+    for key in CPU_TYPES:
+        section[key] = writer.add_array('d', columns[key])
+    return section
+
+def _dump_server(writer, server, shared=None):
+    disks = server['disks']
+    cpus = server['cpus']
+    disks.flush_sizes()
+    files = disks.files
+    base = _get_base(files)
+    details = {
+        'storage': STORAGE_NAMES.get(type(base), 'flat'),
+        'disks': disks.disks,
+        'partitions': disks.partitions,
+        'mounts': list(disks.mounts),
+        'scenario_name': disks.scenario_name
+    }
+    template = (shared or {}).get(id(base))
+    if template is not None and base is not files:
+        changed, deleted = _get_changes(files, base)
+        items = [ (path, files.get(path)) for path in changed
+                  if path in files ]
+        details.update({
+            'template': template,
+            'deleted': _add_paths(writer, [ path for path in deleted
+                                            if path in base and path not in files ])
+        })
+    else:
+        items = files.iteritems()
+    return {
+        'memory': server['memory'].dump(),
+        'cpus': {
+            'class': cpus.__class__.__name__,
+            'cores': cpus.cores,
+            'data': cpus.dump()
+        },
+        'disks': details,
+        'files': _dump_files(writer, items),
+        'processes': _dump_processes(writer, server['processes'])
+    }
+
+def save_snapshot(filename, servers, now=0.0, templates=None):
+    '''
+    Save the state of servers and templates (name -> server dict) in
+    filename
+    '''
+    templates = templates or {}
+    with open(filename, 'wb') as f:
+        writer = SnapshotWriter(f)
+        index = {'now': now, 'servers': {}, 'templates': {}}
+        # Files storage of each template -> its name
+        shared = {}
+        for name, template in templates.iteritems():
+            index['templates'][name] = _dump_server(writer, template)
+            shared[id(template['disks'].files)] = name
+        for name, server in servers.iteritems():
+            index['servers'][name] = _dump_server(writer, server, shared)
+        writer.close(index)
+
+def _load_array(content, section):
+    typecode, offset, length = section
+    values = array(typecode)
+    values.fromstring(_load_bytes(content, (offset, length)))
+    return values
+
+def _load_bytes(content, section):
+    offset, length = section
+    if offset + length > len(content):
+        raise ValueError('section beyond the end of the file')
+    return content[offset:offset + length]
+
+def _load_files(content, disks, section):
+    count = section['count']
+    if not count:
+        return
+    paths = _load_bytes(content, section['paths']).split('\0')
+    sizes = _load_array(content, section['size'])
+    modes = _load_array(content, section['mode'])
+    owners = _load_array(content, section['owner'])
+    groups = _load_array(content, section['group'])
+    ftypes = _load_array(content, section['ftype'])
+    mounts = _load_array(content, section['mount'])
+    presents = _load_array(content, section['present'])
+    extras = marshal.loads(_load_bytes(content, section['extras']))
+    values = marshal.loads(_load_bytes(content, section['values']))
+    strings = [ intern_string(value) for value in section['strings'] ]
+    # Filetype codes are process wide; map the saved ones
+    ftype_codes = [ filetype_code(name) for name in section['filetypes'] ]
+    files = disks.files
+    for idx in xrange(count):
+        node = FileNode.__new__(FileNode)
+        present = presents[idx]
+        node.size = sizes[idx] if present & PRESENT_BITS['size'] else None
+        node.mode = modes[idx] if present & PRESENT_BITS['mode'] else None
+        node.owner = strings[owners[idx]] if present & PRESENT_BITS['owner'] \
+            else None
+        node.group = strings[groups[idx]] if present & PRESENT_BITS['group'] \
+            else None
+        node.ftype = ftype_codes[ftypes[idx]]
+        node.mount = bool(mounts[idx])
+        node.extra = extras.get(idx)
+        if idx in values:
+            for key, value in values[idx].iteritems():
+                setattr(node, key, value)
+        files[paths[idx].decode('utf-8')] = node
+
+def _load_processes(content, processes, section):
+    count = section['count']
+    columns = {}
+    for key in INT_COLUMNS + MEMORY_COLUMNS + STRING_COLUMNS + CPU_TYPES + \
+            ['keys', 'allocated']:
+        columns[key] = _load_array(content, section[key])
+    rests = marshal.loads(_load_bytes(content, section['rests']))
+    strings = section['strings']
+    configs = []
+    for idx in xrange(count):
+        keys = columns['keys'][idx]
+        rest = rests.get(idx, {})
+        config = {}
+        for key, value in rest.iteritems():
+            if key not in ['memory', 'cpus']:
+                config[key] = value
+        for key in INT_COLUMNS:
+            if keys & KEY_BITS[key]:
+                config[key] = columns[key][idx]
+        for key in STRING_COLUMNS:
+            if keys & KEY_BITS[key]:
+                config[key] = strings[columns[key][idx]]
+        for group, names in [('memory', MEMORY_COLUMNS), ('cpus', CPU_TYPES)]:
+            if not keys & KEY_BITS[group]:
+                continue
+            values = dict(rest.get(group, {}))
+            for name in names:
+                if keys & KEY_BITS[group + '.' + name]:
+                    values[name] = columns[name][idx]
+            config[group] = values
+        configs.append(config)
+    processes.load_processes(configs, columns['allocated'])
+
+def _load_server(content, details, templates=None):
+    memory = object.__new__(Memory)
+    memory.data = details['memory']
+    memory.checkpoints = []
+
+    cpus_details = details['cpus']
+    cls = ArrayCPUS if cpus_details['class'] == 'ArrayCPUS' else CPUS
+    cpus = object.__new__(cls)
+    cpus.cores = cpus_details['cores']
+    cpus.data = cpus_details['data']
+    cpus.checkpoints = []
+    if cls is ArrayCPUS:
+        cpus._load_matrix()
+
+    disks_details = details['disks']
+    disks = object.__new__(Disks)
+    disks._init_storage(disks_details['storage'])
+    template = disks_details.get('template')
+    if template is not None:
+        # Share the files of the restored template again
+        disks.files = OverlayStorage(templates[template]['disks'].files)
+    disks.disks = disks_details['disks']
+    disks.partitions = disks_details['partitions']
+    disks.mounts = set(disks_details['mounts'])
+    disks.scenario_name = disks_details['scenario_name']
+    _load_files(content, disks, details['files'])
+    if template is not None:
+        deleted = _load_bytes(content, disks_details['deleted'])
+        if deleted:
+            for path in deleted.split('\0'):
+                del disks.files[path.decode('utf-8')]
+
+    section = details['processes']
+    cls = ArrayProcesses if section['class'] == 'ArrayProcesses' else Processes
+    processes = object.__new__(cls)
+    processes.cpus = cpus
+    processes.disks = disks
+    processes.memory = memory
+    processes._init_storage()
+    _load_processes(content, processes, section)
+
+    return {'memory': memory, 'disks': disks, 'cpus': cpus, 'processes': processes}
+
+def load_snapshot(filename):
+    '''
+    Return the (servers, time, templates) saved in filename; None if it is
+    not a valid snapshot
+    '''
+    try:
+        f = open(filename, 'rb')
+    except IOError as e:
+        print 'Error loading snapshot %s: %s' % (filename, e,)
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            print 'Invalid snapshot: %s' % (filename,)
+            return None
+        content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, offset = HEADER.unpack(content[:HEADER.size])
+            if magic != MAGIC or not HEADER.size <= offset < len(content):
+                print 'Invalid snapshot: %s' % (filename,)
+                return None
+            index = marshal.loads(content[offset:])
+            templates = dict((name, _load_server(content, details))
+                             for name, details in index['templates'].iteritems())
+            servers = dict((name, _load_server(content, details, templates))
+                           for name, details in index['servers'].iteritems())
+        except (EOFError, ValueError, TypeError, KeyError, IndexError,
+                AttributeError) as e:
+            # Truncated or corrupted file
+            print 'Invalid snapshot %s: %s' % (filename, e,)
+            return None
+        finally:
+            content.close()
+    return servers, index['now'], templates
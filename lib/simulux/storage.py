@@ -0,0 +1,531 @@
+import os
+
+'''
+Storage backends of the Disks files.
+
+Both backends map an absolute path to the details of the file (FileNode) and
+expose the same dict-like API (get, update, iteritems, ...) plus the tree
+operations needed by Disks:
+- get_childrens / iter_descendants: walk the tree,
+- get_writable: details of a path that can be modified in place,
+- iter_parents: walk up from a path to the top of the tree (the details
+  returned can be modified in place),
+- add_childrens: add many new files to a folder at once,
+- remove_tree: remove a path and everything below,
+- move: rename a path and everything below.
+
+FlatStorage: dict keyed by full path, with a parent -> childrens index.
+    Lookups are O(1), moves are O(size of the subtree).
+TreeStorage: tree of inodes with per-folder childrens maps.
+    Lookups are O(depth), moves are O(depth).
+OverlayStorage: copy-on-write layer over another storage, which is shared
+    and must not be modified anymore. Only the changed paths are stored;
+    they can be dropped (clear) or written to the base (apply), which makes
+    the overlay a checkpoint of its base.
+'''
+
+class FlatStorage(dict):
+    """Define a FlatStorage object"""
+    def __init__(self):
+        super(FlatStorage, self).__init__()
+        # Index of the direct childrens of each folder: parent -> set(paths)
+        self.childrens = {}
+
+    def __setitem__(self, path, details):
+        dict.__setitem__(self, path, details)
+        parent = os.path.dirname(path)
+        if parent != path:
+            self.childrens.setdefault(parent, set()).add(path)
+
+    def __delitem__(self, path):
+        dict.__delitem__(self, path)
+        parent = os.path.dirname(path)
+        childrens = self.childrens.get(parent)
+        if childrens is None:
+            return
+        childrens.discard(path)
+        if not childrens:
+            del self.childrens[parent]
+
+    def update(self, other=None, **kwargs):
+        if other is not None:
+            for path, details in other.iteritems():
+                self[path] = details
+        for path, details in kwargs.iteritems():
+            self[path] = details
+
+    def get_writable(self, path):
+        return self.get(path)
+
+    def add_childrens(self, path, childrens):
+        '''
+        Add the childrens (path -> details) of the folder path; they must not
+        exist yet
+        '''
+        dict.update(self, childrens)
+        self.childrens.setdefault(path, set()).update(childrens)
+
+    def get_childrens(self, path):
+        '''
+        Return the paths of the direct childrens of path
+        '''
+        return list(self.childrens.get(path, ()))
+
+    def iter_descendants(self, path):
+        '''
+        Yield the paths below path (any depth), parents before childrens
+        '''
+        stack = [path]
+        while stack:
+            childrens = self.childrens.get(stack.pop())
+            if childrens:
+                for child in childrens:
+                    yield child
+                stack.extend(childrens)
+
+    def iter_parents(self, path):
+        '''
+        Yield (path, details) of each parent of path, up to the top folder.
+        details is None for a missing parent, which ends the walk.
+        '''
+        parent = os.path.dirname(path)
+        while parent != path:
+            details = self.get(parent)
+            yield parent, details
+            if details is None:
+                return
+            path, parent = parent, os.path.dirname(parent)
+
+    def remove_tree(self, path):
+        '''
+        Remove path and all its descendants
+        '''
+        for child in list(self.iter_descendants(path)):
+            dict.__delitem__(self, child)
+            self.childrens.pop(child, None)
+        self.childrens.pop(path, None)
+        del self[path]
+
+    def move(self, path, new_path):
+        '''
+        Move path and all its descendants below new_path
+        '''
+        paths = [path] + list(self.iter_descendants(path))
+        moved = [ (new_path + child[len(path):], self.get(child))
+                    for child in paths ]
+        for child in reversed(paths):
+            self.childrens.pop(child, None)
+            del self[child]
+        for child, details in moved:
+            self[child] = details
+
+
+class Inode(object):
+    """Define an Inode object"""
+    __slots__ = ('name', 'parent', 'childrens', 'details')
+
+    def __init__(self, name, parent=None, details=None):
+        self.name = name
+        self.parent = parent
+        # name -> Inode, only allocated for non-empty folders
+        self.childrens = None
+        # None for intermediate folders which do not exist (yet)
+        self.details = details
+
+    def attach(self, name, inode):
+        if self.childrens is None:
+            self.childrens = {}
+        inode.name = name
+        inode.parent = self
+        self.childrens[name] = inode
+
+    def detach(self):
+        parent = self.parent
+        del parent.childrens[self.name]
+        if not parent.childrens:
+            parent.childrens = None
+        self.parent = None
+
+
+class TreeStorage(object):
+    """Define a TreeStorage object"""
+    def __init__(self):
+        super(TreeStorage, self).__init__()
+        self.root = Inode('/')
+        self.count = 0
+
+    def _split(self, path):
+        return [ name for name in path.split('/') if name ]
+
+    def _lookup(self, path):
+        '''
+        Return the inode of path (None if missing)
+        '''
+        inode = self.root
+        for name in self._split(path):
+            if inode.childrens is None:
+                return None
+            inode = inode.childrens.get(name)
+            if inode is None:
+                return None
+        return inode
+
+    def _lookup_existing(self, path):
+        inode = self._lookup(path)
+        if inode is None or inode.details is None:
+            raise KeyError(path)
+        return inode
+
+    def _make_inode(self, path):
+        '''
+        Return the inode of path, creating the missing intermediate inodes
+        '''
+        inode = self.root
+        for name in self._split(path):
+            child = None
+            if inode.childrens is not None:
+                child = inode.childrens.get(name)
+            if child is None:
+                child = Inode(name)
+                inode.attach(name, child)
+            inode = child
+        return inode
+
+    def _prune(self, inode):
+        '''
+        Drop the intermediate inodes left without details nor childrens
+        '''
+        while inode.parent is not None and inode.details is None \
+                and inode.childrens is None:
+            parent = inode.parent
+            inode.detach()
+            inode = parent
+
+    def _iter_inodes(self, inode, path):
+        '''
+        Yield (path, inode) of the existing inodes below inode; the files
+        below a missing intermediate folder (no details) are included
+        '''
+        stack = [(inode, path)]
+        while stack:
+            inode, path = stack.pop()
+            if inode.childrens is None:
+                continue
+            for name, child in inode.childrens.iteritems():
+                child_path = os.path.join(path, name)
+                if child.details is not None:
+                    yield child_path, child
+                stack.append((child, child_path))
+
+    def _count(self, inode):
+        count = 0
+        for path, child in self._iter_inodes(inode, ''):
+            count += 1
+        return count
+
+    def get(self, path, default=None):
+        inode = self._lookup(path)
+        if inode is None or inode.details is None:
+            return default
+        return inode.details
+
+    def __getitem__(self, path):
+        return self._lookup_existing(path).details
+
+    def __contains__(self, path):
+        inode = self._lookup(path)
+        return inode is not None and inode.details is not None
+
+    def __setitem__(self, path, details):
+        inode = self._make_inode(path)
+        if inode.details is None:
+            self.count += 1
+        inode.details = details
+
+    def __delitem__(self, path):
+        inode = self._lookup_existing(path)
+        inode.details = None
+        self.count -= 1
+        self._prune(inode)
+
+    def __len__(self):
+        return self.count
+
+    def update(self, other=None, **kwargs):
+        if other is not None:
+            for path, details in other.iteritems():
+                self[path] = details
+        for path, details in kwargs.iteritems():
+            self[path] = details
+
+    def iteritems(self):
+        if self.root.details is not None:
+            yield '/', self.root.details
+        for path, inode in self._iter_inodes(self.root, '/'):
+            yield path, inode.details
+
+    def iterkeys(self):
+        for path, details in self.iteritems():
+            yield path
+
+    __iter__ = iterkeys
+
+    def itervalues(self):
+        for path, details in self.iteritems():
+            yield details
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    get_writable = get
+
+    def add_childrens(self, path, childrens):
+        inode = self._make_inode(path)
+        if inode.childrens is None:
+            inode.childrens = {}
+        existing = inode.childrens
+        for child_path, details in childrens.iteritems():
+            name = child_path[child_path.rfind('/') + 1:]
+            child = existing.get(name)
+            if child is None:
+                child = Inode(name, inode, details)
+                existing[name] = child
+                self.count += 1
+            else:
+                if child.details is None:
+                    self.count += 1
+                child.details = details
+        if not existing:
+            inode.childrens = None
+
+    def get_childrens(self, path):
+        inode = self._lookup(path)
+        if inode is None or inode.childrens is None:
+            return []
+        return [ os.path.join(path, name) for name, child in
+                    inode.childrens.iteritems() if child.details is not None ]
+
+    def iter_descendants(self, path):
+        inode = self._lookup(path)
+        if inode is None:
+            return
+        for child_path, child in self._iter_inodes(inode, path):
+            yield child_path
+
+    def iter_parents(self, path):
+        inode = self._lookup(path)
+        if inode is None:
+            # Unknown path, look the parents up by name
+            parent = os.path.dirname(path)
+            while parent != path:
+                details = self.get(parent)
+                yield parent, details
+                if details is None:
+                    return
+                path, parent = parent, os.path.dirname(parent)
+            return
+        while inode.parent is not None:
+            inode = inode.parent
+            path = os.path.dirname(path)
+            yield path, inode.details
+            if inode.details is None:
+                return
+
+    def remove_tree(self, path):
+        inode = self._lookup_existing(path)
+        self.count -= 1 + self._count(inode)
+        if inode.parent is None:
+            inode.details = None
+            inode.childrens = None
+            return
+        parent = inode.parent
+        inode.detach()
+        self._prune(parent)
+
+    def move(self, path, new_path):
+        inode = self._lookup_existing(path)
+        parent = inode.parent
+        inode.detach()
+        self._prune(parent)
+        target = self._make_inode(new_path)
+        # Keep any inode already below the target (missing intermediate)
+        if target.childrens is not None:
+            if inode.childrens is None:
+                inode.childrens = {}
+            for name, child in target.childrens.iteritems():
+                child.parent = inode
+                inode.childrens.setdefault(name, child)
+        name, target_parent = target.name, target.parent
+        target.detach()
+        target_parent.attach(name, inode)
+
+
+class OverlayStorage(object):
+    """Define an OverlayStorage object"""
+    def __init__(self, base):
+        super(OverlayStorage, self).__init__()
+        # Shared storage, never modified through the overlay
+        self.base = base
+        # Paths added or modified in the overlay
+        self.local = FlatStorage()
+        # Paths of the base removed in the overlay
+        self.deleted = set()
+        self.count = len(base)
+
+    def get(self, path, default=None):
+        details = self.local.get(path)
+        if details is not None:
+            return details
+        if path in self.deleted:
+            return default
+        return self.base.get(path, default)
+
+    def __getitem__(self, path):
+        details = self.get(path)
+        if details is None:
+            raise KeyError(path)
+        return details
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    def __setitem__(self, path, details):
+        if path not in self:
+            self.count += 1
+        self.local[path] = details
+        self.deleted.discard(path)
+
+    def __delitem__(self, path):
+        if path not in self:
+            raise KeyError(path)
+        if path in self.local:
+            del self.local[path]
+        if path in self.base:
+            self.deleted.add(path)
+        self.count -= 1
+
+    def __len__(self):
+        return self.count
+
+    def update(self, other=None, **kwargs):
+        if other is not None:
+            for path, details in other.iteritems():
+                self[path] = details
+        for path, details in kwargs.iteritems():
+            self[path] = details
+
+    def clear(self):
+        '''
+        Drop all the changes of the overlay
+        '''
+        self.local = FlatStorage()
+        self.deleted = set()
+        self.count = len(self.base)
+
+    def apply(self):
+        '''
+        Write the changes of the overlay in its base (which must not be
+        shared anymore) and return the base
+        '''
+        for path in self.deleted:
+            del self.base[path]
+        self.base.update(self.local)
+        self.clear()
+        return self.base
+
+    def get_writable(self, path):
+        '''
+        Copy the details of a shared path in the overlay before its change
+        '''
+        details = self.local.get(path)
+        if details is not None:
+            return details
+        if path in self.deleted:
+            return None
+        details = self.base.get(path)
+        if details is None:
+            return None
+        details = details.clone()
+        self.local[path] = details
+        return details
+
+    def add_childrens(self, path, childrens):
+        self.local.add_childrens(path, childrens)
+        self.deleted.difference_update(childrens)
+        self.count += len(childrens)
+
+    def iteritems(self):
+        for path, details in self.base.iteritems():
+            if path not in self.deleted and path not in self.local:
+                yield path, details
+        for item in self.local.iteritems():
+            yield item
+
+    def iterkeys(self):
+        for path, details in self.iteritems():
+            yield path
+
+    __iter__ = iterkeys
+
+    def itervalues(self):
+        for path, details in self.iteritems():
+            yield details
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def get_childrens(self, path):
+        childrens = set(self.local.get_childrens(path))
+        for child in self.base.get_childrens(path):
+            if child not in self.deleted:
+                childrens.add(child)
+        return list(childrens)
+
+    def iter_descendants(self, path):
+        stack = [path]
+        while stack:
+            childrens = self.get_childrens(stack.pop())
+            for child in childrens:
+                yield child
+            stack.extend(childrens)
+
+    def iter_parents(self, path):
+        parent = os.path.dirname(path)
+        while parent != path:
+            details = self.get_writable(parent)
+            yield parent, details
+            if details is None:
+                return
+            path, parent = parent, os.path.dirname(parent)
+
+    def remove_tree(self, path):
+        for child in list(self.iter_descendants(path)):
+            del self[child]
+        del self[path]
+
+    def move(self, path, new_path):
+        paths = [path] + list(self.iter_descendants(path))
+        # The moved details are changed at their new path: copy the shared ones
+        moved = [ (new_path + child[len(path):], self.get_writable(child))
+                    for child in paths ]
+        self.remove_tree(path)
+        for child, details in moved:
+            self[child] = details
+
+
+STORAGES = {
+    'flat': FlatStorage,
+    'tree': TreeStorage
+}
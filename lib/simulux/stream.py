@@ -0,0 +1,192 @@
+import json
+import re
+import time
+
+'''
+Streaming JSON reader
+
+Reads a JSON document from a file by chunks and yields parsing events,
+so huge documents (ex. generated disks layouts) can be processed without
+holding them in memory:
+- ('start_map', None), ('key', name), ('end_map', None),
+- ('start_array', None), ('end_array', None),
+- ('value', value) for the strings, numbers, booleans and null,
+- ('object', dict) for the objects without nested containers (empty ones
+  aside), parsed at once by the C decoder; most entries of a layout (the
+  files) are read this way.
+
+Only the current chunk and the stack of the open containers are kept. The
+separators (, and :) are not validated; the documents are expected to be
+valid JSON.
+'''
+
+CHUNK_SIZE = 1024 * 1024
+# Bytes kept ahead of the parsing position, so no token is cut
+LOOKAHEAD = 64 * 1024
+# Entries between two progress reports
+PROGRESS_INTERVAL = 100000
+
+_SKIP = re.compile(r'[\s,:]*')
+# Object prefix without nested containers (empty ones allowed)
+_FLAT = re.compile(r'\{(?:[^{}\[\]]+|\{\s*\}|\[\s*\])*')
+
+def iter_events(f, chunk_size=CHUNK_SIZE, lookahead=LOOKAHEAD):
+    '''
+    Yield the parsing events of the JSON document read from file object f;
+    the numbers must be shorter than lookahead
+    '''
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    # True for the open maps, False for the arrays
+    stack = []
+    expect_key = False
+    while True:
+        if not eof and len(buf) - pos < lookahead:
+            data = [buf[pos:]]
+            size = len(data[0])
+            while size < lookahead:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                    break
+                data.append(chunk)
+                size += len(chunk)
+            buf = ''.join(data)
+            pos = 0
+        pos = _SKIP.match(buf, pos).end()
+        if pos >= len(buf):
+            if not eof:
+                continue
+            if stack:
+                raise ValueError('Unexpected end of JSON document')
+            return
+        char = buf[pos]
+        if char == '{':
+            end = _FLAT.match(buf, pos).end()
+            if end == len(buf) and not eof:
+                # Object longer than the lookahead; read more and retry
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            if end < len(buf) and buf[end] == '}' and not expect_key:
+                try:
+                    value, pos = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Braces within strings; parse it event by event
+                    pass
+                else:
+                    yield 'object', value
+                    expect_key = bool(stack and stack[-1])
+                    continue
+            stack.append(True)
+            expect_key = True
+            pos += 1
+            yield 'start_map', None
+        elif char == '[':
+            stack.append(False)
+            expect_key = False
+            pos += 1
+            yield 'start_array', None
+        elif char in '}]':
+            if not stack or stack.pop() != (char == '}'):
+                raise ValueError('Unexpected %s at offset %d' % (char, pos))
+            expect_key = bool(stack and stack[-1])
+            pos += 1
+            yield 'end_map' if char == '}' else 'end_array', None
+        else:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            if expect_key:
+                expect_key = False
+                yield 'key', value
+            else:
+                expect_key = bool(stack and stack[-1])
+                yield 'value', value
+
+def read_value(events, event, value):
+    '''
+    Return the full value starting with (event, value), reading the
+    following events of a nested container
+    '''
+    if event in ('value', 'object'):
+        return value
+    containers = []
+    key = None
+    while True:
+        if event == 'start_map' or event == 'start_array':
+            container = {} if event == 'start_map' else []
+            if containers:
+                parent = containers[-1]
+                if isinstance(parent, dict):
+                    parent[key] = container
+                else:
+                    parent.append(container)
+            containers.append(container)
+        elif event == 'end_map' or event == 'end_array':
+            container = containers.pop()
+            if not containers:
+                return container
+        elif event == 'key':
+            key = value
+        else:
+            parent = containers[-1]
+            if isinstance(parent, dict):
+                parent[key] = value
+            else:
+                parent.append(value)
+        event, value = next(events)
+
+class Progress(object):
+    """
+    Count the entries processed from a stream and report the progress and
+    throughput every PROGRESS_INTERVAL entries to callback(stats)
+    """
+    def __init__(self, f, callback=None, interval=PROGRESS_INTERVAL):
+        super(Progress, self).__init__()
+        self.f = f
+        self.callback = callback
+        self.interval = interval
+        self.entries = 0
+        self.start = time.time()
+        self.next_report = interval
+
+    def add(self, count=1):
+        self.entries += count
+        if self.callback is not None and self.entries >= self.next_report:
+            self.next_report = self.entries + self.interval
+            self.callback(self.get_stats())
+
+    def get_stats(self):
+        '''
+        Return the entries and bytes read so far, with their rates
+        '''
+        elapsed = max(time.time() - self.start, 1e-6)
+        read = self.f.tell()
+        return {
+            'entries': self.entries,
+            'bytes': read,
+            'seconds': elapsed,
+            'entries_per_second': self.entries / elapsed,
+            'bytes_per_second': read / elapsed
+        }
+
+def print_progress(stats):
+    '''
+    Progress callback printing the stats
+    '''
+    print '%d entries, %.1f MB in %.1fs (%d entries/s, %.1f MB/s)' % (
+        stats['entries'], stats['bytes'] / 1048576.0, stats['seconds'],
+        stats['entries_per_second'], stats['bytes_per_second'] / 1048576.0)
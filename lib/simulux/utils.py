@@ -1,5 +1,9 @@
+import heapq
 import json
+import marshal
 import os
+from collections import OrderedDict
+from itertools import islice
 
 def load_json(filename):
     '''
@@ -15,11 +19,167 @@ def load_json(filename):
         content = {}
     return content
 
+# Parsed layouts: filename -> ((mtime, size), marshalled content)
+_LAYOUTS = {}
+
 def load_layout(default_layout, layout_file=None):
     '''
     Load the layout from the config file (structured and hierarchical)
+    Parsed layouts are cached (until the file changes); each call returns
+    its own copy, cheaply rebuilt from the marshalled content.
     '''
     if not layout_file:
         layout_file = default_layout
-    return load_json(layout_file)
+    try:
+        stat = os.stat(layout_file)
+    except OSError:
+        return load_json(layout_file)
+    version = (stat.st_mtime, stat.st_size)
+    cached = _LAYOUTS.get(layout_file)
+    if cached is None or cached[0] != version:
+        cached = (version, marshal.dumps(load_json(layout_file)))
+        _LAYOUTS[layout_file] = cached
+    return marshal.loads(cached[1])
+
+def clear_layout_cache():
+    '''
+    Forget all the parsed layouts
+    '''
+    _LAYOUTS.clear()
+
+def get_checkpoint(checkpoints, level=None):
+    '''
+    Return the index of checkpoint level in checkpoints (the last one by
+    default); None if there is no such checkpoint
+    '''
+    if level is None:
+        level = len(checkpoints) - 1
+    if level < 0 or level >= len(checkpoints):
+        print 'No such checkpoint: %s' % (level,)
+        return None
+    return level
+
+
+class LRUCache(object):
+    """
+    Bounded mapping dropping the least recently used entries, counting the
+    cache hits and misses
+    """
+    def __init__(self, maxsize=1024):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        '''
+        Return the cached value of key (and mark it as recently used)
+        '''
+        try:
+            value = self.data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        '''
+        Cache value, dropping the oldest entries when full
+        '''
+        self.data.pop(key, None)
+        self.data[key] = value
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def info(self):
+        '''
+        Return the cache statistics
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.data),
+            'maxsize': self.maxsize
+        }
+
+
+class TopIndex(object):
+    """
+    Keys ranked by value (highest first), kept up to date incrementally.
+    Entries live in a binary heap; removed or updated entries are only
+    dropped from the heap when it grows twice as large as needed.
+    """
+    def __init__(self):
+        super(TopIndex, self).__init__()
+        self.heap = []
+        # key -> its live heap entry (-value, key)
+        self.entries = {}
+
+    def copy(self):
+        index = TopIndex()
+        index.heap = list(self.heap)
+        index.entries = self.entries.copy()
+        return index
+
+    def set(self, key, value):
+        '''
+        Add key or change its value, O(log n)
+        '''
+        entry = (-value, key)
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+        self._compact()
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+        self._compact()
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        return -entry[0]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def _compact(self):
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = self.entries.values()
+            heapq.heapify(self.heap)
+
+    def iter_keys(self):
+        '''
+        Yield the keys by decreasing value; the first K keys cost O(K log K)
+        as only the heap nodes below the yielded ones are visited. The index
+        must not change during the iteration.
+        '''
+        heap = self.heap
+        if not heap:
+            return
+        candidates = [(heap[0], 0)]
+        while candidates:
+            entry, idx = heapq.heappop(candidates)
+            if self.entries.get(entry[1]) is entry:
+                yield entry[1]
+            for child in (2 * idx + 1, 2 * idx + 2):
+                if child < len(heap):
+                    heapq.heappush(candidates, (heap[child], child))
 
+    def top(self, count):
+        '''
+        Return the `count` keys with the highest values, highest first
+        '''
+        return list(islice(self.iter_keys(), count))
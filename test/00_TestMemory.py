@@ -227,3 +227,23 @@ def test_update_buffers_increase():
     }
     assert success == True
     assert jsonify(dump) == jsonify(expected)
+
+def test_update_many():
+    '''
+    Test we can apply many updates at once
+    '''
+    memory = Memory()
+    success = memory.update_many([('used', 1024), ('used', 1024), ('cached', 512)])
+    assert success == True
+    dump = memory.dump()
+    expected = {
+        "total": 4194304,
+        "used": 2560,
+        "free": 4191744,
+        "cached": 512,
+        "buffers": 0,
+        "shared": 0
+    }
+    assert jsonify(dump) == jsonify(expected)
+    assert memory.update_many({'used': 1, 'foo': 1}) == False
+    assert jsonify(memory.dump()) == jsonify(expected)
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+
+import random
+
+from simulux.utils import load_layout, clear_layout_cache, LRUCache, TopIndex
+
+def test_load_layout_copies():
+    '''
+    Test each load of a cached layout returns its own copy
+    '''
+    fd, layout_file = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        f.write(json.dumps({'user': [0.0, 0.0], 'cores': 2}))
+    try:
+        clear_layout_cache()
+        first = load_layout(layout_file)
+        first['user'][0] = 50.0
+        second = load_layout(layout_file)
+        assert second == {'user': [0.0, 0.0], 'cores': 2}
+        assert second['user'] is not first['user']
+    finally:
+        os.remove(layout_file)
+
+def test_load_layout_changed():
+    '''
+    Test a modified layout file is parsed again
+    '''
+    fd, layout_file = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        f.write(json.dumps({'cores': 2}))
+    try:
+        assert load_layout(layout_file) == {'cores': 2}
+        with open(layout_file, 'w') as f:
+            f.write(json.dumps({'cores': 16}))
+        assert load_layout(layout_file) == {'cores': 16}
+    finally:
+        os.remove(layout_file)
+
+def test_load_layout_missing():
+    '''
+    Test a missing layout file is reported as before
+    '''
+    assert load_layout('/some/random/path.json') is False
+
+def test_lru_cache():
+    '''
+    Test the least recently used entries are dropped first
+    '''
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.info() == {'hits': 2, 'misses': 1, 'size': 2, 'maxsize': 2}
+
+def test_top_index():
+    '''
+    Test the ranked keys match a full sort through updates and removals
+    '''
+    index = TopIndex()
+    values = {}
+    rand = random.Random(42)
+    for step in range(2000):
+        key = rand.randint(0, 300)
+        if rand.random() < 0.3:
+            index.remove(key)
+            values.pop(key, None)
+        else:
+            values[key] = rand.randint(0, 50)
+            index.set(key, values[key])
+    expected = sorted(values, key=lambda key: (-values[key], key))
+    assert list(index.iter_keys()) == expected
+    assert index.top(10) == expected[:10]
+    assert len(index) == len(values)
+    assert len(index.heap) <= 2 * len(values) + 64
+    assert index.top(0) == []
+    assert TopIndex().top(5) == []
@@ -0,0 +1,80 @@
+from simulux.clock import Clock
+
+def test_events_order():
+    '''
+    Test the events run in time order, then in scheduling order
+    '''
+    clock = Clock()
+    ran = []
+    clock.schedule(5, ran.append, ('b',))
+    clock.schedule(1, ran.append, ('a',))
+    clock.schedule(5, ran.append, ('c',))
+    cancelled = clock.schedule(3, ran.append, ('x',))
+    cancelled.cancel()
+    clock.advance(4)
+    assert ran == ['a']
+    assert clock.now == 4
+    clock.advance(10)
+    assert ran == ['a', 'b', 'c']
+    assert clock.now == 14
+    assert clock.next_time() is None
+    assert clock.processed == 3
+
+def test_repeated_events():
+    '''
+    Test events repeated every interval until cancelled
+    '''
+    clock = Clock()
+    times = []
+    event = clock.schedule(1, lambda: times.append(clock.now), interval=2)
+    clock.advance(6)
+    assert times == [1, 3, 5]
+    event.cancel()
+    clock.advance(10)
+    assert times == [1, 3, 5]
+    assert clock.schedule(1, times.append, interval=0) is None
+
+def test_rates_lazy():
+    '''
+    Test the rates are only applied when synced, integer values keeping the
+    fractional part
+    '''
+    clock = Clock()
+    values = {'size': 0}
+    def apply(delta):
+        values['size'] += delta
+    clock.add_rate('web1', apply, 2.5)
+    clock.advance(3)
+    assert values['size'] == 0
+    clock.sync('web1')
+    assert values['size'] == 7
+    clock.advance(1)
+    clock.sync('web1')
+    assert values['size'] == 10
+
+def test_rates_until():
+    '''
+    Test the rates stop at their end time or when apply fails
+    '''
+    clock = Clock()
+    values = []
+    clock.add_rate('web1', values.append, 1.0, until=5, integer=False)
+    clock.add_rate('web2', lambda delta: False, 1.0)
+    clock.advance(10)
+    clock.sync_all()
+    assert values == [5.0]
+    assert clock.rates == {}
+
+def test_keyed_events_sync():
+    '''
+    Test the events of a key see the rates up to their time
+    '''
+    clock = Clock()
+    values = {'size': 0}
+    def apply(delta):
+        values['size'] += delta
+    seen = []
+    clock.add_rate('web1', apply, 10)
+    clock.schedule(2, lambda: seen.append(values['size']), key='web1')
+    clock.advance(5)
+    assert seen == [20]
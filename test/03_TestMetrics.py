@@ -0,0 +1,36 @@
+import math
+
+from simulux.metrics import RingBuffer, LoadAverage
+
+def test_ring_buffer():
+    '''
+    Test the ring buffer keeps the last values, oldest first
+    '''
+    ring = RingBuffer(size=4)
+    assert ring.last() is None
+    assert ring.window() == []
+    for value in range(3):
+        ring.append(value)
+    assert ring.window() == [0.0, 1.0, 2.0]
+    for value in range(3, 10):
+        ring.append(value)
+    assert len(ring) == 4
+    assert ring.last() == 9.0
+    assert ring.window() == [6.0, 7.0, 8.0, 9.0]
+    assert ring.window(2) == [8.0, 9.0]
+    assert ring.window(10) == [6.0, 7.0, 8.0, 9.0]
+    assert ring.window(0) == []
+
+def test_load_average():
+    '''
+    Test the load averages decay towards the running processes
+    '''
+    load = LoadAverage()
+    for step in range(12):
+        load.update(2, 5)
+    one, five, fifteen = load.get()
+    assert abs(one - 2 * (1 - math.exp(-1))) < 1e-9
+    assert one > five > fifteen > 0
+    for step in range(1000):
+        load.update(0, 5)
+    assert max(load.get()) < 0.01
@@ -244,4 +244,89 @@ def test_remove_mount():
         'group': 'root',
         'mode': 755
     }
-    assert jsonify(details) == jsonify(expected)
\ No newline at end of file
+    assert jsonify(details) == jsonify(expected)
+
+def test_childrens_index():
+    '''
+    Test the childrens index follows file addition and removal
+    '''
+    disks = Disks()
+    disks.add_file('/tmp/foo', filetype='folder')
+    disks.add_file('/tmp/foo/bar', size=10)
+    disks.add_file('/tmp/foo/baz', size=10)
+    childrens = disks.get_childrens_path('/tmp/foo')
+    childrens.sort()
+    assert childrens == ['/tmp/foo/bar', '/tmp/foo/baz']
+    assert '/tmp/foo' in disks.get_childrens_path('/tmp')
+    disks.remove_file('/tmp/foo/bar')
+    assert disks.get_childrens_path('/tmp/foo') == ['/tmp/foo/baz']
+    disks.remove_file('/tmp/foo', recursive=True)
+    assert disks.get_childrens_path('/tmp/foo') == []
+    assert '/tmp/foo' not in disks.get_childrens_path('/tmp')
+
+def test_remove_subtree():
+    '''
+    Test recursive removal of a deep tree releases the size once
+    '''
+    disks = Disks()
+    root_size = disks.get_details('/').get('size')
+    disks.add_file('/var/log/app', filetype='folder')
+    for day in range(3):
+        folder = '/var/log/app/%d' % (day,)
+        disks.add_file(folder, filetype='folder')
+        for idx in range(10):
+            disks.add_file('%s/%d.log' % (folder, idx), size=100)
+    assert disks.get_details('/').get('size') == root_size + 3000
+    assert len(disks.get_descendants_path('/var/log/app')) == 33
+    assert disks.remove_file('/var/log/app', recursive=True)
+    assert disks.get_details('/').get('size') == root_size
+    assert not disks.exists('/var/log/app/1/1.log')
+    assert disks.get_childrens_path('/var/log/app') == []
+
+def test_remove_subtree_with_mount():
+    '''
+    Test recursive removal is refused when a mount point is in the subtree
+    '''
+    disks = Disks({
+        'partitions': {
+            '/dev/sdb1': {'size': 1000, 'used': 10, 'mount': '/var/data'}
+        },
+        'files': {'/var/data': {}}
+    })
+    root_size = disks.get_details('/').get('size')
+    assert not disks.remove_file('/var', recursive=True)
+    assert disks.exists('/var/log')
+    assert disks.exists('/var/data')
+    assert disks.get_details('/').get('size') == root_size
+
+def test_batch_size_propagation():
+    '''
+    Test size changes made in a batch are propagated once the batch ends
+    '''
+    disks = Disks()
+    root_size = disks.get_details('/').get('size')
+    log_size = disks.get_details('/var/log').get('size')
+    with disks.batch():
+        disks.add_file('/var/log/app', filetype='folder')
+        for idx in range(10):
+            disks.add_file('/var/log/app/%d.log' % (idx,), size=100)
+        for idx in range(10):
+            disks.update_file('/var/log/app/%d.log' % (idx,), size=150)
+        # Nothing propagated yet
+        assert disks.files['/var/log'].get('size') == log_size
+        disks.remove_file('/var/log/app/0.log')
+    assert disks.get_details('/var/log/app').get('size') == 1350
+    assert disks.get_details('/var/log').get('size') == log_size + 1350
+    assert disks.get_details('/').get('size') == root_size + 1350
+
+def test_batch_flush_on_read():
+    '''
+    Test reading a size within a batch applies the pending changes
+    '''
+    disks = Disks()
+    root_size = disks.get_details('/').get('size')
+    with disks.batch():
+        disks.add_file('/tmp/foo', size=10)
+        assert disks.get_details('/').get('size') == root_size + 10
+        disks.add_file('/tmp/bar', size=10)
+    assert disks.get_details('/').get('size') == root_size + 20
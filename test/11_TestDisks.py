@@ -67,6 +67,32 @@ class DisksTest(unittest.TestCase):
         for i in range(0,len(test_paths_abs)):
             self.assertEqual(disks._make_absolute(test_paths_rel[i], test_work_dir_abs), correct_paths[i])
         
+
+    def test_shorten_path_cache(self):
+        disks = Disks()
+        info = disks.path_cache_info()
+        
+        #test 1: same result with and without the cache
+        self.assertEqual(disks.shorten_path('a/../b/./c', '/root'), '/root/b/c')
+        self.assertEqual(disks.shorten_path('a/../b/./c', '/root'), '/root/b/c')
+        self.assertEqual(disks.shorten_path('a/../b/./c', '/tmp'), '/tmp/b/c')
+        new_info = disks.path_cache_info()
+        self.assertEqual(new_info['hits'] - info['hits'], 1)
+        self.assertEqual(new_info['misses'] - info['misses'], 2)
+        
+        #test 2: the predicates normalize the path once
+        info = disks.path_cache_info()
+        self.assertTrue(disks.is_file('hosts', '/etc'))
+        self.assertTrue(disks.is_folder('../etc', '/etc'))
+        self.assertFalse(disks.exists('missing', '/etc'))
+        new_info = disks.path_cache_info()
+        self.assertEqual(new_info['misses'] - info['misses'], 3)
+        self.assertEqual(new_info['hits'] - info['hits'], 0)
+        
+        #test 3: errors are not cached
+        for i in range(2):
+            with self.assertRaises(SimuluxDiskException):
+                disks.shorten_path('a/b')
         
         
 if __name__ == '__main__':
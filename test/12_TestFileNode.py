@@ -0,0 +1,69 @@
+from simulux.files import FileNode
+
+from lib.utils import jsonify
+
+def test_from_dict():
+    '''
+    Test a node built from a layout entry behaves like the dict
+    '''
+    layout = {
+        'filetype': 'file',
+        'size': 11,
+        'owner': 'root',
+        'group': 'root',
+        'mode': 644,
+        'real_filename': 'hosts'
+    }
+    node = FileNode.from_dict(layout)
+    assert jsonify(node) == jsonify(layout)
+    assert node == layout
+    assert node.get('real_filename') == 'hosts'
+    assert node.get('mount') is None
+    assert 'mount' not in node
+    assert len(node) == 6
+
+def test_folder_content_skipped():
+    '''
+    Test the content of a folder is not kept in the node
+    '''
+    node = FileNode.from_dict({'filetype': 'folder', 'size': 1, 'content': {}})
+    assert node.copy() == {'filetype': 'folder', 'size': 1}
+
+def test_update():
+    '''
+    Test updating a node, including unknown keys
+    '''
+    node = FileNode(size=0, owner='root', group='root', filetype='file', mode=644)
+    node.update({'size': 10, 'owner': 'foo'})
+    node.update(group='bar', checksum='abc')
+    assert node.copy() == {
+        'filetype': 'file',
+        'size': 10,
+        'owner': 'foo',
+        'group': 'bar',
+        'mode': 644,
+        'checksum': 'abc'
+    }
+    del node['checksum']
+    assert 'checksum' not in node
+
+def test_interned_owner():
+    '''
+    Test the owner / group strings are shared across nodes
+    '''
+    first = FileNode(owner=''.join(['ro', 'ot']))
+    second = FileNode(owner=''.join(['r', 'oot']))
+    assert first['owner'] is second['owner']
+
+def test_mount():
+    '''
+    Test mount point nodes do not expose a filetype
+    '''
+    node = FileNode(mount=True, size=10, owner='root', group='root', mode=755)
+    assert node.copy() == {
+        'mount': True,
+        'size': 10,
+        'owner': 'root',
+        'group': 'root',
+        'mode': 755
+    }
@@ -0,0 +1,77 @@
+from simulux.disks import Disks
+
+STORAGES = ['flat', 'tree']
+
+def check_same_files(storage):
+    '''
+    Both backends load the default layout the same way
+    '''
+    flat = Disks(storage='flat')
+    disks = Disks(storage=storage)
+    assert len(disks.files) == len(flat.files)
+    assert sorted(disks.files.keys()) == sorted(flat.files.keys())
+    for path, details in flat.files.iteritems():
+        assert disks.files[path] == details
+        assert sorted(disks.get_childrens_path(path)) == \
+                sorted(flat.get_childrens_path(path))
+
+def check_move_folder(storage):
+    '''
+    Moving a folder moves its content and its size
+    '''
+    disks = Disks(storage=storage)
+    root_size = disks.get_details('/').get('size')
+    tmp_size = disks.get_details('/tmp').get('size')
+    home_size = disks.get_details('/home').get('size')
+    disks.add_file('/tmp/foo', filetype='folder')
+    disks.add_file('/tmp/foo/bar', filetype='folder')
+    disks.add_file('/tmp/foo/bar/baz', size=100)
+    assert disks.move_file('/tmp/foo', '/home/foo')
+    assert not disks.exists('/tmp/foo/bar/baz')
+    assert disks.is_file('/home/foo/bar/baz')
+    assert disks.get_childrens_path('/home/foo') == ['/home/foo/bar']
+    assert disks.get_details('/tmp').get('size') == tmp_size
+    assert disks.get_details('/home').get('size') == home_size + 100
+    assert disks.get_details('/').get('size') == root_size + 100
+
+def check_move_refused(storage):
+    '''
+    Moves of mount points, onto existing paths or into itself are refused
+    '''
+    disks = Disks(storage=storage)
+    assert not disks.move_file('/boot', '/tmp/boot')
+    assert not disks.move_file('/etc/hosts', '/etc/hostname')
+    assert not disks.move_file('/etc', '/etc/sub')
+    assert not disks.move_file('/etc/hosts', '/missing/hosts')
+    assert disks.is_file('/etc/hosts')
+
+def check_remove_tree(storage):
+    '''
+    Recursive removal drops the whole subtree from the storage
+    '''
+    disks = Disks(storage=storage)
+    count = len(disks.files)
+    disks.add_file('/tmp/foo', filetype='folder')
+    disks.add_file('/tmp/foo/bar', size=10)
+    assert len(disks.files) == count + 2
+    assert disks.remove_file('/tmp/foo', recursive=True)
+    assert len(disks.files) == count
+    assert disks.get_descendants_path('/tmp/foo') == []
+
+def check_missing_parent(storage):
+    '''
+    Files added below a missing folder are listed as any other
+    '''
+    disks = Disks(storage=storage)
+    assert disks.add_file('/tmp/missing/foo', size=10) != False
+    assert len(disks.files.keys()) == len(disks.files)
+    assert '/tmp/missing/foo' in disks.files.keys()
+    assert '/tmp/missing' not in disks.files
+
+def test_storages():
+    for storage in STORAGES:
+        yield check_same_files, storage
+        yield check_move_folder, storage
+        yield check_move_refused, storage
+        yield check_remove_tree, storage
+        yield check_missing_parent, storage
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+
+from simulux.constants import FILES_DEFAULT_PATH
+from simulux.disks import Disks
+from simulux.fixtures import CONTENT_CACHE, ContentCache
+
+LINES = [ 'line %d\n' % (idx,) for idx in range(100) ]
+# Only \n ends the lines, as with file.readlines
+CR_LINES = ['a\r\n', 'b\rc\n', 'd\x0be\x0cf\x1c\n', 'g\r']
+
+# Fixture files are looked up relatively to the current directory
+workdir = None
+cwd = None
+disks = None
+
+def setup():
+    global workdir, cwd, disks
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.makedirs(FILES_DEFAULT_PATH)
+    with open(os.path.join(FILES_DEFAULT_PATH, 'messages'), 'w') as f:
+        f.writelines(LINES)
+    with open(os.path.join(FILES_DEFAULT_PATH, 'empty'), 'w') as f:
+        pass
+    with open(os.path.join(FILES_DEFAULT_PATH, 'cr'), 'wb') as f:
+        f.writelines(CR_LINES)
+    disks = Disks()
+    disks.add_file('/var/log/messages', size=1000)
+    disks.files['/var/log/messages'].update({'real_filename': 'messages'})
+    disks.add_file('/var/log/empty')
+    disks.files['/var/log/empty'].update({'real_filename': 'empty'})
+    disks.add_file('/var/log/cr')
+    disks.files['/var/log/cr'].update({'real_filename': 'cr'})
+
+def teardown():
+    os.chdir(cwd)
+    shutil.rmtree(workdir)
+
+def test_get_file_content():
+    '''
+    Test the full content is returned as a list of lines
+    '''
+    assert disks.get_file_content('/var/log/messages') == LINES
+    assert disks.get_file_content('messages', '/var/log') == LINES
+    assert disks.get_file_content('/etc/hostname') is None
+
+def test_line_breaks():
+    '''
+    Test the lines only end on \\n, whatever other breaks they hold
+    '''
+    assert disks.get_file_content('/var/log/cr') == CR_LINES
+    assert list(disks.iter_file_lines('/var/log/cr')) == CR_LINES
+    assert disks.head_file('/var/log/cr', 2) == CR_LINES[:2]
+    assert disks.tail_file('/var/log/cr', 2) == CR_LINES[-2:]
+
+def test_iter_file_lines():
+    '''
+    Test the lines can be streamed
+    '''
+    assert list(disks.iter_file_lines('/var/log/messages')) == LINES
+    assert list(disks.iter_file_lines('/etc/hostname')) == []
+
+def test_head_file():
+    '''
+    Test the first lines of a file
+    '''
+    assert disks.head_file('/var/log/messages', 5) == LINES[:5]
+    assert disks.head_file('/var/log/messages', 500) == LINES
+    assert disks.head_file('/var/log/empty') == []
+
+def test_tail_file():
+    '''
+    Test the last lines of a file
+    '''
+    assert disks.tail_file('/var/log/messages') == LINES[-10:]
+    assert disks.tail_file('/var/log/messages', 1) == LINES[-1:]
+    assert disks.tail_file('/var/log/messages', 100) == LINES
+    assert disks.tail_file('/var/log/messages', 500) == LINES
+    assert disks.tail_file('/var/log/empty') == []
+
+def test_read_file_range():
+    '''
+    Test reading a byte range of a file
+    '''
+    content = ''.join(LINES)
+    assert disks.read_file_range('/var/log/messages') == content
+    assert disks.read_file_range('/var/log/messages', 7, 10) == content[7:17]
+    assert disks.read_file_range('/var/log/messages', len(content) - 3, 10) == content[-3:]
+    assert disks.read_file_range('/var/log/messages', len(content) + 3) == ''
+    assert disks.read_file_range('/var/log/empty') == ''
+
+def test_uncached_content():
+    '''
+    Test files too large for the content cache are read through mmap
+    '''
+    max_bytes = CONTENT_CACHE.max_bytes
+    CONTENT_CACHE.clear()
+    CONTENT_CACHE.max_bytes = 10
+    try:
+        content = ''.join(LINES)
+        assert disks.get_file_content('/var/log/messages') == LINES
+        assert disks.get_file_buffer('/var/log/messages') is None
+        assert disks.tail_file('/var/log/messages', 3) == LINES[-3:]
+        assert disks.head_file('/var/log/messages', 3) == LINES[:3]
+        assert disks.read_file_range('/var/log/messages', 7, 10) == content[7:17]
+        assert disks.read_file_range('/var/log/messages', len(content) + 3) == ''
+        assert CONTENT_CACHE.info()['files'] == 0
+    finally:
+        CONTENT_CACHE.max_bytes = max_bytes
+
+def test_shared_content():
+    '''
+    Test the content of a fixture is shared across Disks objects
+    '''
+    other = Disks()
+    other.add_file('/var/log/syslog')
+    other.files['/var/log/syslog'].update({'real_filename': 'messages'})
+    CONTENT_CACHE.clear()
+    disks.get_file_content('/var/log/messages')
+    info = CONTENT_CACHE.info()
+    view = other.get_file_buffer('/var/log/syslog')
+    assert view.tobytes() == ''.join(LINES)
+    assert CONTENT_CACHE.info()['hits'] == info['hits'] + 1
+    assert CONTENT_CACHE.info()['files'] == 1
+
+def test_content_cache_eviction():
+    '''
+    Test the content cache respects its budget and detects changed files
+    '''
+    cache = ContentCache(max_bytes=25)
+    for name in ['a', 'b', 'c']:
+        with open(name, 'w') as f:
+            f.write(name * 10)
+    assert cache.get('a') == 'a' * 10
+    assert cache.get('b') == 'b' * 10
+    assert cache.get('a') == 'a' * 10
+    # 'b' is the least recently used
+    assert cache.get('c') == 'c' * 10
+    assert cache.info()['files'] == 2
+    assert cache.info()['bytes'] == 20
+    assert cache.get_view('a', 2, 3).tobytes() == 'aaa'
+    assert cache.info()['misses'] == 3
+    with open('a', 'w') as f:
+        f.write('A' * 5)
+    assert cache.get('a') == 'A' * 5
+    assert cache.info()['bytes'] == 15
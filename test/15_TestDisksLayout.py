@@ -0,0 +1,91 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from StringIO import StringIO
+
+from simulux.disks import Disks, DEFAULT_LAYOUT
+from simulux.stream import iter_events, read_value
+
+def setup():
+    global tmpdir
+    tmpdir = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(tmpdir)
+
+def make_empty():
+    disks = Disks()
+    disks._init_storage()
+    return disks
+
+def test_iter_events():
+    '''
+    Test the events rebuild the document, whatever the chunk boundaries
+    '''
+    document = {'a': [1, -2.5, True, None, {'b': u'x{}\xe9'}],
+                'c': {'d': {}, 'e': {'f': 'g', 'h': []}},
+                'i': {'j': 'k]', 'l': 10 ** 10}}
+    content = json.dumps(document)
+    for chunk_size in [1, 3, 7, 100]:
+        events = iter_events(StringIO(content), chunk_size=chunk_size,
+                             lookahead=16)
+        event, value = next(events)
+        assert read_value(events, event, value) == document
+        assert list(events) == []
+    events = list(iter_events(StringIO(content)))
+    assert ('object', {'f': 'g', 'h': []}) in events
+    assert ('key', 'a') in events
+
+def test_iter_events_invalid():
+    '''
+    Test truncated documents are refused
+    '''
+    for content in ['{"a": [1, 2', '{"a": "b', '[1, 2}']:
+        try:
+            list(iter_events(StringIO(content)))
+        except ValueError:
+            continue
+        assert False, content
+
+def test_stream_layout():
+    '''
+    Test streaming a layout stores the same files as loading it
+    '''
+    loaded = make_empty()
+    loaded.add_layout(DEFAULT_LAYOUT)
+    streamed = make_empty()
+    reports = []
+    stats = streamed.stream_layout(DEFAULT_LAYOUT, progress=reports.append)
+    assert stats['entries'] == len(streamed.files) - len(streamed.mounts)
+    assert reports[-1] == stats
+    assert streamed.disks == loaded.disks
+    assert streamed.partitions == loaded.partitions
+    assert streamed.mounts == loaded.mounts
+    assert sorted(streamed.files.keys()) == sorted(loaded.files.keys())
+    for path, details in loaded.files.iteritems():
+        assert streamed.files[path] == details
+    assert make_empty().stream_layout(os.path.join(tmpdir, 'missing')) is None
+
+def test_stream_deep_layout():
+    '''
+    Test deep trees load without hitting the recursion limit
+    '''
+    depth = sys.getrecursionlimit() + 100
+    # Written by hand, json.dump would hit the recursion limit too
+    folder = '"d": {"filetype": "folder", "size": 1, "content": {'
+    file = '"f": {"filetype": "file", "size": 2, "owner": "www"}'
+    filename = os.path.join(tmpdir, 'deep.json')
+    with open(filename, 'w') as f:
+        f.write('{"partitions": {"/dev/sdb1": {"mount": "/data", "used": 42}}, ')
+        f.write('"files": {"/data": {')
+        f.write((file + ', ' + folder) * depth)
+        f.write('}}' * depth + '}}}')
+    disks = make_empty()
+    assert disks.stream_layout(filename)['entries'] == 2 * depth
+    assert disks.get_details('/data').get('size') == 42
+    path = '/data' + '/d' * depth
+    assert disks.is_folder(path)
+    assert disks.get_details(path[:-2] + '/f').get('owner') == 'www'
+    assert len(disks.files) == 2 * depth + 1
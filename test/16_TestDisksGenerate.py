@@ -0,0 +1,115 @@
+import datetime
+import random
+import sys
+from StringIO import StringIO
+
+import simulux.disks
+from simulux.disks import Disks
+from simulux.generator import iter_files, uniform, lognormal, choice
+
+def test_iter_files():
+    '''
+    Test the patterns, values and seeds of the generated files
+    '''
+    files = list(iter_files('/srv/{site}/{date}/{n}.log', 6, sizes=(10, 20),
+                            seed=1, values={'site': ['a', 'b']},
+                            start=datetime.date(2024, 2, 28), days=3))
+    assert [ path for path, size in files ] == [
+        '/srv/a/2024-02-28/0.log', '/srv/b/2024-02-28/1.log',
+        '/srv/a/2024-02-29/2.log', '/srv/b/2024-02-29/3.log',
+        '/srv/a/2024-03-01/4.log', '/srv/b/2024-03-01/5.log']
+    assert all(10 <= size <= 20 for path, size in files)
+    assert files == list(iter_files('/srv/{site}/{date}/{n}.log', 6,
+        sizes=(10, 20), seed=1, values={'site': ['a', 'b']},
+        start=datetime.date(2024, 2, 28), days=3))
+    files = list(iter_files('/tmp/{user}-{n:03d}', 2, sizes=5,
+                            values={'user': lambda n, rng: 'u%d' % (n * 2,)}))
+    assert files == [('/tmp/u0-000', 5), ('/tmp/u2-001', 5)]
+
+def test_distributions():
+    '''
+    Test the size distributions stay in their bounds
+    '''
+    rng = random.Random(0)
+    assert all(1 <= uniform(1, 3)(rng) <= 3 for idx in range(100))
+    sample = lognormal(4096, sigma=2.0, maximum=65536)
+    sizes = [ sample(rng) for idx in range(1000) ]
+    assert max(sizes) == 65536
+    assert 2048 < sorted(sizes)[500] < 8192
+    sample = choice([1, 10, 100], weights=[0, 1, 3])
+    sizes = [ sample(rng) for idx in range(1000) ]
+    assert 1 not in sizes
+    assert 600 < sizes.count(100) < 900
+    assert set(choice([1, 2])(rng) for idx in range(100)) == set([1, 2])
+
+def test_generate_files():
+    '''
+    Test generated files match files added one by one
+    '''
+    generated = Disks()
+    added = Disks()
+    batch = simulux.disks.GENERATE_BATCH
+    simulux.disks.GENERATE_BATCH = 7
+    try:
+        assert generated.generate_files('/var/log/app/{day}/{n}.log', 100,
+            sizes=lognormal(100), seed=3, values={'day': range(5)},
+            owner='www') == 100
+    finally:
+        simulux.disks.GENERATE_BATCH = batch
+    for idx in range(5):
+        added.add_file('/var/log/app/%d' % (idx,), filetype='folder',
+                       owner='www', group='root', mode=755)
+    added.add_file('/var/log/app', filetype='folder', owner='www', mode=755)
+    for path, size in iter_files('/var/log/app/{day}/{n}.log', 100,
+            sizes=lognormal(100), seed=3, values={'day': range(5)}):
+        added.add_file(path, size=size, owner='www', mode=644)
+    assert sorted(generated.files.keys()) == sorted(added.files.keys())
+    for path, details in added.files.iteritems():
+        assert generated.get_details(path) == details
+    assert sorted(generated.get_childrens_path('/var/log/app/3')) == \
+        sorted(added.get_childrens_path('/var/log/app/3'))
+
+def test_generate_files_errors():
+    '''
+    Test the invalid patterns and existing paths
+    '''
+    disks = Disks()
+    size = disks.get_details('/etc').get('size')
+    assert disks.generate_files('/etc/{n}/{missing}', 10) is None
+    assert disks.generate_files('etc/{n}', 10) is None
+    assert disks.generate_files('/etc/hosts/{n}', 10, sizes=1) == 0
+    assert disks.generate_files('/etc/{n}.conf', 0) == 0
+    assert disks.generate_files('/etc/{name}', 4, sizes=1,
+                                values={'name': ['hosts', 'a', 'a', 'b']}) == 2
+    assert disks.get_details('/etc').get('size') == size + 2
+    assert disks.get_details('/etc/hosts').get('size') == 11
+
+def test_generate_files_duplicates():
+    '''
+    Test the paths generated again after a batch is stored are skipped
+    '''
+    disks = Disks()
+    batch = simulux.disks.GENERATE_BATCH
+    simulux.disks.GENERATE_BATCH = 7
+    try:
+        assert disks.generate_files('/srv/new/{k}', 40, sizes=1,
+                                    values={'k': range(20)}) == 20
+        assert disks.generate_files('/etc/{k}', 40, sizes=1,
+                                    values={'k': range(20)}) == 20
+    finally:
+        simulux.disks.GENERATE_BATCH = batch
+    assert len(disks.get_childrens_path('/srv/new')) == 20
+    assert disks.get_details('/srv/new').get('size') == 20
+
+def test_generate_files_mkdir_error():
+    '''
+    Test a folder which can not be created is reported once
+    '''
+    disks = Disks()
+    stdout = sys.stdout
+    sys.stdout = output = StringIO()
+    try:
+        assert disks.generate_files('/etc/hosts/{n}', 10, sizes=1) == 0
+    finally:
+        sys.stdout = stdout
+    assert output.getvalue().count('mkdir: cannot create directory') == 1
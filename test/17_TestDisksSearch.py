@@ -0,0 +1,128 @@
+import fnmatch
+import re
+
+from simulux.disks import Disks
+from simulux.generator import uniform
+
+def get_disks():
+    disks = Disks()
+    disks.generate_files('/var/log/app/{day}/{n}.log', 200,
+                         sizes=uniform(0, 4096), seed=5,
+                         values={'day': range(4)}, owner='www')
+    disks.generate_files('/home/user/.cache/{n}.tmp', 20, sizes=100, seed=6)
+    disks.generate_files('/home/user/docs/{n}.conf', 10, sizes=10, seed=7)
+    return disks
+
+def brute_find(disks, path='/', test=None):
+    prefix = path.rstrip('/') + '/'
+    return sorted(key for key in disks.files.keys()
+                  if (key == path or key.startswith(prefix))
+                  and (test is None or test(key, disks.files.get(key))))
+
+def test_find_matches_scan():
+    '''
+    Test find returns the files a full scan of the disks returns
+    '''
+    disks = get_disks()
+    assert sorted(disks.find()) == brute_find(disks)
+    assert list(disks.find('/var/log/app/2', name='*.log')) == brute_find(
+        disks, '/var/log/app/2', lambda path, details: path.endswith('.log'))
+    assert sorted(disks.find('/', filetype='folder', owner='www')) == \
+        brute_find(disks, '/', lambda path, details:
+                   details.get('filetype') == 'folder'
+                   and details.get('owner') == 'www')
+    assert sorted(disks.find('/home', regex='.*/[0-9]\\.conf')) == [
+        '/home/user/docs/%d.conf' % (idx,) for idx in range(10)]
+    assert sorted(disks.find('/var', mode='0644', group='root')) == \
+        brute_find(disks, '/var', lambda path, details:
+                   str(details.get('mode')) == '644'
+                   and details.get('group') == 'root')
+
+def test_find_size_pruning():
+    '''
+    Test the size criteria skip the small folders without losing files
+    '''
+    disks = get_disks()
+    for size, test in [
+            ('+3k', lambda size: size > 3072),
+            ('-1k', lambda size: size < 1024),
+            (100, lambda size: size == 100),
+            ('+0', lambda size: size > 0)]:
+        assert sorted(disks.find(size=size)) == brute_find(
+            disks, '/', lambda path, details: test(details.get('size', 0))), \
+            size
+    # The folders holding a mount do not include its size
+    disks.generate_files('/boot/big/{n}', 3, sizes=1024 ** 3)
+    assert '/boot/big/0' in list(disks.find(size='+1023M', filetype='file'))
+
+def test_find_depth():
+    '''
+    Test mindepth and maxdepth
+    '''
+    disks = get_disks()
+    assert list(disks.find('/var/log', maxdepth=1)) == ['/var/log',
+                                                        '/var/log/app']
+    assert list(disks.find('/var/log/app', mindepth=1, maxdepth=1)) == [
+        '/var/log/app/%d' % (idx,) for idx in range(4)]
+    assert list(disks.find('/nothing')) == []
+
+def test_find_is_lazy():
+    '''
+    Test the first results come out before the walk ends
+    '''
+    disks = get_disks()
+    results = disks.find('/', name='*.log')
+    assert next(results) == '/var/log/app/0/0.log'
+    files = disks.files
+    disks.files = None
+    try:
+        assert next(results) == '/var/log/app/0/100.log'
+    finally:
+        disks.files = files
+
+def test_glob():
+    '''
+    Test glob patterns against a full scan of the disks
+    '''
+    disks = get_disks()
+    def brute_glob(pattern):
+        regex = re.compile(fnmatch.translate(pattern))
+        return sorted(key for key in disks.files.keys()
+                      if regex.match(key) and key.count('/') ==
+                      pattern.count('/'))
+    for pattern in ['/var/log/app/*/1?.log', '/var/log/*', '/*/user/docs/*',
+                    '/home/user/[d]*/[0-3].conf', '/etc/hosts']:
+        assert sorted(disks.glob(pattern)) == brute_glob(pattern), pattern
+    assert list(disks.glob('/var/log/app/0/1.log')) == []
+    assert list(disks.glob('/var/log/app/3/199.log', owner='www')) == [
+        '/var/log/app/3/199.log']
+    assert list(disks.glob('log/app/0/?.log', working_dir='/var')) == [
+        '/var/log/app/0/0.log', '/var/log/app/0/4.log', '/var/log/app/0/8.log']
+
+def test_glob_recursive():
+    '''
+    Test ** matches any number of folders and skips the hidden ones
+    '''
+    disks = get_disks()
+    assert sorted(disks.glob('/home/**/*.conf')) == [
+        '/home/user/docs/%d.conf' % (idx,) for idx in range(10)]
+    assert list(disks.glob('/home/**/*.tmp')) == []
+    assert len(list(disks.glob('/home/user/.cache/*.tmp'))) == 20
+    assert list(disks.glob('/home/user/*')) == ['/home/user/docs']
+    assert sorted(disks.glob('/**/[0-9].log', size='+2k')) == \
+        brute_find(disks, '/', lambda path, details:
+                   re.match('.*/[0-9]\\.log$', path) is not None
+                   and details['size'] > 2048)
+    results = list(disks.glob('/var/**/**/0.log'))
+    assert sorted(results) == sorted(set(results))
+    assert len(results) == 1
+
+def test_invalid_criteria():
+    '''
+    Test invalid criteria are reported without results
+    '''
+    disks = get_disks()
+    assert list(disks.find(size='+1X')) == []
+    assert list(disks.find(mode='rwx')) == []
+    assert list(disks.find(regex='(')) == []
+    assert list(disks.glob('/var/*', size='big')) == []
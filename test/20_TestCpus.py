@@ -128,3 +128,41 @@ def test_get_cpu_avg():
     avg_cpu = cpus.get('iowait', avg=True)
     expected = 32.5
     assert avg_cpu == expected
+
+def test_update_many():
+    '''
+    Test we can apply many updates at once
+    '''
+    cpus = CPUS()
+    success = cpus.update_many([
+        ('user', 10), ('user', [1, 2]), ('system', 5), ('iowait', [2.5, 0])
+    ])
+    assert success == True
+    dump = cpus.dump()
+    expected = {
+        "user": [11.0, 12.0],
+        "nice": [0.0, 0.0],
+        "system": [5.0, 5.0],
+        "iowait": [2.5, 0.0],
+        "irq": [0.0, 0.0],
+        "soft": [0.0, 0.0],
+        "steal": [0.0, 0.0],
+        "guest": [0.0, 0.0],
+        "idle": [81.5, 83.0]
+    }
+    assert jsonify(dump) == jsonify(expected)
+    # Nothing applied on invalid deltas
+    assert cpus.update_many([('user', 1), ('foo', 1)]) == False
+    assert cpus.update_many({'user': [1, 2, 3]}) == False
+    assert jsonify(cpus.dump()) == jsonify(expected)
+
+def test_conf_not_changed():
+    '''
+    Test the updates do not change the conf the CPUS was built from
+    '''
+    conf = {'cores': 2, 'cpus': {'user': [1.0, 1.0], 'idle': [99.0, 99.0]}}
+    cpus = CPUS(conf)
+    assert cpus.update_many([('user', 2), ('system', [1, 1])]) == True
+    assert cpus.set('user', 5) == True
+    assert conf['cpus'] == {'user': [1.0, 1.0], 'idle': [99.0, 99.0]}
+    assert CPUS(conf).get('user') == [1.0, 1.0]
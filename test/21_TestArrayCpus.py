@@ -0,0 +1,79 @@
+import random
+from nose.plugins.skip import SkipTest
+
+from simulux.cpus import CPUS, ArrayCPUS, numpy
+from lib.utils import jsonify
+
+if numpy is None:
+    raise SkipTest('numpy is not installed')
+
+def test_dump():
+    '''
+    Test the array backed CPUs dump lists as the default CPUs
+    '''
+    cpus = ArrayCPUS()
+    assert jsonify(cpus.dump()) == jsonify(CPUS().dump())
+    assert type(cpus.get('idle')) is list
+    assert cpus.get('idle', avg=True) == 100.0
+
+def test_same_as_lists():
+    '''
+    Test the array backed CPUs match the list backed CPUs
+    '''
+    conf = {'cores': 4, 'cpus': {'idle': [100.0] * 4, 'user': [0.0] * 4,
+            'nice': [0.0] * 4, 'system': [0.0] * 4, 'iowait': [0.0] * 4,
+            'irq': [0.0] * 4, 'soft': [0.0] * 4, 'steal': [0.0] * 4,
+            'guest': [0.0] * 4}}
+    lists = CPUS(conf)
+    arrays = ArrayCPUS(conf)
+    rand = random.Random(42)
+    for step in range(200):
+        cpu_type = rand.choice(['user', 'system', 'iowait', 'steal', 'idle'])
+        if cpu_type == 'idle':
+            value = [ rand.uniform(50, 100) for core in range(4) ]
+            assert lists.set(cpu_type, value) == arrays.set(cpu_type, value)
+        elif rand.random() < 0.5:
+            value = rand.uniform(-1, 1)
+            assert lists.update(cpu_type, value) == arrays.update(cpu_type, value)
+        else:
+            value = [ rand.uniform(0, 5) for core in range(4) ]
+            assert lists.set(cpu_type, value) == arrays.set(cpu_type, value)
+    for cpu_type, values in lists.dump().iteritems():
+        for expected, value in zip(values, arrays.get(cpu_type)):
+            assert abs(expected - value) < 1e-6
+        assert abs(lists.get(cpu_type, avg=True) - arrays.get(cpu_type, avg=True)) < 1e-6
+
+def test_invalid_values():
+    '''
+    Test invalid values are refused
+    '''
+    cpus = ArrayCPUS()
+    assert cpus.set('foo', 10) == False
+    assert cpus.set('user', [1.0]) == False
+    assert cpus.set('user', 'abc') == False
+    assert cpus.update('user', ['a', 'b']) == False
+    assert jsonify(cpus.dump()) == jsonify(CPUS().dump())
+
+def test_clone():
+    '''
+    Test a cloned array CPUs does not share its values
+    '''
+    cpus = ArrayCPUS()
+    clone = cpus.clone()
+    clone.update('user', 10)
+    assert cpus.get('user') == [0.0, 0.0]
+    assert clone.get('user') == [10.0, 10.0]
+    assert clone.get('idle') == [90.0, 90.0]
+
+def test_update_many():
+    '''
+    Test the array backed bulk update matches the list backed one
+    '''
+    deltas = [('user', 10), ('user', [1, 2]), ('system', 5), ('iowait', [2.5, 0])]
+    cpus = ArrayCPUS()
+    assert cpus.update_many(deltas) == True
+    expected = CPUS()
+    expected.update_many(deltas)
+    assert jsonify(cpus.dump()) == jsonify(expected.dump())
+    assert cpus.update_many([('user', 1), ('foo', 1)]) == False
+    assert jsonify(cpus.dump()) == jsonify(expected.dump())
@@ -94,4 +94,136 @@ def test_killall_process():
     }
     assert len(processes.processes) == 1
     assert jsonify(expected_cpus) == jsonify(cpus.dump())
-    assert jsonify(expected_memory) == jsonify(memory.dump())
\ No newline at end of file
+    assert jsonify(expected_memory) == jsonify(memory.dump())
+
+def test_add_processes():
+    '''
+    Ensure processes added in bulk allocate their resources
+    '''
+    cpus = CPUS()
+    memory = Memory()
+    processes = Processes(cpus=cpus, memory=memory, disks=disks)
+    processes.add_processes([
+        {'name': 'apache', 'pid': pid, 'ppid': 1, 'state': 'S', 'uid': 'www',
+         'gid': 'www', 'memory': {'rss': 1024, 'virt': 2048},
+         'cpus': {'user': 1.0, 'system': [0.5, 1.5]}}
+        for pid in range(100, 110)
+    ])
+    assert len(processes.processes) == 13
+    assert cpus.get('user') == [13.0, 13.0]
+    assert cpus.get('system') == [8.0, 18.0]
+    assert cpus.get('idle') == [76.0, 66.0]
+    assert memory.dump()['used'] == 13312
+    processes.killall_process('apache')
+    assert len(processes.processes) == 3
+    assert jsonify(cpus.dump()) == jsonify({
+        'steal': [0.0, 0.0],
+        'idle': [91.0, 91.0],
+        'user': [3.0, 3.0],
+        'irq': [0.0, 0.0],
+        'iowait': [3.0, 3.0],
+        'soft': [0.0, 0.0],
+        'system': [3.0, 3.0],
+        'guest': [0.0, 0.0],
+        'nice': [0.0, 0.0]
+    })
+    assert memory.dump()['used'] == 3072
+
+def test_find_pids():
+    '''
+    Ensure processes can be looked up by name / uid / state / ppid
+    '''
+    processes = Processes(cpus=CPUS(), memory=Memory(), disks=disks)
+    processes.add_processes([
+        {'name': 'apache', 'pid': pid, 'ppid': 100, 'state': 'S', 'uid': 'www',
+         'gid': 'www', 'memory': {'rss': 1024}, 'cpus': {'user': 1.0}}
+        for pid in range(100, 110)
+    ])
+    assert sorted(processes.find_pids(name='apache')) == range(100, 110)
+    assert sorted(processes.find_pids(uid='root')) == [1, 2, 3]
+    assert sorted(processes.get_childrens_pids(100)) == range(100, 110)
+    assert processes.find_pids(name='apache', state='Z') == []
+    assert processes.set_state(105, 'Z')
+    assert processes.find_pids(state='Z') == [105]
+    assert processes.find_pids(name='apache', state='Z') == [105]
+    assert 105 not in processes.find_pids(name='apache', state='S')
+    processes.kill_process(105)
+    assert processes.find_pids(state='Z') == []
+    processes.killall_process('apache')
+    assert processes.find_pids(uid='www') == []
+    assert processes.find_pids(foo='bar') == []
+    assert sorted(processes.find_pids()) == [1, 2, 3]
+
+def test_kill_with_references():
+    '''
+    Ensure resources are released on kill even if the process is referenced
+    '''
+    cpus = CPUS()
+    memory = Memory()
+    processes = Processes(cpus=cpus, memory=memory, disks=disks)
+    kept = [ processes.processes[pid] for pid in [1, 2, 3] ]
+    assert processes.kill_process(1)
+    assert memory.dump()['used'] == 2048
+    assert cpus.get('idle') == [94.0, 94.0]
+    assert processes.kill_process(1) == False
+    assert memory.dump()['used'] == 2048
+    assert len(kept) == 3
+
+def test_kill_many():
+    '''
+    Ensure many processes can be killed at once
+    '''
+    cpus = CPUS()
+    memory = Memory()
+    processes = Processes(cpus=cpus, memory=memory, disks=disks)
+    processes.add_processes([
+        {'name': 'apache', 'pid': pid, 'ppid': 1, 'state': 'S', 'uid': 'www',
+         'gid': 'www', 'memory': {'rss': 1024}, 'cpus': {'user': 1.0}}
+        for pid in range(100, 110)
+    ])
+    assert processes.kill_many(range(100, 105))
+    assert len(processes.processes) == 8
+    assert memory.dump()['used'] == 8192
+    assert cpus.get('user') == [8.0, 8.0]
+    # Missing pids are reported, the other ones killed
+    assert processes.kill_many([105, 200]) == False
+    assert len(processes.processes) == 7
+    assert memory.dump()['used'] == 7168
+
+def test_replace_process():
+    '''
+    Ensure a process added with an existing pid replaces it
+    '''
+    memory = Memory()
+    processes = Processes(cpus=CPUS(), memory=memory, disks=disks)
+    processes.add_processes([{'name': 'init', 'pid': 1, 'ppid': 0,
+                              'state': 'S', 'uid': 'root', 'gid': 'root',
+                              'memory': {'rss': 4096}}])
+    assert len(processes.processes) == 3
+    assert memory.dump()['used'] == 6144
+
+def test_top_pids():
+    '''
+    Ensure the processes can be ranked on rss / cpu as they change
+    '''
+    processes = Processes(cpus=CPUS(), memory=Memory(), disks=disks)
+    # The default processes use 1.0 of user / system / iowait each
+    assert processes.get_top_pids(5, 'cpu') == [1, 2, 3]
+    processes.kill_many([2, 3])
+    processes.add_processes([
+        {'name': 'apache', 'pid': pid, 'ppid': 1, 'state': 'S', 'uid': 'www',
+         'gid': 'www', 'memory': {'rss': pid * 10},
+         'cpus': {'user': (200 - pid) / 100.0, 'idle': 50.0}}
+        for pid in range(100, 200)
+    ])
+    assert processes.get_top_pids(3, 'rss') == [199, 198, 197]
+    assert processes.get_top_pids(3, 'cpu') == [1, 100, 101]
+    processes.kill_many([1, 100, 199])
+    assert processes.get_top_pids(3, 'rss') == [198, 197, 196]
+    assert processes.get_top_pids(2, 'cpu') == [101, 102]
+    processes.set_state(101, 'Z')
+    assert processes.get_top_pids(1, 'cpu') == [101]
+    ranked = list(processes.iter_sorted_pids('rss'))
+    assert len(ranked) == len(processes.processes)
+    assert ranked[-2:] == [102, 101]
+    assert processes.get_top_pids(1, 'foo') == []
@@ -0,0 +1,98 @@
+from nose.plugins.skip import SkipTest
+
+from simulux.cpus import CPUS
+from simulux.memory import Memory
+from simulux.disks import Disks
+from simulux.processes import Processes, ArrayProcesses, numpy
+
+from lib.utils import jsonify
+
+if numpy is None:
+    raise SkipTest('numpy is not installed')
+
+disks = Disks()
+
+def make_processes(cls):
+    return cls(cpus=CPUS(), memory=Memory(), disks=disks)
+
+def make_config(pid, name='apache', uid='www', rss=1024, user=0.5):
+    return {'name': name, 'pid': pid, 'ppid': 1, 'state': 'S', 'threads': 1,
+            'uid': uid, 'gid': uid, 'memory': {'rss': rss, 'virt': 2 * rss},
+            'cpus': {'user': user, 'system': 0.25}}
+
+def test_same_as_processes():
+    '''
+    Test the array backed processes account resources as Processes
+    '''
+    configs = [ make_config(pid, rss=pid, user=pid / 100.0)
+                for pid in range(100, 150) ]
+    plain = make_processes(Processes)
+    arrays = make_processes(ArrayProcesses)
+    for processes in [plain, arrays]:
+        processes.add_processes(configs)
+        processes.kill_many(range(100, 120))
+        # A pid given twice is only killed (and released) once
+        assert processes.kill_many([120, 121, 120]) == False
+        processes.set_state(130, 'Z')
+    assert jsonify(plain.cpus.dump()) == jsonify(arrays.cpus.dump())
+    assert plain.memory.dump() == arrays.memory.dump()
+    assert sorted(plain.processes.keys()) == sorted(arrays.processes.keys())
+    assert arrays.find_pids(state='Z') == [130]
+    assert arrays.processes[130].config == dict(make_config(130, rss=130,
+                                                user=1.3), state='Z')
+
+def test_default_layout():
+    '''
+    Test the default layout (per core cpu values) is rebuilt as configured
+    '''
+    plain = make_processes(Processes)
+    arrays = make_processes(ArrayProcesses)
+    assert jsonify(plain.cpus.dump()) == jsonify(arrays.cpus.dump())
+    for pid, process in plain.processes.iteritems():
+        assert arrays.processes[pid].config == process.config
+    arrays.kill_many(arrays.processes.keys())
+    assert jsonify(arrays.cpus.dump()) == jsonify(CPUS().dump())
+    assert arrays.memory.dump() == Memory().dump()
+
+def test_aggregates():
+    '''
+    Test the vectorized aggregates
+    '''
+    processes = make_processes(ArrayProcesses)
+    processes.kill_many(processes.processes.keys())
+    processes.add_processes([ make_config(pid, uid=['www', 'db'][pid % 2],
+                                          rss=pid, user=(pid % 7) / 10.0)
+                              for pid in range(1, 101) ])
+    assert processes.get_total('rss') == sum(range(1, 101))
+    assert processes.get_top_pids(3, 'rss') == [100, 99, 98]
+    top = processes.get_top_pids(5, 'user')
+    assert [ pid % 7 for pid in top ] == [6] * 5
+    assert processes.get_top_pids(1, 'cpu')[0] % 7 == 6
+    sums = processes.get_sums('uid', 'rss')
+    assert sums == {'www': sum(range(2, 101, 2)), 'db': sum(range(1, 101, 2))}
+
+def test_rows_reused():
+    '''
+    Test the rows of the killed processes are reused
+    '''
+    processes = make_processes(ArrayProcesses)
+    processes.add_processes([ make_config(pid) for pid in range(100, 110) ])
+    size = processes.table.size
+    processes.kill_many(range(100, 105))
+    processes.add_processes([ make_config(pid) for pid in range(200, 205) ])
+    assert processes.table.size == size
+    assert len(processes.processes) == 13
+    assert not processes.kill_process(100)
+
+def test_clone():
+    '''
+    Test the cloned processes do not change the original table
+    '''
+    cpus, memory = CPUS(), Memory()
+    processes = ArrayProcesses(cpus=cpus, memory=memory, disks=disks)
+    clone = processes.clone(cpus=cpus.clone(), memory=memory.clone(), disks=disks)
+    clone.kill_process(1)
+    clone.set_state(2, 'Z')
+    assert 1 in processes.processes
+    assert processes.processes[2].config['state'] != 'Z'
+    assert memory.dump() != clone.memory.dump()
@@ -0,0 +1,139 @@
+from simulux.environment import Environment
+
+from lib.utils import jsonify
+
+SERVER = {'memory': {'total': 4194304}}
+
+def test_add_server():
+    '''
+    Test servers get their own resources
+    '''
+    env = Environment({'web1': SERVER, 'web2': SERVER})
+    assert sorted(env.servers.keys()) == ['web1', 'web2']
+    assert env.servers['web1']['disks'] is not env.servers['web2']['disks']
+    assert len(env.servers['web1']['processes'].processes) == 3
+
+def test_clone_server():
+    '''
+    Test cloned servers start from the template state
+    '''
+    env = Environment(
+        servers={'web1': {'template': 'web'}, 'web2': {'template': 'web'}},
+        templates={'web': SERVER}
+    )
+    template = env.templates['web']
+    for name in ['web1', 'web2']:
+        server = env.servers[name]
+        assert jsonify(server['cpus'].dump()) == jsonify(template['cpus'].dump())
+        assert jsonify(server['memory'].dump()) == jsonify(template['memory'].dump())
+        assert len(server['processes'].processes) == 3
+        assert len(server['disks'].files) == len(template['disks'].files)
+        assert jsonify(server['disks'].get_details('/etc')) == \
+                jsonify(template['disks'].get_details('/etc'))
+
+def test_clone_server_copy_on_write():
+    '''
+    Test changes on a cloned server do not leak to the template or siblings
+    '''
+    env = Environment(templates={'web': SERVER})
+    web1 = env.clone_server('web1', 'web')
+    web2 = env.clone_server('web2', 'web')
+    template = env.templates['web']
+    root_size = template['disks'].get_details('/').get('size')
+    etc_size = template['disks'].get_details('/etc').get('size')
+
+    web1['disks'].add_file('/etc/new_file', size=1000)
+    web1['disks'].update_file('/etc/hosts', size=100, owner='foo')
+    web1['disks'].remove_file('/var', recursive=True)
+    assert web1['disks'].get_details('/etc').get('size') == etc_size + 1000 + 89
+    assert web1['disks'].get_details('/etc/hosts').get('owner') == 'foo'
+    assert not web1['disks'].exists('/var/log')
+    for disks in [template['disks'], web2['disks']]:
+        assert not disks.exists('/etc/new_file')
+        assert disks.exists('/var/log')
+        assert disks.get_details('/etc/hosts').get('owner') == 'root'
+        assert disks.get_details('/etc').get('size') == etc_size
+        assert disks.get_details('/').get('size') == root_size
+
+    web1['processes'].kill_process(1)
+    assert len(web1['processes'].processes) == 2
+    assert len(web2['processes'].processes) == 3
+    assert web1['cpus'].get('idle') == [94.0, 94.0]
+    assert web2['cpus'].get('idle') == [91.0, 91.0]
+    assert template['cpus'].get('idle') == [91.0, 91.0]
+    assert web2['memory'].dump() == template['memory'].dump()
+
+def test_clone_server_move():
+    '''
+    Test moved files of a cloned server do not leak to the template
+    '''
+    env = Environment(templates={'web': SERVER})
+    web1 = env.clone_server('web1', 'web')
+    template = env.templates['web']
+    hosts_size = template['disks'].get_details('/etc/hosts').get('size')
+
+    assert web1['disks'].move_file('/etc/hosts', '/etc/hosts2')
+    assert web1['disks'].move_file('/var/log', '/var/log2')
+    web1['disks'].update_file('/etc/hosts2', size=99999, owner='foo')
+    web1['disks'].update_file('/var/log2', owner='foo')
+    # Refused updates do not copy the shared entries
+    assert web1['disks'].update_file('/etc/passwd', foo=1) == False
+    assert '/etc/passwd' not in web1['disks'].files.local
+    web2 = env.clone_server('web2', 'web')
+    for disks in [template['disks'], web2['disks']]:
+        assert disks.get_details('/etc/hosts').get('size') == hosts_size
+        assert disks.get_details('/etc/hosts').get('owner') == 'root'
+        assert disks.get_details('/var/log').get('owner') == 'root'
+        assert not disks.exists('/etc/hosts2')
+
+def test_time_scenario():
+    '''
+    Test rates and events change the servers over the simulated time
+    '''
+    env = Environment({'web1': SERVER, 'web2': SERVER})
+    disks = env.servers['web1']['disks']
+    size = disks.get_details('/etc/hosts')['size']
+    root = disks.get_details('/')['size']
+    env.grow_file('web1', '/etc/hosts', 5 * 1024 * 1024)
+    env.leak_memory('web1', 1, 1024)
+    env.ramp_cpu('web1', 'user', 0.5, until=10)
+    killed = []
+    env.schedule('web1', 30, lambda server, pid: killed.append(
+        server['processes'].kill_process(pid)), (2,))
+    env.advance(60)
+    server = env.get_server('web1')
+    assert killed == [True]
+    assert disks.get_details('/etc/hosts')['size'] == size + 60 * 5 * 1024 * 1024
+    assert disks.get_details('/')['size'] == root + 60 * 5 * 1024 * 1024
+    assert server['processes'].processes[1].config['memory']['rss'] == 1024 + 60 * 1024
+    assert server['memory'].dump()['used'] == 1024 + 1024 + 60 * 1024
+    # pid 2 used 1.0 of user
+    assert server['cpus'].get('user') == [2.0 + 5.0, 2.0 + 5.0]
+    # Servers without rates are left alone
+    assert env.get_server('web2')['memory'].dump()['used'] == 3072
+    assert env.get_server('web3') is None
+
+def test_metrics():
+    '''
+    Test the servers metrics are sampled over the simulated time
+    '''
+    env = Environment({'web1': SERVER})
+    env.enable_metrics(interval=5, size=10)
+    server = env.servers['web1']
+    metrics = server['metrics']
+    env.grow_file('web1', '/etc/hosts', 1000)
+    env.leak_memory('web1', 1, 100)
+    server['processes'].set_state(1, 'R')
+    server['processes'].set_state(2, 'D')
+    env.advance(60)
+    assert len(metrics.times) == 10
+    assert metrics.get_window('processes.total', 2) == [(55.0, 3.0), (60.0, 3.0)]
+    assert metrics.get_last('processes.R') == 1
+    assert metrics.get_last('memory.used') == 3072 + 6000
+    window = metrics.get_window('partition./', 3)
+    assert [ value for time, value in window ] == \
+            [ window[0][1] + 5000 * idx for idx in range(3) ]
+    one, five, fifteen = metrics.get_loadavg()
+    assert 2 > one > five > fifteen > 0
+    assert metrics.get_last('load.1') == one
+    assert metrics.get_window('foo') == []
@@ -0,0 +1,82 @@
+from simulux.environment import Environment
+from simulux.exceptions import SimuluxShardException
+from simulux.sharded import ShardedEnvironment, disk_used, memory_used, \
+        process_count
+
+SERVER = {'memory': {'total': 4194304}}
+SERVERS = dict(('web%d' % (idx,), SERVER) for idx in range(5))
+
+def test_map_reduce():
+    '''
+    Test the cluster wide queries match a single process Environment
+    '''
+    env = Environment(SERVERS)
+    with ShardedEnvironment(SERVERS, workers=2) as sharded:
+        expected = sum(disk_used(name, server) for name, server in
+                       env.servers.iteritems())
+        assert sharded.map_reduce(disk_used) == expected
+        assert sharded.map_reduce(process_count) == 15
+        assert sharded.map_reduce(process_count, reducer=max) == 3
+        assert sharded.map_reduce(memory_used, reducer=None) == \
+                dict((name, 3072) for name in SERVERS)
+
+def test_execute():
+    '''
+    Test the batched commands run on the right servers, in order
+    '''
+    with ShardedEnvironment(SERVERS, workers=2) as sharded:
+        results = sharded.execute([
+            ('web0', 'processes', 'kill_process', (1,)),
+            ('web3', 'processes', 'kill_many', ([1, 2],)),
+            ('web9', 'processes', 'kill_process', (1,)),
+            ('web0', 'processes', 'kill_process', (1,)),
+            ('web1', None, 'grow_file', ('/etc/hosts', 100)),
+        ])
+        assert results == [True, True, None, False, True]
+        assert sharded.map_reduce(process_count, reducer=None) == \
+                {'web0': 2, 'web1': 3, 'web2': 3, 'web3': 1, 'web4': 3}
+        used = sharded.map_reduce(disk_used, reducer=None)
+        sharded.advance(10)
+        assert sharded.get_time() == 10
+        assert sharded.call('web1', 'disks', 'get_details', '/etc/hosts')['size'] == 1011
+        assert sharded.map_reduce(disk_used, reducer=None)['web1'] == used['web1'] + 1000
+        assert sharded.call('web0', 'processes', 'foo') is None
+        assert sharded.add_server('web5', {'template': 'web'}) == False
+        assert sharded.add_server('web5', SERVER)
+        assert sharded.map_reduce(process_count) == 15
+
+def test_execute_errors():
+    '''
+    Test a failed command only loses its own result
+    '''
+    with ShardedEnvironment(SERVERS, workers=2) as sharded:
+        results = sharded.execute([
+            ('web0', 'processes', 'kill_process', (1,)),
+            ('web0', 'processes', 'foo', ()),
+            ('web0', 'processes', 'kill_process', (2,)),
+        ])
+        assert results == [True, None, True]
+        assert sharded.map_reduce(process_count, reducer=None)['web0'] == 1
+
+def test_servers_not_created():
+    '''
+    Test the servers a worker could not create are left out
+    '''
+    servers = {'a': {'template': 'missing'}, 'b': SERVER, 'c': SERVER}
+    with ShardedEnvironment(servers, workers=1) as sharded:
+        assert sorted(sharded.shards) == ['b', 'c']
+        sharded.call('c', 'processes', 'kill_process', 1)
+        assert sharded.map_reduce(process_count, reducer=None) == \
+                {'b': 3, 'c': 2}
+        assert sharded.call('a', 'processes', 'kill_process', 1) is None
+
+def test_worker_start_failure():
+    '''
+    Test a worker failing to set up its servers is reported
+    '''
+    try:
+        ShardedEnvironment({'a': {'memory': 'bad'}, 'b': SERVER}, workers=2)
+    except SimuluxShardException as e:
+        assert 'Worker 0 failed to start' in str(e)
+    else:
+        assert False
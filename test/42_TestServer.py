@@ -0,0 +1,117 @@
+import os
+import socket
+import tempfile
+import threading
+
+from simulux.environment import Environment
+from simulux.server import SimuluxServer, Session, Client, MAX_PENDING_OUTPUT
+
+SERVER = {'memory': {'total': 4194304}}
+
+def start_server(**kwargs):
+    env = Environment({'web1': SERVER, 'web2': SERVER})
+    server = SimuluxServer(env, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+    return server, thread
+
+def stop_server(server, thread):
+    server.running = False
+    thread.join()
+    server.close()
+
+def test_sessions():
+    '''
+    Test each session has its own server and working directory
+    '''
+    server, thread = start_server()
+    try:
+        first = Client(server.address)
+        second = Client(server.address)
+        assert first.call('servers') == ['web1', 'web2']
+        assert first.call('cd', 'etc') == '/etc'
+        assert first.call('pwd') == '/etc'
+        assert second.call('pwd') == '/'
+        assert 'hosts' in first.call('ls')
+        assert first.call('stat', 'hosts')['filetype'] == 'file'
+        assert first.call('cd', '..') == '/'
+        assert first.call('use', 'web2') == 'web2'
+        assert first.call('kill', 1)
+        assert len(first.call('ps')) == 2
+        assert len(second.call('ps')) == 3
+        assert [ config['pid'] for config in second.call('top', 1, 'rss') ] == [1]
+        assert second.call('free')['used'] == 3072
+        reply = first.request('cd', 'missing')
+        assert not reply['ok'] and 'No such file' in reply['error']
+        assert not first.request('foo')['ok']
+        reply = first.request('top', 1, 'foo')
+        assert not reply['ok'] and 'invalid sort key' in reply['error']
+        # Unexpected failures only fail the request
+        reply = first.request('ls', 5)
+        assert not reply['ok'] and 'AttributeError' in reply['error']
+        stats = first.call('stats')
+        assert stats['requests'] == 13 and stats['errors'] == 4
+        assert stats['p99'] >= stats['p50'] >= 0
+        # Plain text lines are accepted too
+        second.socket.sendall('cd /etc\n')
+        assert second.reader.readline().startswith('{')
+        assert second.call('pwd') == '/etc'
+        first.close()
+        second.close()
+    finally:
+        stop_server(server, thread)
+
+def test_binary_content():
+    '''
+    Test content which is not UTF-8 is refused without ending the session
+    '''
+    server, thread = start_server()
+    fd, path = tempfile.mkstemp()
+    try:
+        os.write(fd, 'ELF\xff\xfe\x00\x80\n')
+        os.close(fd)
+        disks = server.environment.servers['web1']['disks']
+        disks.add_file('/bin/app', size=8)
+        disks.files['/bin/app'].update({'real_filename': path})
+        client = Client(server.address)
+        reply = client.request('cat', '/bin/app')
+        assert not reply['ok'] and 'not UTF-8' in reply['error']
+        assert reply['id'] == 1
+        assert client.call('pwd') == '/'
+        assert client.call('stats')['errors'] == 1
+        client.close()
+    finally:
+        os.unlink(path)
+        stop_server(server, thread)
+
+def test_max_sessions():
+    '''
+    Test the sessions above the limit are refused
+    '''
+    server, thread = start_server(max_sessions=1)
+    try:
+        first = Client(server.address)
+        assert first.call('pwd') == '/'
+        second = Client(server.address)
+        assert second.request('pwd')['ok'] == False
+        assert server.refused == 1
+        first.close()
+        second.close()
+    finally:
+        stop_server(server, thread)
+
+def test_backpressure():
+    '''
+    Test a session is not read while its replies are pending
+    '''
+    server = SimuluxServer(Environment({'web1': SERVER}))
+    left, right = socket.socketpair()
+    try:
+        session = Session(server, left)
+        assert session.readable()
+        session.producer_fifo.append('x' * (MAX_PENDING_OUTPUT + 1))
+        assert not session.readable()
+    finally:
+        right.close()
+        server.close()
@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+
+from simulux.environment import Environment
+from simulux.processes import ArrayProcesses, numpy
+from simulux.storage import TreeStorage, OverlayStorage
+
+from lib.utils import jsonify
+
+SERVER = {'memory': {'total': 4194304}}
+
+def setup():
+    global tmpdir
+    tmpdir = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(tmpdir)
+
+def get_state(server):
+    disks = server['disks']
+    return jsonify({
+        'memory': server['memory'].dump(),
+        'cpus': server['cpus'].dump(),
+        'files': dict((path, node.copy()) for path, node in disks.files.iteritems()),
+        'partitions': disks.partitions,
+        'mounts': sorted(disks.mounts),
+        'processes': dict((pid, process.config) for pid, process in
+                          server['processes'].processes.iteritems())
+    })
+
+def test_snapshot_restore():
+    '''
+    Test a restored Environment matches the saved one
+    '''
+    env = Environment({'web1': SERVER}, templates={'web': SERVER})
+    env.clone_server('web2', 'web')
+    web1 = env.servers['web1']
+    web1['disks'].add_file('/etc/app.conf', size=42, owner=u'www', mode='0640')
+    web1['disks'].update_file('/etc/hosts', size=1000)
+    web1['processes'].add_processes([{'name': 'app', 'pid': 10, 'ppid': 1,
+        'state': 'R', 'memory': {'rss': 2048}, 'cpus': {'user': [1.5, 0.5]},
+        'cmdline': 'app --daemon'}])
+    env.servers['web2']['processes'].kill_process(2)
+    env.advance(30)
+    expected = dict((name, get_state(server)) for name, server in
+                    env.servers.iteritems())
+    filename = os.path.join(tmpdir, 'env.snapshot')
+    env.snapshot(filename)
+
+    restored = Environment()
+    assert restored.restore(filename)
+    assert restored.clock.now == 30
+    assert sorted(restored.servers) == ['web1', 'web2']
+    for name, server in restored.servers.iteritems():
+        assert get_state(server) == expected[name]
+    # Restored servers keep working
+    web1 = restored.servers['web1']
+    assert web1['processes'].find_pids(state='R') == [10]
+    assert web1['processes'].kill_process(10)
+    assert web1['memory'].dump()['used'] == 3072
+    assert web1['cpus'].get('user') == [3.0, 3.0]
+    assert web1['disks'].get_details('/etc/hosts').get('real_filename') == 'hosts'
+    assert web1['disks'].remove_file('/etc/app.conf')
+
+def test_restore_storage_classes():
+    '''
+    Test the disks storage and processes classes are restored
+    '''
+    env = Environment({'web1': SERVER})
+    server = env.servers['web1']
+    storage = TreeStorage()
+    storage.update(server['disks'].files)
+    server['disks'].files = storage
+    if numpy is not None:
+        server['processes'] = ArrayProcesses(cpus=server['cpus'],
+            memory=server['memory'], disks=server['disks'])
+    expected = get_state(server)
+    filename = os.path.join(tmpdir, 'classes.snapshot')
+    env.snapshot(filename)
+    assert env.restore(filename)
+    server = env.servers['web1']
+    assert isinstance(server['disks'].files, TreeStorage)
+    if numpy is not None:
+        assert isinstance(server['processes'], ArrayProcesses)
+    assert get_state(server) == expected
+
+def test_restore_clones():
+    '''
+    Test the cloned servers share the files of the restored template
+    '''
+    env = Environment(templates={'web': SERVER})
+    storage = TreeStorage()
+    storage.update(env.templates['web']['disks'].files)
+    env.templates['web']['disks'].files = storage
+    web1 = env.clone_server('web1', 'web')
+    web1['disks'].add_file('/etc/app.conf', size=42)
+    web1['disks'].remove_file('/var/log', recursive=True)
+    env.checkpoint()
+    web1['disks'].move_file('/etc/hosts', '/etc/hosts2')
+    expected = get_state(web1)
+    template = get_state(env.templates['web'])
+    filename = os.path.join(tmpdir, 'clones.snapshot')
+    env.snapshot(filename)
+
+    restored = Environment()
+    assert restored.restore(filename)
+    web1 = restored.servers['web1']
+    files = web1['disks'].files
+    assert isinstance(files, OverlayStorage)
+    assert files.base is restored.templates['web']['disks'].files
+    assert isinstance(files.base, TreeStorage)
+    # Only the changed files (and their parent folders) are local
+    assert '/etc/app.conf' in files.local and '/etc/hosts2' in files.local
+    assert '/etc/passwd' not in files.local
+    assert '/var/log' in files.deleted
+    assert get_state(web1) == expected
+    assert get_state(restored.templates['web']) == template
+    web1['disks'].update_file('/etc/hosts2', size=99999)
+    assert get_state(restored.templates['web']) == template
+    web2 = restored.clone_server('web2', 'web')
+    assert web2['disks'].exists('/var/log')
+
+def test_restore_file_values():
+    '''
+    Test any stored number is restored, apart from the missing ones
+    '''
+    env = Environment({'web1': SERVER})
+    disks = env.servers['web1']['disks']
+    disks.add_file('/etc/negative', size=-1, mode=-1)
+    disks.add_file('/etc/missing', owner=None, group=None)
+    disks.files['/etc/missing'].update({'mode': None})
+    expected = get_state(env.servers['web1'])
+    filename = os.path.join(tmpdir, 'values.snapshot')
+    env.snapshot(filename)
+    assert env.restore(filename)
+    disks = env.servers['web1']['disks']
+    assert disks.get_details('/etc/negative').get('size') == -1
+    assert disks.get_details('/etc/negative').get('mode') == -1
+    assert disks.get_details('/etc/missing').get('owner') is None
+    assert get_state(env.servers['web1']) == expected
+
+def test_restore_invalid():
+    '''
+    Test invalid snapshots are refused
+    '''
+    env = Environment({'web1': SERVER})
+    filename = os.path.join(tmpdir, 'invalid.snapshot')
+    with open(filename, 'wb') as f:
+        f.write('{"servers": {}}' * 4)
+    assert env.restore(filename) == False
+    assert env.restore(os.path.join(tmpdir, 'missing')) == False
+    assert 'web1' in env.servers
+    # Truncated / corrupted snapshots
+    env.snapshot(filename)
+    with open(filename, 'rb') as f:
+        content = f.read()
+    index = len(content) - 64
+    for corrupted in [content[:len(content) // 2], content[:index],
+                      content[:index] + '\xff' * 64,
+                      content[:8] + '\xff' * 8 + content[16:]]:
+        with open(filename, 'wb') as f:
+            f.write(corrupted)
+        assert env.restore(filename) == False
+    assert 'web1' in env.servers
@@ -0,0 +1,152 @@
+from simulux.environment import Environment
+from simulux.processes import ArrayProcesses, numpy
+from simulux.storage import TreeStorage
+
+from lib.utils import jsonify
+
+SERVER = {'memory': {'total': 4194304}}
+
+def get_files(disks):
+    return dict((path, node.copy()) for path, node in disks.files.iteritems())
+
+def get_state(server):
+    disks = server['disks']
+    processes = server['processes']
+    return jsonify({
+        'memory': server['memory'].dump(),
+        'cpus': server['cpus'].dump(),
+        'files': get_files(disks),
+        'partitions': disks.partitions,
+        'processes': dict((pid, [process.config, process.allocated]) for
+                          pid, process in processes.processes.iteritems()),
+        'indexes': dict((key, sorted(processes.find_pids(**{key: value})))
+                        for key, value in [('state', 'R'), ('name', 'app')]),
+        'top': processes.get_top_pids(5, 'rss')
+    })
+
+def change(server, pid):
+    disks = server['disks']
+    processes = server['processes']
+    disks.add_file('/etc/app-%d.conf' % (pid,), size=pid)
+    disks.update_file('/etc/hosts', size=pid * 10, owner='app')
+    disks.move_file('/etc/init.d', '/etc/rc.d')
+    disks.remove_file('/var/log', recursive=True)
+    disks.partitions['/dev/sda2']['used'] = pid
+    processes.add_processes([{'name': 'app', 'pid': pid, 'ppid': 1, 'state': 'R',
+        'memory': {'rss': pid * 1024}, 'cpus': {'user': [1.0, 0.5]}}])
+    processes.set_state(1, 'R')
+    processes.update_rss(2, 4096)
+    processes.kill_process(3)
+    server['cpus'].update('system', [2.0, 2.0])
+    server['memory'].update('cached', 1024)
+
+def test_rollback():
+    '''
+    Test rolling back restores the state of the checkpoint, many times
+    '''
+    env = Environment({'web1': SERVER})
+    server = env.servers['web1']
+    expected = get_state(server)
+    checkpoint = env.checkpoint()
+    for pid in [100, 200]:
+        change(server, pid)
+        assert get_state(server) != expected
+        assert env.rollback(checkpoint)
+        assert get_state(server) == expected
+    assert len(env.checkpoints) == 1
+    # Only the changed paths live in the overlay
+    assert len(server['disks'].files.local) == 0
+
+def test_nested_checkpoints():
+    '''
+    Test rolling back / releasing nested checkpoints
+    '''
+    env = Environment({'web1': SERVER})
+    server = env.servers['web1']
+    first = get_state(server)
+    env.checkpoint()
+    change(server, 100)
+    second = get_state(server)
+    env.checkpoint()
+    change(server, 200)
+    # Servers added after a checkpoint go away with its rollback
+    env.add_template('web', SERVER)
+    env.clone_server('web2', 'web')
+    env.checkpoint()
+    change(env.servers['web2'], 300)
+    assert env.rollback(1)
+    assert get_state(server) == second
+    assert sorted(env.servers) == ['web1']
+    change(server, 400)
+    assert env.release()
+    assert len(env.checkpoints) == 1
+    assert env.rollback()
+    assert get_state(server) == first
+    change(server, 500)
+    assert env.release(0)
+    assert env.checkpoints == []
+    assert server['disks'].checkpoints == []
+    assert server['processes'].journals == []
+    assert server['disks'].exists('/etc/app-500.conf')
+    assert server['processes'].find_pids(name='app') == [500]
+    assert env.rollback() == False
+
+def test_rollback_move():
+    '''
+    Test rolling back a moved and changed file restores the file itself
+    '''
+    env = Environment({'web1': SERVER})
+    server = env.servers['web1']
+    disks = server['disks']
+    expected = get_state(server)
+    env.checkpoint()
+    assert disks.move_file('/etc/hosts', '/etc/hosts2')
+    disks.update_file('/etc/hosts2', size=5000)
+    assert env.rollback()
+    assert get_state(server) == expected
+    assert not disks.exists('/etc/hosts2')
+
+def test_component_levels():
+    '''
+    Test each component rolls back to its own level
+    '''
+    env = Environment({'web1': SERVER})
+    server = env.servers['web1']
+    # A component checkpointed alone is one level deeper than the others
+    server['disks'].checkpoint()
+    files = jsonify(get_files(server['disks']))
+    server['disks'].add_file('/etc/app.conf', size=10)
+    server['memory'].update('cached', 2048)
+    expected = get_state(server)
+    env.checkpoint()
+    change(server, 100)
+    assert env.rollback()
+    assert get_state(server) == expected
+    assert len(server['disks'].checkpoints) == 2
+    assert env.release()
+    assert server['disks'].rollback(0)
+    assert jsonify(get_files(server['disks'])) == files
+    assert len(server['disks'].checkpoints) == 1
+
+def test_checkpoint_backends():
+    '''
+    Test the tree storage and the array backed processes roll back
+    '''
+    env = Environment({'web1': SERVER})
+    server = env.servers['web1']
+    storage = TreeStorage()
+    storage.update(server['disks'].files)
+    server['disks'].files = storage
+    if numpy is not None:
+        server['processes'] = ArrayProcesses(cpus=server['cpus'],
+            memory=server['memory'], disks=server['disks'])
+    expected = get_state(server)
+    env.checkpoint()
+    change(server, 100)
+    assert env.rollback()
+    assert get_state(server) == expected
+    change(server, 200)
+    changed = get_state(server)
+    assert env.release()
+    assert isinstance(server['disks'].files, TreeStorage)
+    assert get_state(server) == changed